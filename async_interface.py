@@ -0,0 +1,160 @@
+"""
+Asyncio interface to a Marcotti-Light database.
+
+SQLAlchemy 1.0 has no native asyncio support, so database work runs on worker threads
+against the same pooled engine that :class:`interface.Marcotti` builds from ``Config``.
+Every async session owns one worker thread, which keeps its session and DBAPI connection
+on a single thread (as SQLite requires) while the event loop stays free.
+
+This module requires Python 3.6 or later (:meth:`AsyncSession.stream` is an asynchronous generator).
+"""
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+from interface import Marcotti
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class AsyncSession(object):
+    """
+    Session whose database operations are awaitable.
+
+    Objects are added with ``add`` and ``add_all`` as usual; methods that emit SQL are
+    coroutines that run on the session's worker thread.  Arbitrary synchronous code can
+    be run against the underlying session with :meth:`run_sync`.
+
+    :param session: Session object.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """Call ``fn(session, *args, **kwargs)`` on the session's worker thread and return the result."""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, lambda: fn(self.sync_session, *args, **kwargs))
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        """Execute a Core statement and return all result rows."""
+        return await self.run_sync(lambda session: session.execute(statement, params).fetchall())
+
+    async def scalar(self, statement, params=None):
+        return await self.run_sync(lambda session: session.scalar(statement, params))
+
+    async def all(self, query):
+        """Return all results of a query built from ``session.sync_session``."""
+        return await self.run_sync(lambda session: query.all())
+
+    async def flush(self):
+        await self.run_sync(lambda session: session.flush())
+
+    async def commit(self):
+        await self.run_sync(lambda session: session.commit())
+
+    async def rollback(self):
+        await self.run_sync(lambda session: session.rollback())
+
+    async def close(self):
+        try:
+            await self.run_sync(lambda session: session.close())
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def stream(self, query, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Iterate over the results of a query in chunks without loading the whole result.
+
+        Results are fetched with ``yield_per`` and a server-side cursor where the database
+        supports one.  Use with ``async for``.
+
+        :param query: Query object built from ``session.sync_session``.
+        :param chunk_size: Number of results fetched per round trip to the worker thread.
+        """
+        results = await self.run_sync(lambda session: iter(
+            query.execution_options(stream_results=True).yield_per(chunk_size)))
+        while True:
+            chunk = await self.run_sync(lambda session: list(islice(results, chunk_size)))
+            if not chunk:
+                break
+            for item in chunk:
+                yield item
+
+
+class _SessionContext(object):
+
+    def __init__(self, marcotti):
+        self.marcotti = marcotti
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = AsyncSession(self.marcotti.Session())
+        return self.session
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.session.commit()
+            else:
+                await self.session.rollback()
+        finally:
+            await self.session.close()
+        return False
+
+
+class AsyncMarcotti(object):
+    """
+    Asyncio counterpart of :class:`interface.Marcotti`.
+
+    Engine and connection pool are built from the configuration exactly as in the synchronous
+    interface, so pool settings in ``Config`` apply to both.  Sessions, bulk loads and
+    ``create_db`` run on worker threads.
+
+    :param config: Config object.
+    """
+
+    def __init__(self, config):
+        self.marcotti = Marcotti(config)
+        self.engine = self.marcotti.engine
+        self.Session = self.marcotti.Session
+
+    @staticmethod
+    async def _run(fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, lambda: fn(*args))
+
+    async def create_db(self, base):
+        await self._run(self.marcotti.create_db, base)
+
+    def create_session(self):
+        """
+        Return an async context manager that yields an AsyncSession, commits on success and
+        rolls back on error::
+
+            async with marcotti.create_session() as session:
+                session.add(record)
+        """
+        return _SessionContext(self)
+
+    async def dispose(self):
+        """Close all pooled connections."""
+        await self._run(self.marcotti.dispose)
+
+    async def bulk_load_matches(self, rows, model, block_size=None):
+        """
+        Load match records in a single transaction, bypassing the ORM unit of work.
+
+        :param rows: Iterable of dictionaries keyed by column name.
+        :param model: Mapped match class, e.g. ``ClubLeagueMatches``.
+        :param block_size: Number of rows per executemany batch, ``light.bulk.DEFAULT_BLOCK_SIZE`` if None.
+        :return: LoadStats object with row count and rows/sec.
+        """
+        return await self._run(self.marcotti.bulk_load_matches, rows, model, block_size)
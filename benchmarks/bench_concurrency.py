@@ -0,0 +1,70 @@
+"""
+Benchmark session throughput against the number of worker threads.
+
+Every worker repeatedly opens a session with ``Marcotti.create_session``, runs a
+season lookup and a match count, and closes the session.  Throughput should scale
+with the number of workers up to the connection pool size on a client/server
+database; SQLite serialises access and is included for reference only.
+
+Run from the repository root against the database in ``light/config/local.py``:
+
+    $ python -m benchmarks.bench_concurrency --workers 1,2,4,8,16 --duration 5
+"""
+import json
+import time
+import argparse
+import threading
+
+from sqlalchemy import func
+
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.config.local import LocalConfig
+from interface import Marcotti
+
+
+def workload(marcotti):
+    with marcotti.create_session() as session:
+        session.query(lcm.Seasons).filter(lcm.Seasons.name == '2014-2015').all()
+        session.query(func.count(lcm.Matches.id)).scalar()
+
+
+def run(marcotti, workers, duration):
+    """Run the workload on ``workers`` threads for ``duration`` seconds; return operations per second."""
+    counts = [0] * workers
+    deadline = time.time() + duration
+
+    def worker(index):
+        while time.time() < deadline:
+            workload(marcotti)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    return {'workers': workers, 'operations': sum(counts), 'elapsed': round(elapsed, 3),
+            'rate': round(sum(counts) / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', default='1,2,4,8,16', help='Comma-separated worker counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per worker count')
+    parser.add_argument('--scoped', action='store_true', help='Use thread-local scoped sessions')
+    args = parser.parse_args()
+
+    marcotti = Marcotti(LocalConfig(), scoped=args.scoped)
+    marcotti.create_db(BaseSchema)
+    try:
+        for workers in [int(n) for n in args.workers.split(',')]:
+            print(json.dumps(run(marcotti, workers, args.duration)))
+    finally:
+        marcotti.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark polymorphic loading of mixed-phase club matches.
+
+Compares the number of statements and wall time needed to list all matches with
+phase columns and team names, using a plain ``Matches`` query (lazy loading) and
+the polymorphic presets in :mod:`light.loaders`.
+
+Run from the repository root:
+
+    $ python -m benchmarks.bench_polymorphic --matches 100000 --uri sqlite:////tmp/bench.db
+"""
+import json
+import time
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm.session import Session
+
+import light.club as lc
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+from light.loaders import match_query
+
+
+PHASES = [
+    (lc.ClubFriendlyMatches, {}),
+    (lc.ClubLeagueMatches, {'matchday': 1}),
+    (lc.ClubGroupMatches, {'matchday': 1, 'group': 'A'}),
+    (lc.ClubKnockoutMatches, {'matchday': 1, 'extra_time': False})
+]
+
+
+def populate(engine, matches, teams=40):
+    """Create reference data and ``matches`` club matches spread evenly over the four phases."""
+    lcm.BaseSchema.metadata.drop_all(engine)
+    lcm.BaseSchema.metadata.create_all(engine)
+    session = Session(engine)
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    clubs = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(teams)]
+    session.add_all([competition, season] + clubs)
+    session.commit()
+
+    connection = session.connection()
+    for index, (model, extra) in enumerate(PHASES):
+        rows = (dict(extra, date=date(2014, 8, 1) + timedelta(days=k % 300),
+                     competition_id=competition.id, season_id=season.id,
+                     home_team_id=clubs[k % teams].id, away_team_id=clubs[(k + 1) % teams].id)
+                for k in range(index, matches, len(PHASES)))
+        bulk_load_matches(connection, rows, model)
+    session.commit()
+    session.close()
+
+
+def run(engine, mode):
+    """List all matches with phase columns and team names; return statement count and elapsed time."""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count)
+    session = Session(engine)
+    start = time.time()
+    if mode == 'lazy':
+        matches = session.query(lcm.Matches).all()
+    else:
+        matches = match_query(session, 'club', eager=mode).all()
+    for match in matches:
+        getattr(match, 'matchday', None)
+        match.home_team.name
+        match.away_team.name
+    elapsed = time.time() - start
+    session.close()
+    event.remove(engine, 'before_cursor_execute', count)
+    return {'mode': mode, 'rows': len(matches), 'statements': statements[0], 'elapsed': round(elapsed, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', default='sqlite:///bench-polymorphic.db', help='Database URI')
+    parser.add_argument('--matches', type=int, default=100000, help='Number of matches')
+    parser.add_argument('--modes', default='subquery,joined,lazy', help='Comma-separated loading modes')
+    args = parser.parse_args()
+
+    engine = create_engine(args.uri)
+    populate(engine, args.matches)
+    for mode in args.modes.split(','):
+        print(json.dumps(run(engine, mode)))
+
+
+if __name__ == '__main__':
+    main()
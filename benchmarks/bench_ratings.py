@@ -0,0 +1,114 @@
+"""
+Benchmark Elo ratings of a synthetic club match history.
+
+Loads a history of league matches between randomly paired clubs, then times three
+rating jobs: walking ``Matches`` objects through the ORM in date order (``orm``,
+computing ratings without writing them), rating the full history with
+:func:`light.ratings.rebuild_ratings` (``rebuild``), and resuming after a further
+season of matches is appended (``resume``).  The ``engine`` mode times the rating
+loop alone over results held in memory.  The ``orm`` baseline issues a query per match
+for the phase columns and is not run by default.
+
+Run from the repository root:
+
+    $ python -m benchmarks.bench_ratings --matches 1000000 --uri sqlite:////tmp/bench.db
+"""
+import json
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm.session import Session
+
+import light.club as lc
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+from light.ratings import Elo, TeamRatings, rate_matches, rebuild_ratings
+
+
+def fixtures(matches, teams, seed, start=date(1990, 8, 1), first=0):
+    """Generate ``matches`` synthetic results between ``teams`` clubs, 100 matches per day."""
+    generator = random.Random(seed)
+    for k in range(first, first + matches):
+        home, away = generator.sample(teams, 2)
+        yield (k, start + timedelta(days=k // 100), home, away,
+               generator.randint(0, 4), generator.randint(0, 3), None, None)
+
+
+def populate(engine, matches, teams, seed):
+    """Create reference data and a history of ``matches`` club league matches."""
+    lcm.BaseSchema.metadata.drop_all(engine)
+    lcm.BaseSchema.metadata.create_all(engine)
+    session = Session(engine)
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    clubs = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(teams)]
+    session.add_all([competition, season] + clubs)
+    session.commit()
+    team_ids = [club.id for club in clubs]
+    keys = dict(competition_id=competition.id, season_id=season.id, matchday=1)
+    session.close()
+
+    def append(count, first):
+        with engine.begin() as connection:
+            rows = (dict(keys, date=match_date, home_team_id=home, away_team_id=away,
+                         home_goals=home_goals, away_goals=away_goals)
+                    for _, match_date, home, away, home_goals, away_goals, _, _ in
+                    fixtures(count, team_ids, seed + first, first=first))
+            bulk_load_matches(connection, rows, lc.ClubLeagueMatches)
+    append(matches, 0)
+    return team_ids, append
+
+
+def timed(mode, job):
+    start = time.time()
+    rows = job()
+    elapsed = time.time() - start
+    return {'mode': mode, 'rows': rows, 'elapsed': round(elapsed, 3), 'rate': round(rows / elapsed, 1)}
+
+
+def orm_walk(engine):
+    """Rate matches by loading ORM objects in date order, as a baseline."""
+    session = Session(engine)
+    elo = Elo()
+    ratings = TeamRatings(elo.initial)
+    results = ((match.id, match.date, match.home_team_id, match.away_team_id, match.home_goals, match.away_goals,
+                None, None) for match in session.query(lcm.Matches).order_by(lcm.Matches.date, lcm.Matches.id))
+    count = sum(1 for _ in elo.rate(results, ratings))
+    session.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', default='sqlite:///bench-ratings.db', help='Database URI')
+    parser.add_argument('--matches', type=int, default=1000000, help='Number of matches')
+    parser.add_argument('--teams', type=int, default=2000, help='Number of clubs')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--modes', default='engine,rebuild,resume', help='Comma-separated benchmark modes')
+    args = parser.parse_args()
+
+    engine = create_engine(args.uri)
+    team_ids, append = populate(engine, args.matches, args.teams, args.seed)
+    modes = args.modes.split(',')
+
+    if 'engine' in modes:
+        results = list(fixtures(args.matches, team_ids, args.seed))
+        print(json.dumps(timed('engine', lambda: sum(1 for _ in Elo().rate(results, TeamRatings())))))
+    if 'orm' in modes:
+        print(json.dumps(timed('orm', lambda: orm_walk(engine))))
+    if 'rebuild' in modes or 'resume' in modes:
+        with engine.begin() as connection:
+            print(json.dumps(timed('rebuild', lambda: rebuild_ratings(connection, 'club'))))
+    if 'resume' in modes:
+        season = max(args.matches // 100, 1)
+        append(season, args.matches)
+        with engine.begin() as connection:
+            print(json.dumps(timed('resume', lambda: rate_matches(connection, 'club'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark startup time of the club and national team schemas.
+
+Every sample runs in a fresh interpreter, which imports a schema module, optionally
+warms up with :func:`light.schemas.warm_up`, and runs a first ORM query against
+existing tables.  The ``lazy`` mode leaves mapper configuration to the first query;
+the ``warm`` mode configures mappers before it.  The times of the import, warm-up and
+first query, and their total, are reported as best and median over ``--repeat``
+samples in one JSON document, so that runs can be compared across commits.
+
+Run from the repository root:
+
+    $ python -m benchmarks.bench_startup --repeat 10
+    $ python -m benchmarks.bench_startup --schemas club --uri sqlite:////tmp/bench.db
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from datetime import datetime
+
+import sqlalchemy
+
+from benchmarks.bench_suite import commit
+
+
+MODES = ('lazy', 'warm')
+
+PHASES = ('import', 'warm_up', 'first_query', 'total')
+
+PROBE = """
+import sys, json, time
+schema_name, mode, uri = sys.argv[1:4]
+start = time.time()
+__import__('light.' + schema_name)
+from light.schemas import get_schema, warm_up
+imported = time.time()
+if mode == 'warm':
+    warm_up(schema_name)
+warmed = time.time()
+
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm.session import Session
+schema = get_schema(schema_name)
+engine = create_engine(uri)
+schema.base.metadata.create_all(engine)
+session = Session(engine)
+session.connection()
+ready = time.time()
+session.query(schema.match_model('friendly')).first()
+queried = time.time()
+print(json.dumps({'import': imported - start, 'warm_up': warmed - imported, 'first_query': queried - ready,
+                  'total': (queried - ready) + (warmed - start)}))
+"""
+
+
+def sample(schema, mode, uri):
+    """Return the startup times of one fresh interpreter."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.devnull, 'w') as devnull:
+        output = subprocess.check_output([sys.executable, '-c', PROBE, schema, mode, uri], cwd=root, stderr=devnull)
+    return json.loads(output.decode('utf-8'))
+
+
+def summarize(samples):
+    result = {}
+    for phase in PHASES:
+        times = sorted(s[phase] for s in samples)
+        result[phase] = {'best': round(times[0], 4), 'median': round(times[len(times) // 2], 4)}
+    return result
+
+
+def run(schemas, uri, repeat):
+    """Sample every schema in both modes and return the JSON-serializable report."""
+    results = {}
+    for schema in schemas:
+        results[schema] = dict((mode, summarize([sample(schema, mode, uri) for _ in range(repeat)]))
+                               for mode in MODES)
+    return {
+        'commit': commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'sqlalchemy': sqlalchemy.__version__,
+        'uri': uri,
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', default='sqlite://', help='Database URI; tables are created if missing')
+    parser.add_argument('--schemas', default='club,natl', help='Comma-separated schemas')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per schema and mode')
+    parser.add_argument('--output', help='Write the JSON report to a file')
+    args = parser.parse_args()
+
+    report = run(args.schemas.split(','), args.uri, args.repeat)
+    document = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(document + '\n')
+    print(document)
+
+
+if __name__ == '__main__':
+    main()
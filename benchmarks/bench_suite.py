@@ -0,0 +1,232 @@
+"""
+Benchmark suite over a synthetic dataset.
+
+Generates a reproducible dataset with :mod:`benchmarks.synthetic` and times bulk
+insert, standings computation, polymorphic match queries, season name filtering and
+head-to-head lookups.  Every benchmark is run ``--repeat`` times and reports the
+best and median wall time, the number of rows and the number of statements of one
+run.  Results are printed as one JSON document with the commit, library versions,
+database dialect and dataset spec, so that runs with the same options can be
+compared across commits.
+
+The bulk insert benchmark drops and recreates all tables of the database, so a
+database that has tables is only used with ``--reset``.  Run from the repository
+root against SQLite or a local PostgreSQL database:
+
+    $ python -m benchmarks.bench_suite --scale small --uri sqlite:////tmp/bench.db
+    $ python -m benchmarks.bench_suite --scale medium --uri postgresql://localhost/bench --reset --output bench.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+from datetime import datetime
+
+import sqlalchemy
+from sqlalchemy import event, func
+from sqlalchemy.engine import create_engine
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.orm.session import Session
+
+import light.common.models as lcm
+from light.schemas import get_schema
+from light.loaders import match_query
+from light.queries import head_to_head_select
+from light.head_to_head import refresh_head_to_head, head_to_head
+from benchmarks.synthetic import DatasetSpec, generate
+
+
+SCALES = {
+    'small': dict(confederations=2, countries=4, clubs=20, seasons=3),
+    'medium': dict(confederations=4, countries=10, clubs=20, seasons=10),
+    'large': dict(confederations=6, countries=20, clubs=20, seasons=25)
+}
+
+BENCHMARKS = ('bulk_insert', 'standings', 'polymorphic', 'season_name', 'head_to_head_query',
+              'head_to_head_refresh', 'head_to_head_lookup')
+
+
+class Counter(object):
+    """Count the statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+
+    def __call__(self, *args):
+        self.statements += 1
+
+    def __enter__(self):
+        self.statements = 0
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+def measure(engine, job, repeat):
+    """Run ``job`` ``repeat`` times; return rows, statements of the first run and wall times."""
+    times = []
+    rows = statements = None
+    for _ in range(repeat):
+        with Counter(engine) as counter:
+            start = time.time()
+            count = job()
+            times.append(time.time() - start)
+        if rows is None:
+            rows, statements = count, counter.statements
+    times.sort()
+    return {'rows': rows, 'statements': statements, 'best': round(times[0], 4),
+            'median': round(times[len(times) // 2], 4), 'times': [round(t, 4) for t in times]}
+
+
+def reset(engine):
+    lcm.BaseSchema.metadata.drop_all(engine)
+    lcm.BaseSchema.metadata.create_all(engine)
+
+
+def pairs(dataset, count):
+    """Return a reproducible sample of pairs of teams of the same competition."""
+    generator = random.Random(dataset.spec.seed)
+    return [tuple(generator.sample(generator.choice(dataset.pools)[1], 2)) for _ in range(count)]
+
+
+def bench_bulk_insert(engine, spec, repeat):
+    """Generate the dataset into empty tables; the last run is kept for the other benchmarks."""
+    datasets = []
+
+    def job():
+        reset(engine)
+        with engine.begin() as connection:
+            datasets.append(generate(connection, spec))
+        return datasets[-1].stats.rows
+    result = measure(engine, job, repeat)
+    result['rate'] = round(datasets[-1].stats.rate, 1)
+    return result, datasets[-1]
+
+
+def bench_standings(engine, dataset, repeat):
+    from light.standings import refresh_standings
+    from light.club import ClubStandings
+
+    def job():
+        with engine.begin() as connection:
+            refresh_standings(connection)
+            return connection.scalar(func.count(ClubStandings.team_id).select())
+    return measure(engine, job, repeat)
+
+
+def bench_polymorphic(engine, dataset, repeat):
+    def job():
+        session = Session(engine)
+        matches = match_query(session, dataset.spec.schema).all()
+        for match in matches:
+            match.home_team.name
+            match.away_team.name
+        session.close()
+        return len(matches)
+    return measure(engine, job, repeat)
+
+
+def bench_season_name(engine, dataset, repeat):
+    def job():
+        session = Session(engine)
+        total = 0
+        for label in dataset.season_labels:
+            total += session.query(func.count(lcm.Matches.id)).join(lcm.Seasons)\
+                .filter(lcm.Seasons.name == label).scalar()
+        session.close()
+        return total
+    return measure(engine, job, repeat)
+
+
+def bench_head_to_head_query(engine, dataset, repeat, count=100):
+    def job():
+        with engine.connect() as connection:
+            return sum(len(connection.execute(head_to_head_select(dataset.spec.schema, a, b)).fetchall())
+                       for a, b in pairs(dataset, count))
+    return measure(engine, job, repeat)
+
+
+def bench_head_to_head_refresh(engine, dataset, repeat):
+    def job():
+        with engine.begin() as connection:
+            refresh_head_to_head(connection, dataset.spec.schema)
+            return connection.scalar(func.count().select().select_from(
+                get_schema(dataset.spec.schema).head_to_head.__table__))
+    return measure(engine, job, repeat)
+
+
+def bench_head_to_head_lookup(engine, dataset, repeat, count=100):
+    def job():
+        session = Session(engine)
+        found = sum(1 for a, b in pairs(dataset, count) if head_to_head(session, dataset.spec.schema, a, b))
+        session.close()
+        return found
+    return measure(engine, job, repeat)
+
+
+def commit():
+    """Return the commit hash of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(engine, spec, repeat, names=BENCHMARKS):
+    """Run the benchmarks in ``names`` and return the JSON-serializable report."""
+    results = {}
+    insert, dataset = bench_bulk_insert(engine, spec, repeat if 'bulk_insert' in names else 1)
+    if 'bulk_insert' in names:
+        results['bulk_insert'] = insert
+    for name in names:
+        if name == 'bulk_insert' or (name == 'standings' and spec.schema != 'club'):
+            continue
+        results[name] = globals()['bench_' + name](engine, dataset, repeat)
+    return {
+        'commit': commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'sqlalchemy': sqlalchemy.__version__,
+        'dialect': engine.dialect.name,
+        'spec': spec.as_dict(),
+        'counts': dataset.counts,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', default='sqlite:///bench-suite.db', help='Database URI')
+    parser.add_argument('--schema', default='club', choices=['club', 'natl'], help='Database schema')
+    parser.add_argument('--scale', default='small', choices=sorted(SCALES), help='Dataset size')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help='Comma-separated benchmarks')
+    parser.add_argument('--output', help='Write the JSON report to a file')
+    parser.add_argument('--reset', action='store_true', help='Drop the tables of a database that has tables')
+    args = parser.parse_args()
+
+    get_schema(args.schema)
+    spec = DatasetSpec(schema=args.schema, seed=args.seed, **SCALES[args.scale])
+    engine = create_engine(args.uri)
+    if not args.reset and Inspector.from_engine(engine).get_table_names():
+        engine.dispose()
+        parser.error("database {0} has tables, which the benchmarks drop; pass --reset to use it".format(
+            engine.url.database))
+    report = run(engine, spec, args.repeat, args.benchmarks.split(','))
+    engine.dispose()
+
+    document = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(document + '\n')
+    print(document)
+
+
+if __name__ == '__main__':
+    main()
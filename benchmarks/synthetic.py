@@ -0,0 +1,285 @@
+"""
+Reproducible synthetic datasets for benchmarks.
+
+A :class:`DatasetSpec` describes the size of a club or national team database:
+confederations, countries, clubs, competitions, seasons, matches per phase,
+penalty shootouts and point deductions.  :func:`generate` writes the dataset with
+the ORM for reference data and the bulk loader for matches and deductions.  Rows
+are drawn from a seeded random generator in a fixed order, so the same spec
+always produces the same matches, scores and dates.
+
+Club competitions are domestic competitions of every country, played between the
+clubs of the country.  National team competitions are international competitions
+of every confederation, played between its countries.  League matches follow a
+double round-robin schedule, group matches are played in groups of four, and drawn
+knockout matches go to extra time and, at ``shootout_rate``, to a penalty shootout.
+"""
+import math
+import random
+from datetime import date, timedelta
+
+from sqlalchemy.orm.session import Session
+
+import light.common.models as lcm
+from light.bulk import LoadStats, bulk_insert, bulk_load_matches, inheritance_tables
+from light.schemas import get_schema
+
+
+KNOCKOUT_ROUNDS = (u"Round of 16", u"Quarterfinal", u"Semifinal", u"Final")
+
+GROUPS = 'ABCDEFGH'
+
+
+class DatasetSpec(object):
+    """
+    Size of a synthetic dataset.
+
+    :param schema: Schema name (``club`` or ``natl``).
+    :param confederations: Number of confederations.
+    :param countries: Number of countries per confederation.
+    :param clubs: Number of clubs per country (club schema only).
+    :param competitions: Number of competitions per country (club) or confederation (natl).
+    :param seasons: Number of consecutive seasons, starting in ``start_year``.
+    :param friendly: Friendly matches per competition and season.
+    :param league: League matches per competition and season (club schema only).
+    :param group: Group matches per competition and season, at most 12 per group of four teams.
+    :param knockout: Knockout matches per competition and season.
+    :param shootout_rate: Fraction of drawn knockout matches decided by a penalty shootout.
+    :param deductions: Point deductions per competition and season.
+    :param start_year: First year of the first season.
+    :param seed: Seed of the random generator.
+    """
+
+    def __init__(self, schema='club', confederations=2, countries=4, clubs=20, competitions=1, seasons=3,
+                 friendly=20, league=380, group=48, knockout=15, shootout_rate=0.5, deductions=1,
+                 start_year=2010, seed=1):
+        self.schema = schema
+        self.confederations = confederations
+        self.countries = countries
+        self.clubs = clubs
+        self.competitions = competitions
+        self.seasons = seasons
+        self.friendly = friendly
+        self.league = league
+        self.group = group
+        self.knockout = knockout
+        self.shootout_rate = shootout_rate
+        self.deductions = deductions
+        self.start_year = start_year
+        self.seed = seed
+
+    def as_dict(self):
+        """Return the parameters of the spec as a dictionary."""
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return "<DatasetSpec({0})>".format(", ".join(
+            "{0}={1}".format(name, value) for name, value in sorted(self.__dict__.items())))
+
+
+class Dataset(object):
+    """
+    Summary of a generated dataset.  ``pools`` lists (competition ID, team IDs) of every
+    competition.
+
+    :param spec: DatasetSpec object.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.team_ids = []
+        self.pools = []
+        self.competition_ids = []
+        self.season_ids = []
+        self.season_labels = []
+        self.counts = {}
+        self.stats = LoadStats()
+
+    def __repr__(self):
+        return "<Dataset(teams={0}, competitions={1}, seasons={2}, counts={3})>".format(
+            len(self.team_ids), len(self.competition_ids), len(self.season_ids), self.counts)
+
+
+def _goals(generator, mean):
+    """Draw a Poisson-distributed number of goals."""
+    limit, goals, product = math.exp(-mean), 0, generator.random()
+    while product > limit:
+        goals += 1
+        product *= generator.random()
+    return goals
+
+
+def _score(generator):
+    return {'home_goals': _goals(generator, 1.5), 'away_goals': _goals(generator, 1.1)}
+
+
+def _round_robin(teams):
+    """Return the rounds of a double round-robin schedule as lists of (home, away) pairs."""
+    teams = list(teams)
+    if len(teams) % 2:
+        teams.append(None)
+    rounds = []
+    for k in range(len(teams) - 1):
+        pairs = [(teams[i], teams[-1 - i]) for i in range(len(teams) // 2)]
+        rounds.append([(home, away) if k % 2 == 0 else (away, home)
+                       for home, away in pairs if home is not None and away is not None])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(away, home) for home, away in pairs] for pairs in rounds]
+
+
+def _schedule(rounds, count):
+    """Generate (matchday, home, away) of the first ``count`` matches of a schedule, repeating it as needed."""
+    produced, matchday = 0, 0
+    while produced < count and rounds:
+        for pairs in rounds:
+            matchday += 1
+            for home, away in pairs:
+                if produced == count:
+                    return
+                produced += 1
+                yield matchday, home, away
+
+
+def _reference(session, spec, dataset):
+    """Create confederations, countries, clubs, competitions, seasons and rounds; return the team pools."""
+    pools = []
+    for c in range(spec.confederations):
+        confederation = lcm.Confederations(name=u"CONF{0}".format(c))
+        countries = [lcm.Countries(name=u"Country {0}-{1}".format(c, k), confederation=confederation)
+                     for k in range(spec.countries)]
+        session.add_all(countries)
+        if spec.schema == 'club':
+            team_model = get_schema('club').team
+            for k, country in enumerate(countries):
+                clubs = [team_model(name=u"Club {0}-{1}-{2}".format(c, k, n), country=country)
+                         for n in range(spec.clubs)]
+                competitions = [lcm.DomesticCompetitions(name=u"{0} League {1}".format(country.name, level + 1),
+                                                         level=level + 1, country=country)
+                                for level in range(spec.competitions)]
+                session.add_all(clubs + competitions)
+                pools.extend((competition, clubs) for competition in competitions)
+        else:
+            competitions = [lcm.InternationalCompetitions(name=u"{0} Cup {1}".format(confederation.name, level + 1),
+                                                          level=level + 1, confederation=confederation)
+                            for level in range(spec.competitions)]
+            session.add_all(competitions)
+            pools.extend((competition, countries) for competition in competitions)
+
+    years = [lcm.Years(yr=spec.start_year + k) for k in range(spec.seasons + 1)]
+    seasons = [lcm.Seasons(start_year=years[k], end_year=years[k + 1]) for k in range(spec.seasons)]
+    group_round = lcm.GroupRounds(name=u"Group Stage")
+    ko_rounds = [lcm.KnockoutRounds(name=name) for name in KNOCKOUT_ROUNDS]
+    session.add_all(seasons + [group_round] + ko_rounds)
+    session.flush()
+
+    pools = [(competition.id, sorted(team.id for team in teams)) for competition, teams in pools]
+    dataset.pools = pools
+    dataset.team_ids = sorted(set(team_id for _, teams in pools for team_id in teams))
+    dataset.competition_ids = [competition_id for competition_id, _ in pools]
+    dataset.season_ids = [season.id for season in seasons]
+    dataset.season_labels = [season.name for season in seasons]
+    return pools, group_round.id, [ko_round.id for ko_round in ko_rounds]
+
+
+def _phase_rows(generator, spec, keys, teams, start, group_round_id, ko_round_ids):
+    """Generate the match rows of a competition and season, keyed by phase."""
+    phases = {}
+
+    rows = []
+    for k in range(spec.friendly):
+        home, away = generator.sample(teams, 2)
+        rows.append(dict(keys, date=start - timedelta(days=spec.friendly - k), home_team_id=home, away_team_id=away,
+                         **_score(generator)))
+    phases['friendly'] = rows
+
+    rows = []
+    if spec.schema == 'club':
+        for matchday, home, away in _schedule(_round_robin(teams), spec.league):
+            rows.append(dict(keys, date=start + timedelta(days=7 * (matchday - 1)), matchday=matchday,
+                             home_team_id=home, away_team_id=away, **_score(generator)))
+    phases['league'] = rows
+
+    rows = []
+    drawn = generator.sample(teams, len(teams) - len(teams) % 4)
+    groups = [drawn[k:k + 4] for k in range(0, len(drawn), 4)][:len(GROUPS)]
+    schedules = [list(_schedule(_round_robin(members), 12)) for members in groups]
+    fixtures = []
+    for index in range(12):
+        for letter, schedule in zip(GROUPS, schedules):
+            if index < len(schedule):
+                fixtures.append((letter, schedule[index]))
+    for letter, (matchday, home, away) in fixtures[:spec.group]:
+        rows.append(dict(keys, date=start + timedelta(days=45 + 14 * (matchday - 1)), matchday=matchday,
+                         group=letter, group_round_id=group_round_id, home_team_id=home, away_team_id=away,
+                         **_score(generator)))
+    phases['group'] = rows
+
+    rows = []
+    for k in range(spec.knockout):
+        home, away = generator.sample(teams, 2)
+        score = _score(generator)
+        stage = min(k * len(ko_round_ids) // max(spec.knockout, 1), len(ko_round_ids) - 1)
+        rows.append(dict(keys, date=start + timedelta(days=200 + k), matchday=stage + 1,
+                         ko_round_id=ko_round_ids[stage], extra_time=score['home_goals'] == score['away_goals'],
+                         home_team_id=home, away_team_id=away, **score))
+    phases['knockout'] = rows
+    return phases
+
+
+def _insert_shootouts(connection, model, rows):
+    """Insert shootout records for match rows that carry their allocated ID."""
+    if not rows:
+        return
+    for table in inheritance_tables(model):
+        connection.execute(table.insert(), [dict((c.key, row[c.key]) for c in table.columns if c.key in row)
+                                            for row in rows])
+
+
+def generate(connection, spec):
+    """
+    Write a synthetic dataset to a database that has the schema tables but no data.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param spec: DatasetSpec object.
+    :return: Dataset object with the IDs of teams, competitions and seasons, the number
+        of records written by kind and the statistics of the bulk loads.
+    """
+    schema = get_schema(spec.schema)
+    generator = random.Random(spec.seed)
+    dataset = Dataset(spec)
+
+    session = Session(bind=connection)
+    pools, group_round_id, ko_round_ids = _reference(session, spec, dataset)
+    session.close()
+
+    counts = dict((name, 0) for name in ('friendly', 'league', 'group', 'knockout', 'shootouts', 'deductions'))
+    for competition_id, teams in pools:
+        for index, season_id in enumerate(dataset.season_ids):
+            keys = dict(competition_id=competition_id, season_id=season_id)
+            start = date(spec.start_year + index, 8, 1)
+            phases = _phase_rows(generator, spec, keys, teams, start, group_round_id, ko_round_ids)
+            for phase, rows in sorted(phases.items()):
+                if rows and phase in schema.matches:
+                    dataset.stats += bulk_load_matches(connection, rows, schema.match_model(phase))
+                    counts[phase] += len(rows)
+
+            shootouts = []
+            for row in phases['knockout']:
+                if row['extra_time'] and generator.random() < spec.shootout_rate:
+                    home = generator.randint(3, 5)
+                    away = home + generator.choice((-2, -1, 1))
+                    shootouts.append(dict(id=row['id'], home_team_id=row['home_team_id'],
+                                          away_team_id=row['away_team_id'], opener_id=row['home_team_id'],
+                                          home_shootout_goals=home, away_shootout_goals=away))
+            _insert_shootouts(connection, schema.shootout, shootouts)
+            counts['shootouts'] += len(shootouts)
+
+            deductions = [dict(keys, date=start + timedelta(days=180), team_id=generator.choice(teams),
+                               points=generator.randint(1, 10)) for _ in range(spec.deductions)]
+            if deductions:
+                dataset.stats += bulk_insert(connection, deductions, schema.deduction)
+                counts['deductions'] += len(deductions)
+    dataset.counts = counts
+    return dataset
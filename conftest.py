@@ -1,3 +1,6 @@
+import os
+import sys
+
 import pytest
 from sqlalchemy.orm.session import Session
 from sqlalchemy.engine import create_engine
@@ -5,12 +8,20 @@ from sqlalchemy.engine import create_engine
 from light.config.local import LocalConfig
 
 
+pytest_plugins = ['light.testing']
+
+# Asyncio tests use syntax of Python 3.6 and later.
+collect_ignore = ['tests/test_async.py'] if sys.version_info < (3, 6) else []
+
+
 class TestConfig(LocalConfig):
     DBNAME = 'test-marcotti-light'
 
 
 def pytest_addoption(parser):
     parser.addoption('--schema', action='store', default='base', help='Indicate schema to use in test suite')
+    parser.addoption('--uri', action='store', default=os.environ.get('MARCOTTI_TEST_URI'),
+                     help='Database URI of test suite, instead of the local configuration')
 
 
 @pytest.fixture('session')
@@ -25,7 +36,7 @@ def cmdopt(request):
 
 @pytest.fixture(scope='session')
 def db_connection(request, config, cmdopt):
-    engine = create_engine(config.DATABASE_URI)
+    engine = create_engine(request.config.getoption('--uri') or config.DATABASE_URI)
     connection = engine.connect()
     if cmdopt == 'club':
         from light.club import ClubSchema
@@ -1,27 +1,231 @@
+import time
 from contextlib import contextmanager
 
-from sqlalchemy.orm.session import Session
-from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from light.engine import config_engine
 
 
 class Marcotti(object):
+    """
+    Interface to a Marcotti-Light database.
+
+    Every session draws its own connection from the engine's connection pool.  In scoped mode,
+    sessions are thread-local, so that code running in the same thread shares one session;
+    ``create_session`` blocks should not be nested in that mode.
+
+    Reference records (countries, seasons, competitions, etc.) looked up through
+    ``reference_cache`` and query results cached in ``result_cache`` are shared by all sessions.
+
+    With statement instrumentation turned on (``QUERY_PROFILING`` or :meth:`instrument`), every
+    ``create_session`` block is profiled and its QueryStats object is stored in
+    ``session.info['query_stats']``.
+
+    Subsystems (loaders, importers, backfill, profiling, ...) are imported by the methods that
+    use them, so that short-lived jobs only import what they run.
 
-    def __init__(self, config):
-        self.engine = create_engine(config.DATABASE_URI)
-        self.connection = self.engine.connect()
+    :param config: Config object.
+    :param scoped: Use thread-local sessions.
+    """
+
+    def __init__(self, config, scoped=False):
+        from light.cache import ReferenceCache, ResultCache, MemoryBackend, SQLiteBackend
+
+        self.config = config
+        self.engine = config_engine(config)
+        self.scoped = scoped
+        self.Session = sessionmaker(bind=self.engine)
+        if scoped:
+            self.Session = scoped_session(self.Session)
+        self.reference_cache = ReferenceCache(config.REFERENCE_CACHE_SIZE, config.REFERENCE_CACHE_TTL)
+        self.reference_cache.listen(self.Session)
+        if config.RESULT_CACHE_PATH:
+            backend = SQLiteBackend(config.RESULT_CACHE_PATH, config.RESULT_CACHE_SIZE)
+        else:
+            backend = MemoryBackend(config.RESULT_CACHE_SIZE)
+        self.result_cache = ResultCache(backend)
+        self.result_cache.listen(self.Session)
+        self.instrumentation = None
+        if config.QUERY_PROFILING:
+            self.instrument(config.QUERY_SAMPLE_RATE, config.QUERY_PROFILE_TOP)
+        if config.WARM_UP_SCHEMAS:
+            self.warm_up(*config.WARM_UP_SCHEMAS)
 
     def create_db(self, base):
-        base.metadata.create_all(self.connection)
+        base.metadata.create_all(self.engine)
+
+    def warm_up(self, *schemas):
+        """
+        Configure the mappers of team schemas and open a pooled connection, so that the
+        first query of a short-lived job does not pay for either.
+
+        :param schemas: Schema names, ``club`` and/or ``natl``.
+        :return: Elapsed wall time in seconds.
+        """
+        from light.schemas import warm_up
+
+        start = time.time()
+        warm_up(*schemas)
+        self.engine.connect().close()
+        return time.time() - start
+
+    @contextmanager
+    def _session_profile(self):
+        if self.instrumentation is None:
+            yield None
+        else:
+            with self.instrumentation.profile() as stats:
+                yield stats
 
     @contextmanager
     def create_session(self):
-        session = Session(self.connection)
-        try:
-            yield session
-            session.commit()
-        except Exception as ex:
-            session.rollback()
-            raise ex
-        finally:
-            session.close()
+        with self._session_profile() as stats:
+            session = self.Session()
+            if stats is not None:
+                session.info['query_stats'] = stats
+            try:
+                yield session
+                session.commit()
+            except Exception as ex:
+                session.rollback()
+                raise ex
+            finally:
+                if self.scoped:
+                    self.Session.remove()
+                else:
+                    session.close()
+
+    def instrument(self, sample_rate=1.0, top=None, callback=None):
+        """
+        Turn on statement instrumentation of the engine, if it is not on already.
+
+        :param sample_rate: Fraction of sessions and profiles that record statements.
+        :param top: Number of slowest normalized statements reported, ``light.profiling.DEFAULT_TOP`` if None.
+        :param callback: Function called with the QueryStats object of every sampled profile when it ends.
+        :return: Instrumentation object, which also holds the totals of all profiles in ``stats``.
+        """
+        from light.profiling import Instrumentation, DEFAULT_TOP
+
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation(self.engine, sample_rate, DEFAULT_TOP if top is None else top,
+                                                   callback)
+            self.instrumentation.listen()
+        return self.instrumentation
+
+    def profile(self, sample_rate=None):
+        """
+        Profile the statements executed by the current thread within a ``with`` block,
+        turning on instrumentation if needed.
+
+        :param sample_rate: Override of the sampling rate of the instrumentation.
+        :return: Context manager that yields a QueryStats object.
+        """
+        return self.instrument().profile(sample_rate)
+
+    def dispose(self):
+        """Close all pooled connections and stop invalidating the caches and instrumenting statements."""
+        self.reference_cache.remove(self.Session)
+        self.result_cache.remove(self.Session)
+        if self.instrumentation is not None:
+            self.instrumentation.remove()
+        self.engine.dispose()
+
+    def bulk_load_matches(self, rows, model, block_size=None):
+        """
+        Load match records in a single transaction, bypassing the ORM unit of work.
+
+        Matches whose natural key is loaded already raise IntegrityError; see :meth:`import_matches`
+        with ``upsert`` for re-deliveries.
+
+        :param rows: Iterable of dictionaries keyed by column name.
+        :param model: Mapped match class, e.g. ``ClubLeagueMatches``.
+        :param block_size: Number of rows per executemany batch, ``light.bulk.DEFAULT_BLOCK_SIZE`` if None.
+        :return: LoadStats object with row count and rows/sec.
+        """
+        from light.bulk import bulk_load_matches, DEFAULT_BLOCK_SIZE
+
+        if block_size is None:
+            block_size = DEFAULT_BLOCK_SIZE
+        with self.engine.begin() as connection:
+            stats = bulk_load_matches(connection, rows, model, block_size=block_size)
+        self.result_cache.invalidate()
+        return stats
+
+    def import_matches(self, path, schema='club', chunk_size=None, upsert=False):
+        """
+        Import matches from a CSV or JSON Lines file, committing every ``chunk_size`` rows.
+
+        :param path: Path to ``.csv`` or ``.jsonl`` file.
+        :param schema: ``club`` or ``natl``.
+        :param chunk_size: Number of rows per committed chunk, ``light.importer.DEFAULT_CHUNK_SIZE`` if None.
+        :param upsert: Update previously imported matches that changed and skip unchanged ones.
+        :return: Generator of LoadStats objects, one per chunk, that count the matches written.
+        """
+        from light.importer import MatchImporter, read_rows, DEFAULT_CHUNK_SIZE
+
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        with self.create_session() as session:
+            for stats in MatchImporter(session, schema, chunk_size, upsert).run(read_rows(path)):
+                self.result_cache.invalidate()
+                yield stats
+
+    def stage_matches(self, path, schema='club', block_size=None):
+        """
+        Import matches from a CSV or JSON Lines file in a single transaction, through a staging
+        table loaded with COPY on PostgreSQL.  See :func:`light.staging.stage_matches`.
+
+        :param path: Path to ``.csv`` or ``.jsonl`` file.
+        :param schema: ``club`` or ``natl``.
+        :param block_size: Number of rows per COPY statement or per importer chunk,
+            ``light.staging.COPY_BLOCK_SIZE`` if None.
+        :return: LoadStats object.
+        """
+        from light.importer import read_rows
+        from light.staging import stage_matches, COPY_BLOCK_SIZE
+
+        if block_size is None:
+            block_size = COPY_BLOCK_SIZE
+        with self.create_session() as session:
+            stats = stage_matches(session, read_rows(path), schema, block_size)
+        self.result_cache.invalidate()
+        return stats
+
+    def backfill(self, job, task, schema='club', partitions=None, workers=None, restart=False):
+        """
+        Run a backfill job over (competition, season) partitions on a pool of worker processes
+        with engines of their own, resuming after the partitions checkpointed by earlier runs.
+        See :func:`light.backfill.backfill`.
+
+        :param job: Job name, under which partitions are checkpointed.
+        :param task: Task function, or name of a built-in task (``standings``, ``matchday_standings``,
+            ``match_facts``).
+        :param schema: ``club`` or ``natl``.
+        :param partitions: Sequence of (competition ID, season ID) tuples, all partitions of matches if None.
+        :param workers: Number of worker processes, one per CPU if None.
+        :param restart: Clear the checkpoints of the job first.
+        :return: BackfillReport object with the timing of every partition.
+        """
+        from light.backfill import backfill
+
+        report = backfill(self.config, job, task, schema, partitions, workers, restart)
+        self.result_cache.invalidate()
+        return report
+
+    def stream_matches(self, schema='club', chunk_size=None, team_id=None):
+        """
+        Iterate over all matches of a schema with phase columns and teams in a session of its own,
+        loading ``chunk_size`` matches at a time.  See :func:`light.loaders.stream_matches`.
+
+        :param schema: ``club`` or ``natl``.
+        :param chunk_size: Number of matches loaded per round trip, ``light.loaders.DEFAULT_CHUNK_SIZE`` if None.
+        :param team_id: Restrict to matches of a team, home or away.
+        :return: Generator of match objects.
+        """
+        from light.loaders import stream_matches, DEFAULT_CHUNK_SIZE
 
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        with self.create_session() as session:
+            for match in stream_matches(session, schema, chunk_size, team_id):
+                yield match
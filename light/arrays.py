@@ -0,0 +1,239 @@
+"""
+Columnar in-memory store of match results backed by NumPy arrays.
+
+:class:`MatchArray` holds the IDs, dates, competitions, seasons, teams, goals and phases
+of a match history in one NumPy array per column, loaded in batches with a Core select
+across the match tables of a schema.  Dates are ``datetime64[D]`` values, phases are
+stored as ``int8`` codes into :data:`PHASES`, and missing IDs and goals are stored as -1.
+Filters are vectorized boolean masks, and arrays can be saved to a compressed ``.npz``
+file or to a directory of ``.npy`` files that can be memory-mapped.
+
+This module requires the optional ``numpy`` package.
+"""
+import os
+
+from sqlalchemy import select
+
+from light.queries import match_results_select
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_BATCH_SIZE = 65536
+
+PHASES = ('friendly', 'league', 'group', 'knockout')
+
+COLUMNS = ('id', 'date', 'competition_id', 'season_id', 'home_team_id', 'away_team_id',
+           'home_goals', 'away_goals', 'phase')
+
+MISSING = -1
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("MatchArray requires the numpy package")
+
+
+def _dtypes():
+    return {
+        'id': np.int64,
+        'date': 'datetime64[D]',
+        'competition_id': np.int64,
+        'season_id': np.int64,
+        'home_team_id': np.int64,
+        'away_team_id': np.int64,
+        'home_goals': np.int16,
+        'away_goals': np.int16,
+        'phase': np.int8
+    }
+
+
+def _batch_arrays(rows, dtypes):
+    phase_codes = dict((phase, code) for code, phase in enumerate(PHASES))
+    columns = dict(zip(COLUMNS, zip(*rows)))
+    arrays = {}
+    for name in COLUMNS:
+        values = columns[name]
+        if name == 'date':
+            values = [value if value is not None else 'NaT' for value in values]
+        elif name == 'phase':
+            values = [phase_codes.get(value, MISSING) for value in values]
+        else:
+            values = [value if value is not None else MISSING for value in values]
+        arrays[name] = np.array(values, dtype=dtypes[name])
+    return arrays
+
+
+class MatchArray(object):
+    """
+    Match results held in NumPy arrays, one per column.
+
+    Columns are available as attributes (``ids``, ``dates``, ``competition_ids``,
+    ``season_ids``, ``home_team_ids``, ``away_team_ids``, ``home_goals``, ``away_goals``
+    and ``phases``) and by column name with ``array['home_team_id']``.
+
+    :param columns: Dictionary of NumPy arrays of equal length keyed by column name.
+    """
+
+    def __init__(self, columns):
+        _require_numpy()
+        self.columns = dict((name, columns[name]) for name in COLUMNS)
+
+    @classmethod
+    def load(cls, connection, schema, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Load the match results of a club or national team database, ordered by date and ID.
+
+        :param connection: Connection object.
+        :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+        :param batch_size: Number of rows fetched per round trip.
+        :return: MatchArray object.
+        """
+        _require_numpy()
+        results = match_results_select(schema)
+        query = select([results.c[name] for name in COLUMNS]).order_by(results.c.date, results.c.id)
+        dtypes = _dtypes()
+        batches = []
+        result = connection.execution_options(stream_results=True).execute(query)
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                batches.append(_batch_arrays(rows, dtypes))
+        finally:
+            result.close()
+        return cls(dict((name, np.concatenate([batch[name] for batch in batches]) if batches
+                         else np.empty(0, dtype=dtypes[name])) for name in COLUMNS))
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __repr__(self):
+        return "<MatchArray(matches={0})>".format(len(self))
+
+    @property
+    def ids(self):
+        return self.columns['id']
+
+    @property
+    def dates(self):
+        return self.columns['date']
+
+    @property
+    def competition_ids(self):
+        return self.columns['competition_id']
+
+    @property
+    def season_ids(self):
+        return self.columns['season_id']
+
+    @property
+    def home_team_ids(self):
+        return self.columns['home_team_id']
+
+    @property
+    def away_team_ids(self):
+        return self.columns['away_team_id']
+
+    @property
+    def home_goals(self):
+        return self.columns['home_goals']
+
+    @property
+    def away_goals(self):
+        return self.columns['away_goals']
+
+    @property
+    def phases(self):
+        return self.columns['phase']
+
+    def results(self):
+        """Return the results from the home team's point of view: 1 for a win, 0 for a draw, -1 for a loss."""
+        return np.sign(self.home_goals.astype(np.int32) - self.away_goals)
+
+    def mask(self, team_id=None, competition_id=None, season_id=None, phase=None, start=None, end=None):
+        """
+        Return a boolean mask of the matches that satisfy all criteria.
+
+        IDs and phases can be single values or collections.
+
+        :param team_id: Team ID(s), home or away.
+        :param competition_id: Competition ID(s).
+        :param season_id: Season ID(s).
+        :param phase: Phase name(s).
+        :param start: First date (date object or ISO string), inclusive.
+        :param end: Last date (date object or ISO string), inclusive.
+        :return: NumPy boolean array.
+        """
+        collections = (list, tuple, set, frozenset, np.ndarray)
+
+        def matches(column, values):
+            if isinstance(values, collections):
+                return np.isin(column, np.asarray(list(values)))
+            return column == values
+
+        selected = np.ones(len(self), dtype=bool)
+        if team_id is not None:
+            selected &= matches(self.home_team_ids, team_id) | matches(self.away_team_ids, team_id)
+        if competition_id is not None:
+            selected &= matches(self.competition_ids, competition_id)
+        if season_id is not None:
+            selected &= matches(self.season_ids, season_id)
+        if phase is not None:
+            phases = phase if isinstance(phase, collections) else [phase]
+            selected &= matches(self.phases, [PHASES.index(name) for name in phases])
+        if start is not None:
+            selected &= self.dates >= np.datetime64(start, 'D')
+        if end is not None:
+            selected &= self.dates <= np.datetime64(end, 'D')
+        return selected
+
+    def take(self, selection):
+        """
+        Return a MatchArray with the matches selected by a boolean mask or an array of positions.
+
+        :param selection: Boolean mask or integer index array.
+        """
+        return MatchArray(dict((name, column[selection]) for name, column in self.columns.items()))
+
+    def filter(self, **criteria):
+        """Return a MatchArray with the matches that satisfy the criteria of :meth:`mask`."""
+        return self.take(self.mask(**criteria))
+
+    def save(self, path):
+        """
+        Save the arrays to a compressed ``.npz`` file, or to a directory of ``.npy`` files
+        that can be memory-mapped by :meth:`open`.
+
+        :param path: Path to ``.npz`` file or directory.
+        """
+        if path.endswith('.npz'):
+            np.savez_compressed(path, **self.columns)
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            for name, column in self.columns.items():
+                np.save(os.path.join(path, name + '.npy'), column)
+
+    @classmethod
+    def open(cls, path, mmap_mode=None):
+        """
+        Load arrays saved with :meth:`save`.
+
+        :param path: Path to ``.npz`` file or directory.
+        :param mmap_mode: Memory-map the ``.npy`` files of a directory, e.g. ``r`` for read-only access.
+        :return: MatchArray object.
+        """
+        _require_numpy()
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return cls(dict((name, data[name]) for name in COLUMNS))
+        return cls(dict((name, np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode))
+                        for name in COLUMNS))
@@ -0,0 +1,252 @@
+"""
+Parallel backfill of derived data, partitioned by competition and season.
+
+A backfill job runs a task once per (competition, season) partition on a pool of
+worker processes.  Every worker builds its own engine from the configuration of the
+job, with its connection pool settings, and runs each partition in its own
+transaction, which also writes the checkpoint of the partition to
+``backfill_checkpoints``.  A job that is interrupted
+or has failed partitions resumes with the partitions that were not committed when
+it is run again under the same name.
+
+Partitions are scheduled largest first (by number of matches), so that the workers
+finish at about the same time.  Tasks are functions of
+``(connection, schema, competition_id, season_id)`` that return the number of rows
+they wrote, or None; they must be defined at module level so that they can be sent
+to the workers.  Built-in tasks are listed in :data:`TASKS`.
+
+SQLite databases serialize writers, so parallel backfills need a client/server
+database (e.g. PostgreSQL) to scale with the number of workers.
+"""
+import time
+import traceback
+from datetime import datetime
+
+from sqlalchemy import select, func, and_
+
+import light.common.models as lcm
+from light.engine import config_engine
+from light.facts import refresh_partition_facts
+
+
+# None runs one worker process per CPU.
+DEFAULT_WORKERS = None
+
+
+def _require_club(schema):
+    if schema != 'club':
+        raise ValueError("Standings are only kept in club databases, not '{0}'".format(schema))
+
+
+def standings_task(connection, schema, competition_id, season_id):
+    """
+    Rebuild the league standings of a competition and season (club databases).
+
+    :raises ValueError: if the schema is not ``club``.
+    """
+    _require_club(schema)
+    from light.standings import refresh_standings
+    from light.club import ClubStandings
+    refresh_standings(connection, competition_id, season_id)
+    return connection.scalar(select([func.count()]).where(and_(
+        ClubStandings.competition_id == competition_id, ClubStandings.season_id == season_id)))
+
+
+def matchday_standings_task(connection, schema, competition_id, season_id):
+    """
+    Rebuild the matchday standings of a competition and season (club databases).
+
+    :raises ValueError: if the schema is not ``club``.
+    """
+    _require_club(schema)
+    from light.standings import refresh_matchday_standings
+    from light.club import ClubMatchdayStandings
+    refresh_matchday_standings(connection, competition_id, season_id)
+    return connection.scalar(select([func.count()]).where(and_(
+        ClubMatchdayStandings.competition_id == competition_id, ClubMatchdayStandings.season_id == season_id)))
+
+
+def match_facts_task(connection, schema, competition_id, season_id):
+    """Rewrite the match facts of a competition and season."""
+    return refresh_partition_facts(connection, schema, competition_id, season_id)
+
+
+TASKS = {
+    'standings': standings_task,
+    'matchday_standings': matchday_standings_task,
+    'match_facts': match_facts_task
+}
+
+
+class PartitionResult(object):
+    """
+    Outcome of a backfill partition.
+
+    :param competition_id: Competition ID.
+    :param season_id: Season ID.
+    :param rows: Number of rows written by the task, or None.
+    :param elapsed: Wall time of the partition in seconds.
+    :param error: Traceback of a failed partition, or None.
+    """
+
+    def __init__(self, competition_id, season_id, rows=None, elapsed=0.0, error=None):
+        self.competition_id = competition_id
+        self.season_id = season_id
+        self.rows = rows
+        self.elapsed = elapsed
+        self.error = error
+
+    def as_dict(self):
+        return {'competition_id': self.competition_id, 'season_id': self.season_id, 'rows': self.rows,
+                'elapsed': self.elapsed, 'error': self.error}
+
+    def __repr__(self):
+        return "<PartitionResult(competition_id={0}, season_id={1}, rows={2}, elapsed={3:.3f}s{4})>".format(
+            self.competition_id, self.season_id, self.rows, self.elapsed, ', failed' if self.error else '')
+
+
+class BackfillReport(object):
+    """
+    Summary of a backfill run.
+
+    :param job: Job name.
+    :param skipped: Number of partitions completed by earlier runs.
+    """
+
+    def __init__(self, job, skipped=0):
+        self.job = job
+        self.skipped = skipped
+        self.results = []
+        self.elapsed = 0.0
+
+    @property
+    def completed(self):
+        """Results of the partitions completed by this run."""
+        return [r for r in self.results if r.error is None]
+
+    @property
+    def failed(self):
+        """Results of the partitions that failed in this run."""
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def rows(self):
+        """Number of rows written by the partitions completed by this run."""
+        return sum(r.rows or 0 for r in self.completed)
+
+    def as_dict(self):
+        return {'job': self.job, 'skipped': self.skipped, 'completed': len(self.completed),
+                'failed': len(self.failed), 'rows': self.rows, 'elapsed': self.elapsed,
+                'partitions': [r.as_dict() for r in self.results]}
+
+    def __repr__(self):
+        return "<BackfillReport(job={0}, completed={1}, failed={2}, skipped={3}, elapsed={4:.3f}s)>".format(
+            self.job, len(self.completed), len(self.failed), self.skipped, self.elapsed)
+
+
+def match_partitions(connection):
+    """
+    Return the (competition ID, season ID) partitions of all matches, largest first.
+
+    :param connection: Connection object.
+    :return: List of tuples.
+    """
+    matches = lcm.Matches.__table__
+    query = select([matches.c.competition_id, matches.c.season_id])\
+        .where(and_(matches.c.competition_id.isnot(None), matches.c.season_id.isnot(None)))\
+        .group_by(matches.c.competition_id, matches.c.season_id)\
+        .order_by(func.count(matches.c.id).desc(), matches.c.competition_id, matches.c.season_id)
+    return [(row[0], row[1]) for row in connection.execute(query)]
+
+
+def run_partition(engine, job, task, schema, partition):
+    """
+    Run a task on a partition and write its checkpoint in one transaction.
+
+    :param engine: Engine object.
+    :param job: Job name.
+    :param task: Task function.
+    :param schema: Schema name passed to the task.
+    :param partition: Tuple of (competition ID, season ID).
+    :return: PartitionResult object, with the traceback of the error if the task failed.
+    """
+    competition_id, season_id = partition
+    start = time.time()
+    try:
+        with engine.begin() as connection:
+            rows = task(connection, schema, competition_id, season_id)
+            elapsed = time.time() - start
+            connection.execute(lcm.BackfillCheckpoints.__table__.insert(), {
+                'job': job, 'competition_id': competition_id, 'season_id': season_id,
+                'rows': rows, 'elapsed': elapsed, 'completed': datetime.utcnow()})
+    except Exception:
+        return PartitionResult(competition_id, season_id, elapsed=time.time() - start, error=traceback.format_exc())
+    return PartitionResult(competition_id, season_id, rows, elapsed)
+
+
+_engine = None
+
+
+def _init_worker(config):
+    global _engine
+    _engine = config_engine(config)
+
+
+def _run_partition(args):
+    return run_partition(_engine, *args)
+
+
+def backfill(config, job, task, schema='club', partitions=None, workers=DEFAULT_WORKERS, restart=False):
+    """
+    Run a backfill job over (competition, season) partitions on a pool of worker processes.
+
+    Partitions checkpointed by earlier runs of the job are skipped.  A failed partition does
+    not stop the others; it is reported and runs again when the job is resumed.
+
+    :param config: Config object of the database.  Every worker builds its own engine from it.
+    :param job: Job name, under which partitions are checkpointed.
+    :param task: Task function, or name of a built-in task in :data:`TASKS`.
+    :param schema: Schema name (``club`` or ``natl``) passed to the task.
+    :param partitions: Sequence of (competition ID, season ID) tuples, all partitions of matches if None.
+    :param workers: Number of worker processes, one per CPU if None; with one worker, partitions run
+        in this process.
+    :param restart: Clear the checkpoints of the job first.
+    :return: BackfillReport object.
+    :raises ValueError: if the task is unknown or the database is in memory.
+    """
+    if not callable(task):
+        try:
+            task = TASKS[task]
+        except KeyError:
+            raise ValueError("Unknown backfill task '{0}'".format(task))
+    import multiprocessing
+    workers = workers or multiprocessing.cpu_count()
+    start = time.time()
+    engine = config_engine(config)
+    if engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:'):
+        raise ValueError("Backfill requires a database that can be shared by processes")
+    table = lcm.BackfillCheckpoints.__table__
+    try:
+        table.create(engine, checkfirst=True)
+        with engine.begin() as connection:
+            if restart:
+                connection.execute(table.delete().where(table.c.job == job))
+            done = set(tuple(row) for row in connection.execute(
+                select([table.c.competition_id, table.c.season_id]).where(table.c.job == job)))
+            partitions = match_partitions(connection) if partitions is None else [tuple(p) for p in partitions]
+        pending = [p for p in partitions if p not in done]
+        report = BackfillReport(job, len(partitions) - len(pending))
+        if workers <= 1 or len(pending) <= 1:
+            report.results = [run_partition(engine, job, task, schema, p) for p in pending]
+    finally:
+        engine.dispose()
+
+    if workers > 1 and len(pending) > 1:
+        pool = multiprocessing.Pool(min(workers, len(pending)), _init_worker, (config,))
+        try:
+            report.results = list(pool.imap_unordered(_run_partition, [(job, task, schema, p) for p in pending]))
+        finally:
+            pool.close()
+            pool.join()
+    report.elapsed = time.time() - start
+    return report
@@ -0,0 +1,427 @@
+"""
+Bulk loading of match records.
+
+Match models are mapped with joined-table inheritance, so flushing a single
+``ClubLeagueMatches`` object through the ORM emits an INSERT into ``matches``,
+``league_matches`` and ``club_league_matches`` and fetches a new primary key
+for every row.  The loader in this module pre-allocates primary keys in blocks
+and then emits one executemany INSERT per inheritance level, parent tables first.
+
+Matches are identified by a natural key (competition, season, date, home team, away
+team and phase), stored as a digest in ``matches.match_key`` under a unique index,
+together with a digest of the match content.  Both digests are written by every loader;
+matches written through the ORM are keyed with :func:`rebuild_match_keys`.  The upsert
+loader looks re-delivered rows up by key with one SELECT per block; unchanged rows are
+skipped, changed rows are updated in place on every inheritance level, so that their
+primary keys and the records that refer to them survive corrections.
+"""
+import time
+import hashlib
+from datetime import date
+from collections import OrderedDict
+from itertools import islice
+
+from sqlalchemy import select, func, and_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import class_mapper
+
+
+DEFAULT_BLOCK_SIZE = 5000
+
+NATURAL_KEY = ('competition_id', 'season_id', 'date', 'home_team_id', 'away_team_id')
+
+DIGEST_COLUMNS = ('match_key', 'content_hash')
+
+
+class LoadStats(object):
+    """
+    Summary of a bulk load: number of rows written, elapsed wall time and throughput.
+    """
+
+    def __init__(self, rows=0, elapsed=0.0):
+        self.rows = rows
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        """Rows written per second."""
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __add__(self, other):
+        return LoadStats(self.rows + other.rows, self.elapsed + other.elapsed)
+
+    def __repr__(self):
+        return "<LoadStats(rows={0}, elapsed={1:.3f}s, rate={2:.1f} rows/s)>".format(
+            self.rows, self.elapsed, self.rate)
+
+
+class UpsertStats(LoadStats):
+    """
+    Summary of an upsert: rows inserted, updated and skipped as unchanged.  ``rows`` counts rows written.
+    """
+
+    def __init__(self, inserted=0, updated=0, unchanged=0, elapsed=0.0):
+        super(UpsertStats, self).__init__(inserted + updated, elapsed)
+        self.inserted = inserted
+        self.updated = updated
+        self.unchanged = unchanged
+
+    def __repr__(self):
+        return "<UpsertStats(inserted={0}, updated={1}, unchanged={2}, elapsed={3:.3f}s)>".format(
+            self.inserted, self.updated, self.unchanged, self.elapsed)
+
+
+def inheritance_tables(model):
+    """
+    Return the tables of a mapped class ordered from the root of its inheritance hierarchy to the leaf.
+
+    :param model: Mapped class.
+    :return: List of Table objects.
+    """
+    mapper = class_mapper(model)
+    tables = []
+    for m in reversed(list(mapper.iterate_to_root())):
+        if m.local_table not in tables:
+            tables.append(m.local_table)
+    return tables
+
+
+def allocate_ids(connection, table, count):
+    """
+    Reserve a block of primary key values for a table.
+
+    On databases that support sequences, values are drawn from the sequence attached to the
+    primary key column (in a single statement on PostgreSQL).  Otherwise the block starts after
+    the current maximum key, which assumes the caller holds the only writing transaction.
+
+    :param connection: Connection object.
+    :param table: Table whose primary key is allocated.
+    :param count: Number of keys to reserve.
+    :return: List of primary key values.
+    """
+    if count <= 0:
+        return []
+    pk = list(table.primary_key.columns)[0]
+    seq = pk.default if pk.default is not None and pk.default.is_sequence else None
+    if seq is not None and connection.dialect.supports_sequences:
+        if connection.dialect.name == 'postgresql':
+            stmt = select([seq.next_value()]).select_from(func.generate_series(1, count).alias())
+            return [row[0] for row in connection.execute(stmt)]
+        return [connection.execute(seq) for _ in range(count)]
+    start = connection.scalar(select([func.max(pk)]))
+    if start is None:
+        start = seq.start - 1 if seq is not None and seq.start is not None else 0
+    return list(range(start + 1, start + 1 + count))
+
+
+def _column_value(column, row):
+    if column.key in row:
+        return row[column.key]
+    default = column.default
+    if default is not None and default.is_scalar:
+        return default.arg
+    return None
+
+
+def _insert_block(connection, model, tables, rows):
+    mapper = class_mapper(model)
+    discriminator = mapper.polymorphic_on
+    root_pk = list(tables[0].primary_key.columns)[0]
+
+    if 'match_key' in tables[0].c:
+        for row in rows:
+            if row.get('match_key') is None:
+                row['match_key'] = match_key(row, mapper.polymorphic_identity)
+                row['content_hash'] = content_hash(row, tables)
+
+    ids = allocate_ids(connection, tables[0], len(rows))
+    for row, pk in zip(rows, ids):
+        row[root_pk.key] = pk
+
+    keys = set()
+    for row in rows:
+        keys.update(row)
+
+    for table in tables:
+        pk = list(table.primary_key.columns)[0]
+        columns = [c for c in table.columns if c is pk or c.key in keys or c.default is not None]
+        if discriminator is not None and discriminator.table is table and discriminator not in columns:
+            columns.append(discriminator)
+        params = []
+        for row, match_id in zip(rows, ids):
+            values = dict((c.key, _column_value(c, row)) for c in columns)
+            values[pk.key] = match_id
+            if discriminator is not None and discriminator.table is table:
+                values[discriminator.key] = mapper.polymorphic_identity
+            params.append(values)
+        connection.execute(table.insert(), params)
+    return ids
+
+
+def _digest(values):
+    text = u'\x1f'.join(u'' if v is None else v.isoformat() if isinstance(v, date) else u'{0}'.format(v)
+                         for v in values)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def match_key(row, phase):
+    """
+    Return the digest of the natural key of a match row.
+
+    :param row: Dictionary of column values with resolved IDs.
+    :param phase: Match phase.
+    """
+    return _digest([row.get(key) for key in NATURAL_KEY] + [phase])
+
+
+def content_hash(row, tables):
+    """
+    Return the digest of the content of a match row: the values of the columns of its inheritance tables,
+    with column defaults applied, followed by any other fields of the row.
+
+    :param row: Dictionary of column values.
+    :param tables: Inheritance tables of the match model.
+    """
+    columns = [c for table in tables for c in table.columns if not c.primary_key and c.key not in DIGEST_COLUMNS]
+    known = set(c.key for c in columns) | set(DIGEST_COLUMNS) | set(c.key for t in tables for c in t.primary_key)
+    values = [_column_value(c, row) for c in columns]
+    for key in sorted(key for key in row if key not in known):
+        values.extend([key, row[key]])
+    return _digest(values)
+
+
+def rebuild_match_keys(connection, schema, missing_only=True):
+    """
+    Write the natural key and content digests of matches that do not have them, e.g. matches
+    written through the ORM or before the digests were introduced.
+
+    Matches are keyed one (competition, season) partition at a time.  When several matches share
+    a natural key, the one with the lowest ID is keyed and the others keep a NULL key.  Transaction
+    control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param missing_only: Key only matches without a key; otherwise recompute the digests of all matches of the schema.
+    :return: Number of matches keyed.
+    """
+    from light.schemas import get_schema
+    schema = get_schema(schema) if isinstance(schema, str) else schema
+    shootouts = inheritance_tables(schema.shootout)[0]
+    count = 0
+    for phase, model in sorted(schema.matches.items()):
+        tables = inheritance_tables(model)
+        root = tables[0]
+        root_pk = list(root.primary_key.columns)[0]
+        discriminator = class_mapper(model).polymorphic_on
+        columns = [c for table in tables for c in table.columns
+                   if not c.primary_key and c is not discriminator and c.key not in DIGEST_COLUMNS]
+        source = root
+        for table in tables[1:]:
+            source = source.join(table, list(table.primary_key.columns)[0] == root_pk)
+        source = source.outerjoin(shootouts, list(shootouts.primary_key.columns)[0] == root_pk)
+        criterion = discriminator == phase
+        if not missing_only:
+            connection.execute(root.update().where(criterion).values(match_key=None, content_hash=None))
+        criterion = and_(criterion, root.c.match_key.is_(None))
+        query = select([root_pk, shootouts.c.home_shootout_goals, shootouts.c.away_shootout_goals] + columns)\
+            .select_from(source).where(criterion).order_by(root_pk).apply_labels()
+        stmt = root.update().where(root_pk == bindparam('_id')).values(
+            match_key=bindparam('_match_key'), content_hash=bindparam('_content_hash'))
+
+        partitions = connection.execute(
+            select([root.c.competition_id, root.c.season_id]).where(criterion).distinct()).fetchall()
+        for competition_id, season_id in partitions:
+            keyed = OrderedDict()
+            for row in connection.execute(query.where(and_(root.c.competition_id == competition_id,
+                                                            root.c.season_id == season_id))):
+                values = dict((c.key, row[c]) for c in columns if row[c] is not None)
+                if row[shootouts.c.home_shootout_goals] is not None:
+                    values['home_shootout_goals'] = row[shootouts.c.home_shootout_goals]
+                    values['away_shootout_goals'] = row[shootouts.c.away_shootout_goals]
+                key = match_key(values, phase)
+                if key not in keyed:
+                    keyed[key] = {'_id': row[root_pk], '_match_key': key,
+                                  '_content_hash': content_hash(values, tables)}
+            if keyed:
+                for taken, in connection.execute(select([root.c.match_key]).where(root.c.match_key.in_(list(keyed)))):
+                    keyed.pop(taken, None)
+            if keyed:
+                connection.execute(stmt, list(keyed.values()))
+                count += len(keyed)
+    return count
+
+
+def _update_block(connection, model, tables, rows):
+    mapper = class_mapper(model)
+    root_pk = list(tables[0].primary_key.columns)[0]
+    keys = set()
+    for row in rows:
+        keys.update(row)
+    for table in tables:
+        pk = list(table.primary_key.columns)[0]
+        columns = [c for c in table.columns if c is not pk and c is not mapper.polymorphic_on and
+                   (c.key in keys or c.default is not None)]
+        if not columns:
+            continue
+        stmt = table.update().where(pk == bindparam('_id')).values(
+            dict((c.key, bindparam('_' + c.key)) for c in columns))
+        params = []
+        for row in rows:
+            values = dict(('_' + c.key, _column_value(c, row)) for c in columns)
+            values['_id'] = row[root_pk.key]
+            params.append(values)
+        connection.execute(stmt, params)
+
+
+def _classify(connection, root, root_pk, latest):
+    """Split rows keyed by match key into new, changed and the number of unchanged rows."""
+    existing = dict((key, (pk, digest)) for key, pk, digest in connection.execute(
+        select([root.c.match_key, root_pk, root.c.content_hash]).where(root.c.match_key.in_(list(latest)))))
+    inserted, updated, unchanged = [], [], 0
+    for key, row in latest.items():
+        if key not in existing:
+            inserted.append(row)
+            continue
+        row[root_pk.key] = existing[key][0]
+        if existing[key][1] == row['content_hash']:
+            unchanged += 1
+        else:
+            updated.append(row)
+    return inserted, updated, unchanged
+
+
+def upsert_block(connection, model, rows, tables=None):
+    """
+    Insert new match rows, update changed ones and skip unchanged ones, by natural key.
+
+    Rows are modified in place to carry ``match_key``, ``content_hash`` and the primary key of
+    their match.  When a block holds several rows with the same natural key, the last one wins.
+
+    Existing keys are looked up before the new rows are inserted, so a concurrent load may insert
+    one of the new keys in between.  Except on SQLite, which serializes writers, new rows are
+    inserted in a savepoint; if a key is taken, the savepoint is rolled back and the new rows are
+    looked up again and written as updates where their key now exists.
+
+    :param connection: Connection object.
+    :param model: Mapped match class, e.g. ``ClubLeagueMatches``.
+    :param rows: List of dictionaries of column values with resolved IDs.
+    :param tables: Inheritance tables of the model, computed if None.
+    :return: Tuple of (inserted rows, updated rows, number of unchanged rows).
+    """
+    tables = tables or inheritance_tables(model)
+    phase = class_mapper(model).polymorphic_identity
+    root = tables[0]
+    root_pk = list(root.primary_key.columns)[0]
+
+    latest = OrderedDict()
+    for row in rows:
+        row['match_key'] = match_key(row, phase)
+        row['content_hash'] = content_hash(row, tables)
+        latest[row['match_key']] = row
+    inserted, updated, unchanged = _classify(connection, root, root_pk, latest)
+
+    if inserted and connection.dialect.name != 'sqlite':
+        savepoint = connection.begin_nested()
+        try:
+            _insert_block(connection, model, tables, inserted)
+        except IntegrityError:
+            savepoint.rollback()
+            retry = OrderedDict((row['match_key'], row) for row in inserted)
+            inserted, taken, taken_unchanged = _classify(connection, root, root_pk, retry)
+            updated.extend(taken)
+            unchanged += taken_unchanged
+            if inserted:
+                _insert_block(connection, model, tables, inserted)
+        else:
+            savepoint.commit()
+    elif inserted:
+        _insert_block(connection, model, tables, inserted)
+    if updated:
+        _update_block(connection, model, tables, updated)
+    return inserted, updated, unchanged + len(rows) - len(latest)
+
+
+def upsert_matches(connection, rows, model, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Load match records for a joined-inheritance match model by natural key, so that re-delivered
+    matches are updated in place if their content changed and skipped otherwise.
+
+    Rows are dictionaries keyed by column name, as for :func:`bulk_load_matches`, and must include
+    the natural key columns.  Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param rows: Iterable of dictionaries.
+    :param model: Mapped match class, e.g. ``ClubLeagueMatches``.
+    :param block_size: Number of rows looked up and written per batch.
+    :return: UpsertStats object.
+    """
+    tables = inheritance_tables(model)
+    rows = iter(rows)
+    stats = UpsertStats()
+    start = time.time()
+    while True:
+        block = list(islice(rows, block_size))
+        if not block:
+            break
+        inserted, updated, unchanged = upsert_block(connection, model, block, tables)
+        stats.inserted += len(inserted)
+        stats.updated += len(updated)
+        stats.unchanged += unchanged
+    stats.rows = stats.inserted + stats.updated
+    stats.elapsed = time.time() - start
+    return stats
+
+
+def bulk_insert(connection, rows, model, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Insert records of a mapped class without the ORM unit of work, e.g. ``ClubDeductions``.
+
+    Primary keys are allocated in blocks and every block is written with one executemany INSERT
+    per inheritance level, parent tables first.  Rows are dictionaries keyed by column name,
+    consumed from any iterable in blocks of ``block_size``, and modified in place to carry their
+    allocated primary key.  The discriminator is set from the model's polymorphic identity.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param rows: Iterable of dictionaries.
+    :param model: Mapped class with a single-column primary key.
+    :param block_size: Number of rows per executemany batch.
+    :return: LoadStats object.
+    """
+    tables = inheritance_tables(model)
+    rows = iter(rows)
+    stats = LoadStats()
+    start = time.time()
+    while True:
+        block = list(islice(rows, block_size))
+        if not block:
+            break
+        _insert_block(connection, model, tables, block)
+        stats.rows += len(block)
+    stats.elapsed = time.time() - start
+    return stats
+
+
+def bulk_load_matches(connection, rows, model, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Insert match records for a joined-inheritance match model without the ORM unit of work.
+
+    Rows are consumed from any iterable in blocks of ``block_size``, so a generator can be passed
+    to load very large histories in constant memory.  Each row is a dictionary keyed by column
+    name (e.g. ``date``, ``home_goals``, ``competition_id``, ``season_id``, ``matchday``,
+    ``home_team_id``).  The discriminator is set from the model's polymorphic identity.  Rows
+    are modified in place to carry their allocated primary key and their ``match_key`` and
+    ``content_hash`` digests.  A match whose natural key is taken already, including a second
+    row with the same natural key, violates the unique index on ``match_key`` and raises
+    IntegrityError, so re-deliveries are loaded with :func:`upsert_matches` instead.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param rows: Iterable of dictionaries.
+    :param model: Mapped match class, e.g. ``ClubLeagueMatches``.
+    :param block_size: Number of rows per executemany batch.
+    :return: LoadStats object.
+    """
+    return bulk_insert(connection, rows, model, block_size)
@@ -0,0 +1,514 @@
+"""
+Caches for reference data and match query results.
+
+Confederations, countries, years, seasons, competitions and rounds are small tables that
+rarely change.  :class:`ReferenceCache` keeps their column values by primary key and by
+natural key, so that lookups after the first are dictionary hits.  Cached records are
+attached to a session with ``Session.merge(load=False)``, which does not emit SQL, together
+with the cached reference records they refer to (e.g. the confederation of a country).
+
+Entries expire after a time-to-live and the least recently used entries are evicted when
+the cache is full.  Inserts, updates and deletes of reference records through the ORM
+invalidate the affected entries when the session commits, once the cache listens to the
+events of a session class or factory; changes made with Core statements or by other
+processes are only picked up when entries expire or the cache is cleared.
+
+:class:`ResultCache` keeps the rows of match queries, such as the fixtures of a competition
+and season, keyed by a hash of the compiled statement and its parameters.  Rows are held in
+a :class:`MemoryBackend` or in a :class:`SQLiteBackend` file that can be shared by several
+processes.  All cached results are invalidated when a session that has flushed matches,
+shootouts or deductions commits; until then, queries executed through that session bypass
+the cache, so that rows that are not committed yet are never cached.
+"""
+import time
+import pickle
+import hashlib
+import threading
+from itertools import chain
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.session import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+import light.common.models as lcm
+
+
+NATURAL_KEYS = OrderedDict([
+    (lcm.Confederations, 'name'),
+    (lcm.Countries, 'name'),
+    (lcm.Years, 'yr'),
+    (lcm.Seasons, 'label'),
+    (lcm.Competitions, 'name'),
+    (lcm.GroupRounds, 'name'),
+    (lcm.KnockoutRounds, 'name')
+])
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_TTL = 3600
+
+
+def _base(model):
+    return inspect(model).base_mapper.class_
+
+
+class _Entry(object):
+
+    def __init__(self, cls, values, related, natural, expires):
+        self.cls = cls
+        self.values = values
+        self.related = related
+        self.natural = natural
+        self.expires = expires
+
+
+class ReferenceCache(object):
+    """
+    Process-wide cache of reference records keyed by primary key and natural key.
+
+    :param maxsize: Maximum number of cached records.
+    :param ttl: Seconds a record stays cached, or None to keep records until evicted.
+    :param clock: Function that returns the current time in seconds.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._natural = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            if entry.expires is not None and entry.expires <= self.clock():
+                self._natural.pop((key[0], entry.natural), None)
+                return None
+            self._entries[key] = entry
+            return entry
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._natural.pop((key[0], entry.natural), None)
+
+    def _store(self, instance):
+        """Cache the column values of a reference record and the reference records it refers to."""
+        mapper = inspect(instance).mapper
+        base = mapper.base_mapper.class_
+        values = dict((prop.key, getattr(instance, prop.key)) for prop in mapper.column_attrs)
+        related = {}
+        for rel in mapper.relationships:
+            if rel.direction is MANYTOONE and _base(rel.mapper.class_) in NATURAL_KEYS:
+                target = getattr(instance, rel.key)
+                if target is not None:
+                    related[rel.key] = self._store(target)
+        key = (base, values[mapper.primary_key[0].key])
+        natural = values[NATURAL_KEYS[base]]
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = _Entry(mapper.class_, values, related, natural, expires)
+            self._natural[(base, natural)] = key[1]
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+        return key
+
+    def _detached(self, entry):
+        instance = inspect(entry.cls).class_manager.new_instance()
+        for name, value in entry.values.items():
+            set_committed_value(instance, name, value)
+        for name, related_key in entry.related.items():
+            related = self._entry(related_key)
+            if related is None:
+                return None
+            target = self._detached(related)
+            if target is None:
+                return None
+            set_committed_value(instance, name, target)
+        make_transient_to_detached(instance)
+        return instance
+
+    def _attach(self, session, key):
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        instance = self._detached(entry)
+        if instance is None:
+            return None
+        return session.merge(instance, load=False)
+
+    def get(self, session, model, pk):
+        """
+        Return a reference record by primary key, loading and caching it on a miss.
+
+        Sessions with flushed reference record changes that are not committed yet load
+        the record without reading or filling the cache.
+
+        :param session: Session object the record is attached to.
+        :param model: Reference model class.
+        :param pk: Primary key value.
+        :return: Record or None if it does not exist.
+        """
+        if session.info.get(self):
+            self._count(False)
+            return session.query(model).get(pk)
+        instance = self._attach(session, (_base(model), pk))
+        if instance is not None:
+            self._count(True)
+            return instance
+        self._count(False)
+        instance = session.query(model).get(pk)
+        if instance is not None:
+            self._store(instance)
+        return instance
+
+    def get_by(self, session, model, value):
+        """
+        Return a reference record by natural key, loading and caching it on a miss.
+
+        Natural keys are names, except for years (``yr``) and seasons (``label``, e.g. 2014-2015).
+        Sessions with flushed reference record changes that are not committed yet load the
+        record without reading or filling the cache.
+
+        :param session: Session object the record is attached to.
+        :param model: Reference model class.
+        :param value: Natural key value.
+        :return: Record or None if it does not exist.
+        :raises LookupError: More than one record has the natural key.
+        """
+        base = _base(model)
+        bypass = bool(session.info.get(self))
+        with self._lock:
+            pk = None if bypass else self._natural.get((base, value))
+        if pk is not None:
+            instance = self._attach(session, (base, pk))
+            if instance is not None:
+                self._count(True)
+                return instance
+        self._count(False)
+        records = session.query(model).filter(getattr(model, NATURAL_KEYS[base]) == value).limit(2).all()
+        if len(records) > 1:
+            raise LookupError("Ambiguous {0}: {1}".format(model.__name__, value))
+        if not records:
+            return None
+        if not bypass:
+            self._store(records[0])
+        return records[0]
+
+    def warm(self, session, *models):
+        """
+        Load all records of reference models into the cache with one query per model.
+
+        :param session: Session object.
+        :param models: Reference model classes, by default all of them.
+        """
+        for model in models or NATURAL_KEYS.keys():
+            for instance in session.query(model):
+                self._store(instance)
+
+    def attach(self, session, *models):
+        """
+        Attach all cached records of reference models to a session without emitting SQL.
+
+        Many-to-one relationships to attached records, such as ``Matches.season`` loaded with
+        the ``lazyload`` option, are then resolved from the session's identity map.  The
+        records are referenced from ``session.info`` so that they stay in the identity map
+        for the lifetime of the session.
+
+        :param session: Session object.
+        :param models: Reference model classes, by default all of them.
+        :return: List of attached records.
+        """
+        bases = set(_base(model) for model in models or NATURAL_KEYS.keys())
+        with self._lock:
+            keys = [key for key in self._entries if key[0] in bases]
+        instances = [instance for instance in (self._attach(session, key) for key in keys) if instance is not None]
+        session.info.setdefault('reference_records', []).extend(instances)
+        return instances
+
+    def invalidate(self, model, pk):
+        """Remove a reference record from the cache."""
+        with self._lock:
+            self._discard((_base(model), pk))
+
+    def clear(self):
+        """Remove all records from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._natural.clear()
+
+    def _flushed(self, session, flush_context):
+        changes = []
+        for instance in chain(session.new, session.dirty, session.deleted):
+            mapper = inspect(instance).mapper
+            base = mapper.base_mapper.class_
+            if base in NATURAL_KEYS:
+                changes.append((base, mapper.primary_key_from_instance(instance)[0],
+                                getattr(instance, NATURAL_KEYS[base])))
+        if changes:
+            session.info.setdefault(self, []).extend(changes)
+
+    def _committed(self, session):
+        changes = session.info.pop(self, None)
+        if not changes:
+            return
+        with self._lock:
+            for base, pk, natural in changes:
+                self._discard((base, pk))
+                other = self._natural.get((base, natural))
+                if other is not None:
+                    self._discard((base, other))
+
+    def _rolled_back(self, session):
+        session.info.pop(self, None)
+
+    def _listeners(self):
+        return (('after_flush', self._flushed), ('after_commit', self._committed),
+                ('after_rollback', self._rolled_back))
+
+    def listen(self, target=Session):
+        """
+        Invalidate cached records when sessions that inserted, updated or deleted reference records commit.
+
+        :param target: Session class or session factory whose sessions are watched.
+        """
+        for identifier, fn in self._listeners():
+            if not event.contains(target, identifier, fn):
+                event.listen(target, identifier, fn)
+
+    def remove(self, target=Session):
+        """Stop watching the sessions of a session class or factory."""
+        for identifier, fn in self._listeners():
+            if event.contains(target, identifier, fn):
+                event.remove(target, identifier, fn)
+
+
+RESULT_MODELS = (lcm.Matches, lcm.MatchShootouts, lcm.Deductions)
+
+
+class MemoryBackend(object):
+    """
+    In-process result storage with least-recently-used eviction.
+
+    :param maxsize: Maximum number of cached results.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        with self._lock:
+            value = self._results.pop(key, None)
+            if value is not None:
+                self._results[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._results.pop(key, None)
+            self._results[key] = value
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+class SQLiteBackend(object):
+    """
+    Result storage in a local SQLite file with least-recently-used eviction.
+
+    Results are pickled.  The file can be shared by processes on the same host, which then
+    also share invalidations.
+
+    :param path: Path to cache file.
+    :param maxsize: Maximum number of cached results.
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._lock = threading.Lock()
+        import sqlite3
+        self._binary = sqlite3.Binary
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value BLOB, accessed REAL)")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM results").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            return pickle.loads(bytes(row[0]))
+
+    def set(self, key, value):
+        blob = self._binary(pickle.dumps(value, 2))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)",
+                             (key, blob, time.time()))
+            count = self._db.execute("SELECT count(*) FROM results").fetchone()[0]
+            if count > self.maxsize:
+                self._db.execute("DELETE FROM results WHERE key IN "
+                                 "(SELECT key FROM results ORDER BY accessed LIMIT ?)", (count - self.maxsize,))
+                self.evictions += count - self.maxsize
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+
+    def close(self):
+        self._db.close()
+
+
+def result_key(statement, dialect):
+    """
+    Return the cache key of a statement: a hash of the dialect, the compiled SQL and its parameters.
+
+    :param statement: Select or Query object.
+    :param dialect: Dialect the statement is compiled for.
+    """
+    compiled = statement.compile(dialect=dialect)
+    params = sorted((name, repr(value)) for name, value in compiled.params.items())
+    text = u"{0}\n{1}\n{2}".format(dialect.name, compiled, params)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Cache of query results, invalidated by writes of matches, shootouts and deductions.
+
+    Results are lists of dictionaries keyed by column label.  Sessions that flush matches,
+    shootouts or deductions invalidate the cache once when they commit, and read around it
+    until then.  Writes with Core statements or the bulk loader are not seen by the session
+    events and require an explicit :meth:`invalidate`.
+
+    :param backend: MemoryBackend or SQLiteBackend object.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+
+    @property
+    def evictions(self):
+        return self.backend.evictions
+
+    def stats(self):
+        """Return a dictionary of hit, miss, eviction and invalidation counters."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations}
+
+    def execute(self, connectable, statement):
+        """
+        Return the rows of a statement from the cache, executing it on a miss.
+
+        Sessions with flushed writes that are not committed yet execute the statement
+        without reading or filling the cache.  Rows are not cached if the cache was
+        invalidated while the statement was executed, as they may predate the write.
+
+        :param connectable: Session, Connection or Engine object.
+        :param statement: Select object, or Query object whose statement is executed.
+        :return: List of dictionaries keyed by column label.
+        """
+        statement = getattr(statement, 'statement', statement)
+        if isinstance(connectable, Session) and connectable.info.get(self):
+            self._count(False)
+            return self._rows(connectable.execute(statement))
+        bind = connectable.get_bind() if hasattr(connectable, 'get_bind') else connectable
+        key = result_key(statement, bind.dialect)
+        rows = self.backend.get(key)
+        self._count(rows is not None)
+        if rows is not None:
+            return rows
+        generation = self.invalidations
+        rows = self._rows(connectable.execute(statement))
+        with self._lock:
+            if self.invalidations == generation:
+                self.backend.set(key, rows)
+        return rows
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _rows(result):
+        keys = list(result.keys())
+        return [dict(zip(keys, row)) for row in result]
+
+    def invalidate(self):
+        """Remove all cached results."""
+        with self._lock:
+            self.invalidations += 1
+            self.backend.clear()
+
+    def _flushed(self, session, flush_context):
+        if any(isinstance(instance, RESULT_MODELS)
+               for instance in chain(session.new, session.dirty, session.deleted)):
+            session.info[self] = True
+
+    def _committed(self, session):
+        if session.info.pop(self, False):
+            self.invalidate()
+
+    def _rolled_back(self, session):
+        session.info.pop(self, None)
+
+    def _listeners(self):
+        return (('after_flush', self._flushed), ('after_commit', self._committed),
+                ('after_rollback', self._rolled_back))
+
+    def listen(self, target=Session):
+        """
+        Invalidate cached results when sessions that wrote matches, shootouts or deductions commit.
+
+        :param target: Session class or session factory whose sessions are watched.
+        """
+        for identifier, fn in self._listeners():
+            if not event.contains(target, identifier, fn):
+                event.listen(target, identifier, fn)
+
+    def remove(self, target=Session):
+        """Stop watching the sessions of a session class or factory."""
+        for identifier, fn in self._listeners():
+            if event.contains(target, identifier, fn):
+                event.remove(target, identifier, fn)
@@ -1,7 +1,6 @@
-from copy import deepcopy
-
-from sqlalchemy import Column, Integer, Sequence, ForeignKey, Unicode
+from sqlalchemy import Column, Integer, Sequence, ForeignKey, Unicode, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship, backref
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.declarative import declared_attr, declarative_base
 
 import light.common as lc
@@ -9,7 +8,7 @@ import light.common.models as lcm
 
 
 ClubSchema = declarative_base(name="Clubs", metadata=lc.BaseSchema.metadata,
-                              class_registry=deepcopy(lc.BaseSchema._decl_class_registry))
+                              class_registry=lc.schema_registry())
 
 
 class Clubs(ClubSchema):
@@ -22,7 +21,7 @@ class Clubs(ClubSchema):
 
     name = Column(Unicode(60))
     country_id = Column(Integer, ForeignKey('countries.id'))
-    country = relationship('Countries', backref=backref('teams'))
+    country = relationship('Countries', lazy='joined', backref=backref('teams'))
 
     def __repr__(self):
         return "<Club(name={0}, country={1})>".format(self.name, self.country.name)
@@ -35,18 +34,18 @@ class ClubMixin(object):
 
     @declared_attr
     def team_id(cls):
-        return Column(Integer, ForeignKey('clubs.id'))
+        return Column(Integer, ForeignKey('clubs.id'), index=True)
 
 
 class ClubMatchMixin(object):
 
     @declared_attr
     def home_team_id(cls):
-        return Column(Integer, ForeignKey('clubs.id'))
+        return Column(Integer, ForeignKey('clubs.id'), index=True)
 
     @declared_attr
     def away_team_id(cls):
-        return Column(Integer, ForeignKey('clubs.id'))
+        return Column(Integer, ForeignKey('clubs.id'), index=True)
 
 
 class FriendlyMixin(object):
@@ -149,6 +148,10 @@ class ClubKnockoutMatches(KnockoutMixin, ClubMatchMixin, ClubSchema, lcm.Knockou
     id = Column(Integer, ForeignKey('knockout_matches.id'), primary_key=True)
 
 
+lcm.register_schema_identities('club', (ClubFriendlyMatches, ClubLeagueMatches, ClubGroupMatches,
+                                        ClubKnockoutMatches))
+
+
 class ClubShootoutMatches(ShootoutMixin, ClubMatchMixin, ClubSchema, lcm.MatchShootouts):
     __tablename__ = "club_shootout_matches"
     id = Column(Integer, ForeignKey('match_shootouts.id'), primary_key=True)
@@ -164,3 +167,91 @@ class ClubDeductions(ClubMixin, ClubSchema, lcm.Deductions):
     id = Column(Integer, ForeignKey('deductions.id'), primary_key=True)
 
     team = relationship('Clubs', foreign_keys="ClubDeductions.team_id", backref=backref('deductions'))
+
+
+class StandingsMixin(object):
+
+    @declared_attr
+    def competition_id(cls):
+        return Column(Integer, ForeignKey('competitions.id'), primary_key=True)
+
+    @declared_attr
+    def season_id(cls):
+        return Column(Integer, ForeignKey('seasons.id'), primary_key=True)
+
+    @declared_attr
+    def team_id(cls):
+        return Column(Integer, ForeignKey('clubs.id'), primary_key=True)
+
+    played = Column(Integer, default=0)
+    wins = Column(Integer, default=0)
+    draws = Column(Integer, default=0)
+    losses = Column(Integer, default=0)
+    goals_for = Column(Integer, default=0)
+    goals_against = Column(Integer, default=0)
+    deducted = Column(Integer, default=0)
+    points = Column(Integer, default=0)
+
+    @declared_attr
+    def competition(cls):
+        return relationship('Competitions')
+
+    @declared_attr
+    def season(cls):
+        return relationship('Seasons')
+
+    @declared_attr
+    def team(cls):
+        return relationship('Clubs')
+
+    @hybrid_property
+    def goal_difference(self):
+        return self.goals_for - self.goals_against
+
+
+class ClubStandings(StandingsMixin, ClubSchema):
+    """
+    League standings data model, derived from league matches and club deductions.
+
+    Rows are maintained by :mod:`light.standings`.
+    """
+    __tablename__ = "club_standings"
+
+    def __repr__(self):
+        return "<ClubStanding(team_id={0}, played={1}, gd={2}, points={3})>".format(
+            self.team_id, self.played, self.goal_difference, self.points)
+
+
+class ClubMatchdayStandings(StandingsMixin, ClubSchema):
+    """
+    Cumulative league standings after every matchday, derived from league matches and club deductions.
+
+    Rows are maintained by :mod:`light.standings`.
+    """
+    __tablename__ = "club_matchday_standings"
+    __table_args__ = (
+        PrimaryKeyConstraint('competition_id', 'season_id', 'matchday', 'team_id'),
+        {}
+    )
+
+    matchday = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return "<ClubMatchdayStanding(matchday={0}, team_id={1}, played={2}, points={3})>".format(
+            self.matchday, self.team_id, self.played, self.points)
+
+
+class ClubHeadToHead(lcm.HeadToHeadMixin, ClubSchema):
+    """
+    Head-to-head record of a pair of clubs over all matches, keyed by the lower team ID (``team_id``)
+    and the higher team ID (``opponent_id``).
+
+    Rows are maintained by :mod:`light.head_to_head`.
+    """
+    __tablename__ = "club_head_to_head"
+    __team_table__ = "clubs"
+    __team_model__ = "Clubs"
+
+    def __repr__(self):
+        return "<ClubHeadToHead(team_id={0}, opponent_id={1}, played={2}, record={3}-{4}-{5})>".format(
+            self.team_id, self.opponent_id, self.played, self.team_wins, self.draws, self.opponent_wins)
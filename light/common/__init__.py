@@ -2,3 +2,15 @@ from sqlalchemy.ext.declarative import declarative_base
 
 
 BaseSchema = declarative_base(name="Base")
+
+
+def schema_registry():
+    """
+    Return a class registry for the declarative base of a team schema, holding the common models.
+
+    The registry is a shallow copy of the registry of ``BaseSchema``: model classes are shared,
+    and the module registry, which every declarative base builds for itself, is left out.
+    """
+    registry = BaseSchema._decl_class_registry.copy()
+    registry.pop('_sa_module_registry', None)
+    return registry
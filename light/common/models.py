@@ -1,10 +1,11 @@
 from datetime import date
 
-from sqlalchemy.schema import CheckConstraint
+from sqlalchemy.schema import CheckConstraint, Index
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import (Column, Boolean, Integer, String, Sequence,
-                        ForeignKey, Unicode, Date, case, select, cast)
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy import (Column, Boolean, Integer, Float, String, Sequence,
+                        ForeignKey, Unicode, Date, DateTime, event, select)
 
 from light.common import BaseSchema
 
@@ -17,7 +18,7 @@ class Confederations(BaseSchema):
 
     id = Column(Integer, Sequence('confed_id_seq', start=10, increment=1), primary_key=True)
     name = Column(Unicode(10))
-    countries = relationship('Countries', backref=backref('confederation'))
+    countries = relationship('Countries', backref=backref('confederation', lazy='joined'))
 
     def __repr__(self):
         return "<Confederation(id={0}, name={1})>".format(self.id, self.name)
@@ -52,6 +53,10 @@ class Years(BaseSchema):
 class Seasons(BaseSchema):
     """
     Seasons data model.
+
+    The season name and the start and end years are stored with the record and kept
+    in step with the linked Years records on insert and update, so that seasons can be
+    searched by name through an index.
     """
     __tablename__ = "seasons"
 
@@ -60,19 +65,38 @@ class Seasons(BaseSchema):
     start_year_id = Column(Integer, ForeignKey('years.id'))
     end_year_id = Column(Integer, ForeignKey('years.id'))
 
+    label = Column(String(9), index=True)
+    start_yr = Column(Integer)
+    end_yr = Column(Integer)
+
     start_year = relationship('Years', foreign_keys=[start_year_id])
     end_year = relationship('Years', foreign_keys=[end_year_id])
 
+    @staticmethod
+    def format_name(start_yr, end_yr):
+        """
+        Return season name from start and end years: YYYY for seasons over a calendar year,
+        YYYY-YYYY for seasons over two years.
+        """
+        if start_yr == end_yr:
+            return str(start_yr)
+        else:
+            return "{0}-{1}".format(start_yr, end_yr)
+
+    def _years(self):
+        if self.start_yr is not None and self.end_yr is not None:
+            return self.start_yr, self.end_yr
+        return self.start_year.yr, self.end_year.yr
+
     @hybrid_property
     def name(self):
         """
         List year(s) that make up season.  Seasons over calendar year will be of form YYYY;
         seasons over two years will be of form YYYY-YYYY.
         """
-        if self.start_year.yr == self.end_year.yr:
-            return str(self.start_year.yr)
-        else:
-            return "{0}-{1}".format(self.start_year.yr, self.end_year.yr)
+        if self.label is not None:
+            return self.label
+        return self.format_name(*self._years())
 
     @name.expression
     def name(cls):
@@ -82,9 +106,7 @@ class Seasons(BaseSchema):
 
         This expression allows `name` to be used as a query parameter.
         """
-        yr1 = select([Years.yr]).where(cls.start_year_id == Years.id).as_scalar()
-        yr2 = select([Years.yr]).where(cls.end_year_id == Years.id).as_scalar()
-        return cast(yr1, String) + case([(yr1 == yr2, '')], else_='-'+cast(yr2, String))
+        return cls.label
 
     @hybrid_property
     def reference_date(self):
@@ -101,15 +123,36 @@ class Seasons(BaseSchema):
 
         :return: Date object that expresses reference date.
         """
-        if self.start_year.yr == self.end_year.yr:
-            return date(self.end_year.yr, 12, 31)
+        start_yr, end_yr = self._years()
+        if start_yr == end_yr:
+            return date(end_yr, 12, 31)
         else:
-            return date(self.end_year.yr, 6, 30)
+            return date(end_yr, 6, 30)
 
     def __repr__(self):
         return "<Season({0})>".format(self.name)
 
 
+@event.listens_for(Seasons, 'before_insert')
+@event.listens_for(Seasons, 'before_update')
+def season_years(mapper, connection, target):
+    """
+    Copy the years of a season and its name into the season record before it is written.
+    """
+    years = []
+    for year, year_id in [(target.__dict__.get('start_year'), target.start_year_id),
+                          (target.__dict__.get('end_year'), target.end_year_id)]:
+        if year is not None:
+            years.append(year.yr)
+        elif year_id is not None:
+            years.append(connection.scalar(select([Years.yr]).where(Years.id == year_id)))
+        else:
+            years.append(None)
+    target.start_yr, target.end_yr = years
+    if None not in years:
+        target.label = Seasons.format_name(*years)
+
+
 class Competitions(BaseSchema):
     """
     Competitions common data model.
@@ -121,7 +164,7 @@ class Competitions(BaseSchema):
     level = Column(Integer)
     discriminator = Column('type', String(20))
 
-    __mapper_args__ = {'polymorphic_on': discriminator}
+    __mapper_args__ = {'polymorphic_on': discriminator, 'with_polymorphic': '*'}
 
 
 class DomesticCompetitions(Competitions):
@@ -130,7 +173,7 @@ class DomesticCompetitions(Competitions):
     """
     __mapper_args__ = {'polymorphic_identity': 'domestic'}
     country_id = Column(Integer, ForeignKey('countries.id'))
-    country = relationship('Countries', backref=backref('competitions'))
+    country = relationship('Countries', lazy='joined', backref=backref('competitions'))
 
     def __repr__(self):
         return "<DomesticCompetition(name={0}, country={1}, level={2})>".format(
@@ -143,7 +186,7 @@ class InternationalCompetitions(Competitions):
     """
     __mapper_args__ = {'polymorphic_identity': 'international'}
     confederation_id = Column(Integer, ForeignKey('confederations.id'))
-    confederation = relationship('Confederations', backref=backref('competitions'))
+    confederation = relationship('Confederations', lazy='joined', backref=backref('competitions'))
 
     def __repr__(self):
         return "<InternationalCompetition(name={0}, confederation={1})>".format(self.name, self.confederation.name)
@@ -191,8 +234,12 @@ class Matches(BaseSchema):
     competition_id = Column(Integer, ForeignKey('competitions.id'))
     season_id = Column(Integer, ForeignKey('seasons.id'))
 
-    competition = relationship('Competitions', backref=backref('matches', lazy='dynamic'))
-    season = relationship('Seasons', backref=backref('matches'))
+    # Digests of the natural key and of the content of matches, written by the loaders in light.bulk.
+    match_key = Column(String(40))
+    content_hash = Column(String(40))
+
+    competition = relationship('Competitions', lazy='joined', backref=backref('matches', lazy='dynamic'))
+    season = relationship('Seasons', lazy='joined', backref=backref('matches'))
 
     __mapper_args__ = {
         'polymorphic_identity': 'matches',
@@ -202,6 +249,10 @@ class Matches(BaseSchema):
     __table_args__ = (
         CheckConstraint('home_goals >= 0', name='nonneg_home_goals'),
         CheckConstraint('away_goals >= 0', name='nonneg_away_goals'),
+        Index('ix_matches_competition_season_date', 'competition_id', 'season_id', 'date'),
+        Index('ix_matches_season_id', 'season_id'),
+        Index('ix_matches_date', 'date'),
+        Index('ix_matches_match_key', 'match_key', unique=True),
         {}
     )
 
@@ -257,6 +308,23 @@ class KnockoutMatches(Matches):
     ko_round = relationship('KnockoutRounds')
 
 
+def register_schema_identities(schema, models):
+    """
+    Register the match models of a team schema with the ``Matches`` mapper under identities that
+    are qualified by the schema name, e.g. ``club:league``.
+
+    Club and national team match models share the phase as polymorphic identity; the qualified
+    identities let :func:`light.loaders.schema_discriminator` load the models of one schema.
+
+    :param schema: Schema name (``club`` or ``natl``).
+    :param models: Match models of the schema.
+    """
+    polymorphic_map = Matches.__mapper__.polymorphic_map
+    for model in models:
+        identity = '{0}:{1}'.format(schema, model.__mapper__.polymorphic_identity)
+        polymorphic_map[identity] = model.__mapper__
+
+
 class MatchShootouts(BaseSchema):
     """
     Match Shootouts data model.
@@ -296,3 +364,150 @@ class Deductions(BaseSchema):
         'polymorphic_identity': 'deductions',
         'polymorphic_on': type
     }
+
+    __table_args__ = (
+        Index('ix_deductions_competition_season', 'competition_id', 'season_id'),
+        {}
+    )
+
+
+class MatchFacts(BaseSchema):
+    """
+    Match facts data model.
+
+    One row per match with the names and attributes of its competition, season, teams,
+    phase and shootout, so that analytical queries read a single table.  Rows are derived
+    from the match models of a club or national team database and are maintained by
+    :mod:`light.facts`.
+    """
+    __tablename__ = "match_facts"
+
+    match_id = Column(Integer, primary_key=True, autoincrement=False)
+    date = Column(Date)
+    phase = Column(String(20))
+
+    competition_id = Column(Integer)
+    competition_name = Column(Unicode(80))
+    competition_level = Column(Integer)
+    season_id = Column(Integer)
+    season_label = Column(String(9))
+
+    home_team_id = Column(Integer)
+    home_team_name = Column(Unicode(60))
+    away_team_id = Column(Integer)
+    away_team_name = Column(Unicode(60))
+    home_goals = Column(Integer)
+    away_goals = Column(Integer)
+
+    matchday = Column(Integer)
+    group = Column(String(length=2))
+    group_round = Column(Unicode(40))
+    ko_round = Column(Unicode(40))
+    extra_time = Column(Boolean)
+    home_shootout_goals = Column(Integer)
+    away_shootout_goals = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_match_facts_competition_season', 'competition_id', 'season_id'),
+        Index('ix_match_facts_date', 'date'),
+        {}
+    )
+
+    def __repr__(self):
+        return "<MatchFact(match_id={0}, date={1}, {2} {3}-{4} {5})>".format(
+            self.match_id, self.date, self.home_team_name, self.home_goals, self.away_goals, self.away_team_name)
+
+
+class MatchRatings(BaseSchema):
+    """
+    Match ratings data model.
+
+    Team ratings before and after every rated match, in the order in which the matches
+    were rated (``sequence``).  Rows are derived from the match models of a club or
+    national team database and are maintained by :mod:`light.ratings`.
+    """
+    __tablename__ = "match_ratings"
+
+    match_id = Column(Integer, primary_key=True, autoincrement=False)
+    sequence = Column(Integer, nullable=False)
+    date = Column(Date)
+
+    home_team_id = Column(Integer)
+    away_team_id = Column(Integer)
+    home_rating_pre = Column(Float)
+    away_rating_pre = Column(Float)
+    home_rating_post = Column(Float)
+    away_rating_post = Column(Float)
+
+    __table_args__ = (
+        Index('ix_match_ratings_sequence', 'sequence', unique=True),
+        Index('ix_match_ratings_home_team', 'home_team_id'),
+        Index('ix_match_ratings_away_team', 'away_team_id'),
+        {}
+    )
+
+    def __repr__(self):
+        return "<MatchRating(match_id={0}, home={1}: {2:.1f}->{3:.1f}, away={4}: {5:.1f}->{6:.1f})>".format(
+            self.match_id, self.home_team_id, self.home_rating_pre, self.home_rating_post,
+            self.away_team_id, self.away_rating_pre, self.away_rating_post)
+
+
+class BackfillCheckpoints(BaseSchema):
+    """
+    Backfill checkpoints data model.
+
+    One row per competition and season completed by a backfill job, written in the
+    transaction of the partition, so that an interrupted job resumes with the partitions
+    that were not committed.  Rows are maintained by :mod:`light.backfill`.
+    """
+    __tablename__ = "backfill_checkpoints"
+
+    job = Column(String(40), primary_key=True)
+    competition_id = Column(Integer, primary_key=True, autoincrement=False)
+    season_id = Column(Integer, primary_key=True, autoincrement=False)
+
+    rows = Column(Integer)
+    elapsed = Column(Float)
+    completed = Column(DateTime)
+
+    def __repr__(self):
+        return "<BackfillCheckpoint(job={0}, competition_id={1}, season_id={2}, elapsed={3:.3f}s)>".format(
+            self.job, self.competition_id, self.season_id, self.elapsed or 0.0)
+
+
+class HeadToHeadMixin(object):
+    """
+    Columns of the head-to-head record of a pair of teams, for the models of a team schema.
+
+    Models set ``__team_table__`` to the name of the team table and ``__team_model__`` to the
+    name of the team model, which the team keys and relationships refer to.
+    """
+    __team_table__ = None
+    __team_model__ = None
+
+    @declared_attr
+    def team_id(cls):
+        return Column(Integer, ForeignKey('{}.id'.format(cls.__team_table__)), primary_key=True)
+
+    @declared_attr
+    def opponent_id(cls):
+        return Column(Integer, ForeignKey('{}.id'.format(cls.__team_table__)), primary_key=True, index=True)
+
+    played = Column(Integer, default=0)
+    team_wins = Column(Integer, default=0)
+    opponent_wins = Column(Integer, default=0)
+    draws = Column(Integer, default=0)
+    team_goals = Column(Integer, default=0)
+    opponent_goals = Column(Integer, default=0)
+    shootouts = Column(Integer, default=0)
+    team_shootout_wins = Column(Integer, default=0)
+    opponent_shootout_wins = Column(Integer, default=0)
+    last_date = Column(Date)
+
+    @declared_attr
+    def team(cls):
+        return relationship(cls.__team_model__, foreign_keys="{}.team_id".format(cls.__name__))
+
+    @declared_attr
+    def opponent(cls):
+        return relationship(cls.__team_model__, foreign_keys="{}.opponent_id".format(cls.__name__))
@@ -3,8 +3,33 @@ class Config(object):
     Base configuration class.  Contains one method that defines the database URI.
 
     This class is to be subclassed and its attributes defined therein.
+
+    Connection pool settings apply to client/server databases and are ignored for SQLite.
     """
 
+    # Connections kept open in the pool, and connections allowed beyond that under load.
+    POOL_SIZE = 5
+    MAX_OVERFLOW = 10
+    # Seconds to wait for a connection from the pool.
+    POOL_TIMEOUT = 30
+    # Seconds after which a pooled connection is replaced (-1 never replaces connections).
+    POOL_RECYCLE = 3600
+    # Test pooled connections with a lightweight query when they are checked out.
+    POOL_PRE_PING = False
+
+    # Maximum number of cached reference records, and seconds they stay cached (None keeps them until evicted).
+    REFERENCE_CACHE_SIZE = 1024
+    REFERENCE_CACHE_TTL = 3600
+    # Maximum number of cached query results, and path of a cache file shared by processes (None keeps them in memory).
+    RESULT_CACHE_SIZE = 256
+    RESULT_CACHE_PATH = None
+    # Profile the statements of every session, the fraction of sessions sampled, and slowest statements reported.
+    QUERY_PROFILING = False
+    QUERY_SAMPLE_RATE = 1.0
+    QUERY_PROFILE_TOP = 10
+    # Schemas whose mappers are configured when the interface is created, e.g. ('club',).
+    WARM_UP_SCHEMAS = ()
+
     def __init__(self):
         self.database_uri()
 
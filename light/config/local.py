@@ -0,0 +1,13 @@
+import os
+from light.config import Config
+
+
+class LocalConfig(Config):
+    DIALECT = 'sqlite'
+    DBNAME = ''
+
+    def database_uri(self):
+        self.DATABASE_URI = os.environ.get('SCRATCH_DB', 'sqlite://')
+
+
+config = LocalConfig()
@@ -0,0 +1,56 @@
+"""
+Engines built from a configuration.
+
+The interface and the backfill workers build their engines here, so that every engine
+of a database uses the connection pool settings of its configuration.
+"""
+from sqlalchemy import event, exc, select
+from sqlalchemy.engine import create_engine
+
+
+def engine_options(config):
+    """
+    Return ``create_engine`` keyword arguments for the connection pool settings of a configuration.
+
+    SQLite databases use the default SQLAlchemy pools, so no options are returned for them.
+    """
+    if config.DATABASE_URI.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': config.POOL_SIZE,
+        'max_overflow': config.MAX_OVERFLOW,
+        'pool_timeout': config.POOL_TIMEOUT,
+        'pool_recycle': config.POOL_RECYCLE
+    }
+
+
+def ping_connection(connection, branch):
+    """
+    Test a connection when it is checked out of the pool and reconnect if it has gone stale.
+    """
+    if branch:
+        return
+    should_close_with_result = connection.should_close_with_result
+    connection.should_close_with_result = False
+    try:
+        connection.scalar(select([1]))
+    except exc.DBAPIError as err:
+        if err.connection_invalidated:
+            connection.scalar(select([1]))
+        else:
+            raise
+    finally:
+        connection.should_close_with_result = should_close_with_result
+
+
+def config_engine(config):
+    """
+    Create the engine of a configuration, with its connection pool settings and pre-ping option.
+
+    :param config: Config object.
+    :return: Engine object.
+    """
+    engine = create_engine(config.DATABASE_URI, **engine_options(config))
+    if config.POOL_PRE_PING:
+        event.listen(engine, 'engine_connect', ping_connection)
+    return engine
@@ -0,0 +1,247 @@
+"""
+Export of match results and standings to Apache Arrow and Parquet.
+
+Query results are fetched from a server-side cursor in batches of plain rows and
+converted column by column into Arrow record batches, so that no ORM objects are
+created and memory use is bounded by the batch size.  Record batches are written to
+Parquet files partitioned by competition and season (``competition_id=X/season_id=Y``
+directories, as read by ``pyarrow.dataset`` and pandas), or to an Arrow IPC file that
+can be memory-mapped for zero-copy reads.
+
+This module requires the optional ``pyarrow`` package.
+"""
+import os
+
+from sqlalchemy import select, types
+
+from light.queries import match_results_select
+from light.schemas import get_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+DEFAULT_BATCH_SIZE = 65536
+
+PARTITION_COLUMNS = ('competition_id', 'season_id')
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Exports require the pyarrow package")
+
+
+def arrow_type(sql_type):
+    """
+    Return the Arrow type of a SQLAlchemy column type, or None to infer the type from the values.
+
+    :param sql_type: SQLAlchemy type object.
+    """
+    _require_pyarrow()
+    if isinstance(sql_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, types.Integer):
+        return pa.int64()
+    if isinstance(sql_type, types.Date):
+        return pa.date32()
+    if isinstance(sql_type, types.DateTime):
+        return pa.timestamp('us')
+    if isinstance(sql_type, types.Float):
+        return pa.float64()
+    if isinstance(sql_type, types.String):
+        return pa.string()
+    return None
+
+
+def arrow_schema(statement):
+    """
+    Return the Arrow schema of the columns of a statement.
+
+    :param statement: Select object.
+    :return: ``pyarrow.Schema`` object.
+    """
+    fields = []
+    for column in statement.columns:
+        fields.append(pa.field(column.name, arrow_type(column.type) or pa.string()))
+    return pa.schema(fields)
+
+
+def _record_batch(rows, schema):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(list(values), type=field.type) for values, field in zip(columns, schema)],
+        schema=schema)
+
+
+def _row_batches(connection, statement, batch_size):
+    result = connection.execution_options(stream_results=True).execute(statement)
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def record_batches(connection, statement, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generate Arrow record batches from the results of a statement.
+
+    :param connection: Connection object.
+    :param statement: Select object.
+    :param batch_size: Maximum number of rows per record batch.
+    """
+    _require_pyarrow()
+    schema = arrow_schema(statement)
+    for rows in _row_batches(connection, statement, batch_size):
+        yield _record_batch(rows, schema)
+
+
+def matches_select(schema):
+    """
+    Build the query of match results of a schema for export.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :return: Select object.
+    """
+    results = match_results_select(schema)
+    return select([results]).order_by(results.c.competition_id, results.c.season_id, results.c.date)
+
+
+def standings_select():
+    """Build the query of persisted club standings for export."""
+    from light.club import ClubStandings
+    standings = ClubStandings.__table__
+    return select([standings]).order_by(standings.c.competition_id, standings.c.season_id)
+
+
+def _partition_path(root, key):
+    parts = ['{0}={1}'.format(name, '__HIVE_DEFAULT_PARTITION__' if value is None else value)
+             for name, value in zip(PARTITION_COLUMNS, key)]
+    return os.path.join(root, *parts)
+
+
+def write_parquet(connection, statement, root, batch_size=DEFAULT_BATCH_SIZE, compression='snappy'):
+    """
+    Write the results of a statement to Parquet files partitioned by competition and season.
+
+    Rows are expected in partition order, as returned by :func:`matches_select` and
+    :func:`standings_select`, so that only one file is open at a time: the file of a
+    partition is closed as soon as a row of the next partition arrives.  Should a
+    partition reappear in unordered results, its rows go to a further file
+    (``part-1.parquet`` and so on) in the same directory.  Partition columns are stored
+    in the directory names and not in the files.
+
+    :param connection: Connection object.
+    :param statement: Select object with ``competition_id`` and ``season_id`` columns.
+    :param root: Root directory of the dataset.
+    :param batch_size: Number of rows fetched per round trip.
+    :param compression: Parquet compression codec.
+    :return: Dictionary of number of rows written keyed by (competition ID, season ID).
+    """
+    _require_pyarrow()
+    schema = arrow_schema(statement)
+    positions = [schema.get_field_index(name) for name in PARTITION_COLUMNS]
+    keep = [k for k in range(len(schema)) if k not in positions]
+    file_schema = pa.schema([schema.field(k) for k in keep])
+
+    def write(key, part):
+        table = pa.Table.from_batches([_record_batch(part, file_schema)])
+        writer.write_table(table)
+        counts[key] = counts.get(key, 0) + len(part)
+
+    files = {}
+    counts = {}
+    current, writer, part = None, None, []
+    try:
+        for rows in _row_batches(connection, statement, batch_size):
+            for row in rows:
+                key = tuple(row[k] for k in positions)
+                if key != current or writer is None:
+                    if part:
+                        write(current, part)
+                        part = []
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    path = _partition_path(root, key)
+                    if not os.path.isdir(path):
+                        os.makedirs(path)
+                    name = 'part-{0}.parquet'.format(files.get(key, 0))
+                    files[key] = files.get(key, 0) + 1
+                    writer = pq.ParquetWriter(os.path.join(path, name), file_schema, compression=compression)
+                    current = key
+                part.append([row[k] for k in keep])
+            if part:
+                write(current, part)
+                part = []
+    finally:
+        if writer is not None:
+            writer.close()
+    return counts
+
+
+def write_ipc(connection, statement, path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write the results of a statement to an Arrow IPC file.
+
+    :param connection: Connection object.
+    :param statement: Select object.
+    :param path: Path to IPC file.
+    :param batch_size: Maximum number of rows per record batch.
+    :return: Number of rows written.
+    """
+    _require_pyarrow()
+    schema = arrow_schema(statement)
+    count = 0
+    with pa.OSFile(path, 'wb') as sink:
+        writer = pa.ipc.new_file(sink, schema)
+        try:
+            for rows in _row_batches(connection, statement, batch_size):
+                writer.write_batch(_record_batch(rows, schema))
+                count += len(rows)
+        finally:
+            writer.close()
+    return count
+
+
+def read_ipc(path):
+    """
+    Read an Arrow IPC file through a memory map, without copying the column data.
+
+    :param path: Path to IPC file.
+    :return: ``pyarrow.Table`` object.
+    """
+    _require_pyarrow()
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def export_matches(connection, schema, root, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Export the match results of a schema to a Parquet dataset partitioned by competition and season.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param root: Root directory of the dataset.
+    :param batch_size: Number of rows fetched per round trip.
+    :return: Dictionary of number of rows written keyed by (competition ID, season ID).
+    """
+    schema = get_schema(schema) if isinstance(schema, str) else schema
+    return write_parquet(connection, matches_select(schema), root, batch_size)
+
+
+def export_standings(connection, root, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Export persisted club standings to a Parquet dataset partitioned by competition and season.
+
+    :param connection: Connection object.
+    :param root: Root directory of the dataset.
+    :param batch_size: Number of rows fetched per round trip.
+    :return: Dictionary of number of rows written keyed by (competition ID, season ID).
+    """
+    return write_parquet(connection, standings_select(), root, batch_size)
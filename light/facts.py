@@ -0,0 +1,173 @@
+"""
+Denormalized match facts.
+
+Reading a match with its competition, season, teams, round and shootout touches up to ten
+tables.  This module flattens every match of a club or national team database into one
+row of ``match_facts`` with a single INSERT ... SELECT per phase.  Facts are refreshed
+incrementally: matches with IDs above the largest ID in the table are appended, and
+matches that were changed after they were added can be rewritten by ID.
+
+The largest ID is a watermark, not a change log.  With concurrent writers, a match can
+commit after a refresh has passed its ID (IDs are drawn from a sequence when the match is
+written, not when it commits), and later refreshes do not add it.  Such matches are picked
+up by passing their IDs, by :func:`refresh_partition_facts` or by :func:`rebuild_match_facts`.
+"""
+from sqlalchemy import select, func, cast, null, and_
+
+import light.common.models as lcm
+from light.bulk import inheritance_tables
+from light.schemas import get_schema
+
+
+def _schema(schema):
+    return get_schema(schema) if isinstance(schema, str) else schema
+
+
+def _find(tables, name):
+    """Return the first column of a name in a sequence of tables, or None."""
+    for table in tables:
+        if name in table.c:
+            return table.c[name]
+    return None
+
+
+def _column(tables, name, type_):
+    column = _find(tables, name)
+    return cast(null(), type_) if column is None else column
+
+
+def match_facts_select(schema, phase, after_id=None, match_ids=None, competition_id=None, season_id=None):
+    """
+    Build the statement that computes match facts for the matches of a phase.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param phase: Match phase.
+    :param after_id: Restrict to matches with a greater ID.
+    :param match_ids: Restrict to a collection of match IDs.
+    :param competition_id: Restrict to a competition.
+    :param season_id: Restrict to a season.
+    :return: Select object with the columns of ``match_facts``.
+    """
+    schema = _schema(schema)
+    facts = lcm.MatchFacts.__table__
+    matches = lcm.Matches.__table__
+    competitions = lcm.Competitions.__table__
+    seasons = lcm.Seasons.__table__
+    shootouts = lcm.MatchShootouts.__table__
+    group_rounds = lcm.GroupRounds.__table__
+    knockout_rounds = lcm.KnockoutRounds.__table__
+    teams = schema.team.__table__
+    home, away = teams.alias('home_teams'), teams.alias('away_teams')
+
+    tables = inheritance_tables(schema.match_model(phase))
+    phase_table = tables[-1]
+    source = matches
+    for table in tables[1:]:
+        source = source.join(table, matches.c.id == table.c.id)
+    source = source.outerjoin(competitions, matches.c.competition_id == competitions.c.id)\
+        .outerjoin(seasons, matches.c.season_id == seasons.c.id)\
+        .outerjoin(home, phase_table.c.home_team_id == home.c.id)\
+        .outerjoin(away, phase_table.c.away_team_id == away.c.id)\
+        .outerjoin(shootouts, matches.c.id == shootouts.c.id)
+
+    rounds = {}
+    for name, round_table in [('group_round', group_rounds), ('ko_round', knockout_rounds)]:
+        round_id = _find(tables, name + '_id')
+        if round_id is None:
+            rounds[name] = cast(null(), facts.c[name].type)
+        else:
+            source = source.outerjoin(round_table, round_id == round_table.c.id)
+            rounds[name] = round_table.c.name
+
+    clauses = []
+    if after_id is not None:
+        clauses.append(matches.c.id > after_id)
+    if match_ids is not None:
+        clauses.append(matches.c.id.in_(list(match_ids)))
+    if competition_id is not None:
+        clauses.append(matches.c.competition_id == competition_id)
+    if season_id is not None:
+        clauses.append(matches.c.season_id == season_id)
+
+    return select([
+        matches.c.id.label('match_id'), matches.c.date, matches.c.phase,
+        matches.c.competition_id, competitions.c.name.label('competition_name'),
+        competitions.c.level.label('competition_level'),
+        matches.c.season_id, seasons.c.label.label('season_label'),
+        phase_table.c.home_team_id, home.c.name.label('home_team_name'),
+        phase_table.c.away_team_id, away.c.name.label('away_team_name'),
+        matches.c.home_goals, matches.c.away_goals,
+        _column(tables, 'matchday', facts.c.matchday.type).label('matchday'),
+        _column(tables, 'group', facts.c.group.type).label('group'),
+        rounds['group_round'].label('group_round'),
+        rounds['ko_round'].label('ko_round'),
+        _column(tables, 'extra_time', facts.c.extra_time.type).label('extra_time'),
+        shootouts.c.home_shootout_goals, shootouts.c.away_shootout_goals
+    ]).select_from(source).where(and_(*clauses))
+
+
+def refresh_match_facts(connection, schema, match_ids=None):
+    """
+    Add facts of new matches, and rewrite facts of changed matches.
+
+    Matches with IDs above the largest ID in ``match_facts`` are added.  Facts of the
+    matches in ``match_ids`` are deleted and computed again, which picks up corrections
+    to results and to the names of teams, competitions and rounds, and matches below the
+    largest ID that committed after an earlier refresh.  Transaction control is left to
+    the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param match_ids: Collection of IDs of changed matches.
+    :return: Number of rows written.
+    """
+    schema = _schema(schema)
+    table = lcm.MatchFacts.__table__
+    after_id = connection.scalar(select([func.max(table.c.match_id)]))
+    if match_ids is not None:
+        match_ids = [match_id for match_id in match_ids if after_id is not None and match_id <= after_id]
+        if match_ids:
+            connection.execute(table.delete().where(table.c.match_id.in_(match_ids)))
+    written = 0
+    for phase in schema.matches:
+        batches = [match_facts_select(schema, phase, after_id=after_id)]
+        if match_ids:
+            batches.append(match_facts_select(schema, phase, match_ids=match_ids))
+        for query in batches:
+            result = connection.execute(table.insert().from_select([c.name for c in query.columns], query))
+            written += max(result.rowcount, 0)
+    return written
+
+
+def rebuild_match_facts(connection, schema):
+    """
+    Rebuild ``match_facts`` from all matches of a schema.  Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :return: Number of rows written.
+    """
+    connection.execute(lcm.MatchFacts.__table__.delete())
+    return refresh_match_facts(connection, schema)
+
+
+def refresh_partition_facts(connection, schema, competition_id, season_id):
+    """
+    Rewrite the facts of the matches of a competition and season.  Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param competition_id: Competition ID.
+    :param season_id: Season ID.
+    :return: Number of rows written.
+    """
+    schema = _schema(schema)
+    table = lcm.MatchFacts.__table__
+    connection.execute(table.delete().where(and_(table.c.competition_id == competition_id,
+                                                 table.c.season_id == season_id)))
+    written = 0
+    for phase in schema.matches:
+        query = match_facts_select(schema, phase, competition_id=competition_id, season_id=season_id)
+        result = connection.execute(table.insert().from_select([c.name for c in query.columns], query))
+        written += max(result.rowcount, 0)
+    return written
@@ -0,0 +1,165 @@
+"""
+Head-to-head records of pairs of teams.
+
+Records are aggregated in the database from the match results of all phases of a
+schema, including penalty shootouts, and persisted to ``club_head_to_head`` or
+``natl_head_to_head`` under the unordered team pair, so that reading the record of two
+teams is a single primary key lookup.  Records can be rebuilt for the whole schema or
+the teams of a collection, and are updated after every ORM flush that writes matches
+or shootouts once :func:`track_head_to_head` has been called.  Matches written with
+the bulk loader bypass the ORM and require an explicit :func:`refresh_head_to_head`.
+"""
+from sqlalchemy import event, select, func, case, or_, literal_column
+from sqlalchemy.orm.session import Session
+from sqlalchemy.orm.attributes import get_history
+
+import light.common.models as lcm
+from light.queries import match_results_select
+from light.schemas import get_schema
+
+
+def _schema(schema):
+    return get_schema(schema) if isinstance(schema, str) else schema
+
+
+def _pair(team_ids):
+    """Restrict team results to matches with a team of a collection, home or away."""
+    if team_ids is None:
+        return None
+    team_ids = list(team_ids)
+    return lambda matches, phase_table: or_(phase_table.c.home_team_id.in_(team_ids),
+                                            phase_table.c.away_team_id.in_(team_ids))
+
+
+def head_to_head_summary_select(schema, team_ids=None):
+    """
+    Build the aggregate that computes head-to-head rows from the match results of a schema.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param team_ids: Restrict to pairs with a team of a collection of team IDs.
+    :return: Select object with the columns of the head-to-head table.
+    """
+    results = match_results_select(_schema(schema), _pair(team_ids))
+    home_first = results.c.home_team_id < results.c.away_team_id
+
+    def side(home, away):
+        return case([(home_first, home)], else_=away)
+
+    oriented = select([
+        side(results.c.home_team_id, results.c.away_team_id).label('team_id'),
+        side(results.c.away_team_id, results.c.home_team_id).label('opponent_id'),
+        side(results.c.home_goals, results.c.away_goals).label('team_goals'),
+        side(results.c.away_goals, results.c.home_goals).label('opponent_goals'),
+        side(results.c.home_shootout_goals, results.c.away_shootout_goals).label('team_shootout_goals'),
+        side(results.c.away_shootout_goals, results.c.home_shootout_goals).label('opponent_shootout_goals'),
+        results.c.date
+    ]).where(results.c.home_team_id != results.c.away_team_id).alias('oriented')
+
+    def count_if(condition):
+        return func.sum(case([(condition, 1)], else_=0))
+
+    keys = [oriented.c.team_id, oriented.c.opponent_id]
+    return select(keys + [
+        func.count(literal_column('*')).label('played'),
+        count_if(oriented.c.team_goals > oriented.c.opponent_goals).label('team_wins'),
+        count_if(oriented.c.team_goals < oriented.c.opponent_goals).label('opponent_wins'),
+        count_if(oriented.c.team_goals == oriented.c.opponent_goals).label('draws'),
+        func.sum(oriented.c.team_goals).label('team_goals'),
+        func.sum(oriented.c.opponent_goals).label('opponent_goals'),
+        func.count(oriented.c.team_shootout_goals).label('shootouts'),
+        count_if(oriented.c.team_shootout_goals > oriented.c.opponent_shootout_goals).label('team_shootout_wins'),
+        count_if(oriented.c.team_shootout_goals < oriented.c.opponent_shootout_goals)
+        .label('opponent_shootout_wins'),
+        func.max(oriented.c.date).label('last_date')
+    ]).group_by(*keys)
+
+
+def refresh_head_to_head(connection, schema, team_ids=None):
+    """
+    Recompute persisted head-to-head rows.  Without team IDs the whole table is rebuilt.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param team_ids: Restrict to pairs with a team of a collection of team IDs.
+    """
+    schema = _schema(schema)
+    table = schema.head_to_head.__table__
+    delete = table.delete()
+    if team_ids is not None:
+        team_ids = list(team_ids)
+        delete = delete.where(or_(table.c.team_id.in_(team_ids), table.c.opponent_id.in_(team_ids)))
+    connection.execute(delete)
+    query = head_to_head_summary_select(schema, team_ids)
+    connection.execute(table.insert().from_select([c.name for c in query.columns], query))
+
+
+def head_to_head(session, schema, team_id, opponent_id):
+    """
+    Return the persisted head-to-head record of two teams, in either order.
+
+    :param session: Session object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param team_id: Team ID.
+    :param opponent_id: Opponent team ID.
+    :return: ClubHeadToHead or NationalHeadToHead object, or None if the teams have not met.
+    """
+    return session.query(_schema(schema).head_to_head).get((min(team_id, opponent_id), max(team_id, opponent_id)))
+
+
+def oriented(record, team_id):
+    """
+    Return a head-to-head record from the point of view of one of its teams.
+
+    :param record: ClubHeadToHead or NationalHeadToHead object.
+    :param team_id: ID of either team of the pair.
+    :return: Dictionary with keys played, wins, draws, losses, goals_for, goals_against,
+        shootouts, shootout_wins, shootout_losses and last_date.
+    """
+    if team_id not in (record.team_id, record.opponent_id):
+        raise ValueError("Team {0} is not part of this head-to-head record".format(team_id))
+    own, other = ('team', 'opponent') if team_id == record.team_id else ('opponent', 'team')
+    return {
+        'played': record.played,
+        'wins': getattr(record, own + '_wins'),
+        'draws': record.draws,
+        'losses': getattr(record, other + '_wins'),
+        'goals_for': getattr(record, own + '_goals'),
+        'goals_against': getattr(record, other + '_goals'),
+        'shootouts': record.shootouts,
+        'shootout_wins': getattr(record, own + '_shootout_wins'),
+        'shootout_losses': getattr(record, other + '_shootout_wins'),
+        'last_date': record.last_date
+    }
+
+
+def _affected_teams(session, schema):
+    teams = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (lcm.Matches, lcm.MatchShootouts)) and isinstance(obj, schema.base):
+            for name in ('home_team_id', 'away_team_id'):
+                teams.update(t for t in get_history(obj, name).sum() if t is not None)
+    return teams
+
+
+_tracked_schemas = []
+
+
+def _update_head_to_head(session, flush_context):
+    for schema in _tracked_schemas:
+        team_ids = _affected_teams(session, schema)
+        if team_ids:
+            refresh_head_to_head(session.connection(), schema, team_ids)
+
+
+def track_head_to_head(schema):
+    """
+    Update head-to-head rows of the teams affected by every ORM flush of matches or shootouts of a schema.
+
+    :param schema: Schema name (``club`` or ``natl``).
+    """
+    if not _tracked_schemas:
+        event.listen(Session, 'after_flush', _update_head_to_head)
+    if schema not in [s.name for s in _tracked_schemas]:
+        _tracked_schemas.append(get_schema(schema))
@@ -0,0 +1,346 @@
+"""
+Streaming importer for match results.
+
+Rows are read lazily from CSV or JSON Lines files, natural keys (team, competition,
+season and round names) are resolved through dictionaries that are warmed once from
+the database, and matches are written with the bulk loader in chunks that are
+committed independently.
+
+A row contains the following fields (``matchday``, ``group``, ``group_round``,
+``ko_round``, ``extra_time`` and the shootout fields depend on the phase):
+
++---------------------+-------------------------------------------+
+| Field               | Example                                   |
++=====================+===========================================+
+| phase               | friendly, league, group, knockout         |
+| date                | 2015-01-01                                |
+| competition         | Premier League                            |
+| season              | 2014-2015                                 |
+| home_team           | Arsenal FC                                |
+| away_team           | Chelsea FC                                |
+| home_goals          | 2                                         |
+| away_goals          | 0                                         |
+| matchday            | 20                                        |
+| group               | A                                         |
+| group_round         | Group Stage                               |
+| ko_round            | Semifinal                                 |
+| extra_time          | true                                      |
+| home_shootout_goals | 5                                         |
+| away_shootout_goals | 4                                         |
++---------------------+-------------------------------------------+
+"""
+import io
+import csv
+import sys
+import json
+import time
+from datetime import date, datetime
+from itertools import islice
+
+import light.common.models as lcm
+from light.bulk import LoadStats, bulk_load_matches, upsert_block, inheritance_tables
+from light.schemas import get_schema
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+INTEGER_FIELDS = ('home_goals', 'away_goals', 'matchday', 'home_shootout_goals', 'away_shootout_goals')
+TRUE_VALUES = ('1', 't', 'true', 'y', 'yes')
+
+
+def read_csv(path, encoding='utf-8'):
+    """
+    Generate dictionaries from the rows of a CSV file with a header line.
+
+    :param path: Path to CSV file.
+    :param encoding: File encoding.
+    """
+    if sys.version_info[0] < 3:
+        with open(path, 'rb') as f:
+            for row in csv.DictReader(f):
+                yield dict((k.decode(encoding), v.decode(encoding)) for k, v in row.items())
+    else:
+        with io.open(path, 'r', encoding=encoding, newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def read_jsonl(path, encoding='utf-8'):
+    """
+    Generate dictionaries from a JSON Lines file.  Blank lines are skipped.
+
+    :param path: Path to JSONL file.
+    :param encoding: File encoding.
+    """
+    with io.open(path, 'r', encoding=encoding) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_rows(path, encoding='utf-8'):
+    """
+    Generate dictionaries from a CSV or JSON Lines file, selected by file extension.
+
+    :param path: Path to ``.csv``, ``.jsonl`` or ``.json`` file.
+    :param encoding: File encoding.
+    """
+    if path.endswith('.csv'):
+        return read_csv(path, encoding)
+    elif path.endswith('.jsonl') or path.endswith('.json'):
+        return read_jsonl(path, encoding)
+    raise ValueError("Unsupported file type: {0}".format(path))
+
+
+def parse_season(name):
+    """
+    Split a season name of form YYYY or YYYY-YYYY into start and end years.
+
+    :param name: Season name.
+    :return: Tuple of (start year, end year).
+    """
+    years = [int(yr) for yr in name.strip().split('-')]
+    if len(years) == 1:
+        return years[0], years[0]
+    elif len(years) == 2:
+        return years[0], years[1]
+    raise ValueError("Invalid season name: {0}".format(name))
+
+
+class ReferenceResolver(object):
+    """
+    Resolve natural keys of reference data to primary keys.
+
+    Lookup dictionaries are filled with one query per table when the resolver is warmed.
+    Teams and competitions must already exist; seasons, years and rounds are created on
+    first use and added to the dictionaries.  Names that map to more than one record are
+    rejected as ambiguous.
+
+    :param session: Session object.
+    :param schema: SchemaModels object.
+    """
+
+    AMBIGUOUS = object()
+
+    def __init__(self, session, schema):
+        self.session = session
+        self.schema = schema
+        self.teams = {}
+        self.competitions = {}
+        self.seasons = {}
+        self.years = {}
+        self.group_rounds = {}
+        self.knockout_rounds = {}
+
+    @classmethod
+    def _index(cls, pairs):
+        lookup = {}
+        for name, pk in pairs:
+            lookup[name] = cls.AMBIGUOUS if name in lookup else pk
+        return lookup
+
+    def warm(self):
+        """Load lookup dictionaries from the database."""
+        team = self.schema.team
+        self.teams = self._index(self.session.query(team.name, team.id))
+        self.competitions = self._index(self.session.query(lcm.Competitions.name, lcm.Competitions.id))
+        self.years = dict(self.session.query(lcm.Years.yr, lcm.Years.id))
+        self.seasons = dict(self.session.query(lcm.Seasons.label, lcm.Seasons.id))
+        self.group_rounds = dict(self.session.query(lcm.GroupRounds.name, lcm.GroupRounds.id))
+        self.knockout_rounds = dict(self.session.query(lcm.KnockoutRounds.name, lcm.KnockoutRounds.id))
+        return self
+
+    @classmethod
+    def _lookup(cls, lookup, kind, name):
+        pk = lookup.get(name)
+        if pk is None:
+            raise LookupError("Unknown {0}: {1}".format(kind, name))
+        if pk is cls.AMBIGUOUS:
+            raise LookupError("Ambiguous {0}: {1}".format(kind, name))
+        return pk
+
+    def _create(self, lookup, key, record):
+        self.session.add(record)
+        self.session.flush()
+        lookup[key] = record.id
+        return record.id
+
+    def team(self, name):
+        return self._lookup(self.teams, 'team', name)
+
+    def competition(self, name):
+        return self._lookup(self.competitions, 'competition', name)
+
+    def year(self, yr):
+        if yr in self.years:
+            return self.years[yr]
+        return self._create(self.years, yr, lcm.Years(yr=yr))
+
+    def season(self, name):
+        start_yr, end_yr = parse_season(name)
+        key = lcm.Seasons.format_name(start_yr, end_yr)
+        if key in self.seasons:
+            return self.seasons[key]
+        record = lcm.Seasons(start_year_id=self.year(start_yr), end_year_id=self.year(end_yr))
+        return self._create(self.seasons, key, record)
+
+    def group_round(self, name):
+        if name in self.group_rounds:
+            return self.group_rounds[name]
+        return self._create(self.group_rounds, name, lcm.GroupRounds(name=name))
+
+    def knockout_round(self, name):
+        if name in self.knockout_rounds:
+            return self.knockout_rounds[name]
+        return self._create(self.knockout_rounds, name, lcm.KnockoutRounds(name=name))
+
+
+def _blank(value):
+    return value is None or value == ''
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+class MatchImporter(object):
+    """
+    Import match rows into a club or national team database.
+
+    In upsert mode, matches are identified by competition, season, date, teams and phase:
+    matches that were imported before are updated if their content (shootout included) changed
+    and skipped otherwise, and only the matches written are counted.
+
+    :param session: Session object.  A commit is issued after every chunk.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param chunk_size: Number of rows per committed chunk.
+    :param upsert: Insert or update matches by natural key instead of appending them.
+    """
+
+    def __init__(self, session, schema='club', chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
+        self.session = session
+        self.schema = get_schema(schema) if isinstance(schema, str) else schema
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+        self.resolver = ReferenceResolver(session, self.schema)
+
+    def convert(self, row):
+        """
+        Convert a row of natural keys into a dictionary of column values.
+
+        :param row: Dictionary of import fields.
+        :return: Tuple of (phase, column values, shootout values or None).
+        """
+        resolver = self.resolver
+        phase = row.get('phase') or 'league'
+        values = {
+            'date': _parse_date(row['date']),
+            'competition_id': resolver.competition(row['competition']),
+            'season_id': resolver.season(row['season']),
+            'home_team_id': resolver.team(row['home_team']),
+            'away_team_id': resolver.team(row['away_team'])
+        }
+        for field in ('home_goals', 'away_goals', 'matchday', 'group'):
+            if not _blank(row.get(field)):
+                values[field] = row[field]
+        for field in INTEGER_FIELDS:
+            if field in values:
+                values[field] = int(values[field])
+        if not _blank(row.get('group_round')):
+            values['group_round_id'] = resolver.group_round(row['group_round'])
+        if not _blank(row.get('ko_round')):
+            values['ko_round_id'] = resolver.knockout_round(row['ko_round'])
+        if not _blank(row.get('extra_time')):
+            values['extra_time'] = _parse_bool(row['extra_time'])
+
+        shootout = None
+        if not _blank(row.get('home_shootout_goals')) and not _blank(row.get('away_shootout_goals')):
+            shootout = {
+                'home_shootout_goals': int(row['home_shootout_goals']),
+                'away_shootout_goals': int(row['away_shootout_goals']),
+                'home_team_id': values['home_team_id'],
+                'away_team_id': values['away_team_id']
+            }
+        return phase, values, shootout
+
+    def load_chunk(self, rows):
+        """
+        Write one chunk of import rows and commit.
+
+        :param rows: List of dictionaries of import fields.
+        :return: Number of matches written.
+        """
+        count = self.write(rows)
+        self.session.commit()
+        return count
+
+    def write(self, rows):
+        """
+        Write import rows without committing.  The resolver must be warmed.
+
+        :param rows: List of dictionaries of import fields.
+        :return: Number of matches written.
+        """
+        by_phase = {}
+        shootouts = []
+        for row in rows:
+            phase, values, shootout = self.convert(row)
+            by_phase.setdefault(phase, []).append(values)
+            if shootout is not None:
+                shootouts.append((values, shootout))
+                values['home_shootout_goals'] = shootout['home_shootout_goals']
+                values['away_shootout_goals'] = shootout['away_shootout_goals']
+
+        connection = self.session.connection()
+        if self.upsert:
+            return self._upsert(connection, by_phase, shootouts)
+        for phase, values in by_phase.items():
+            bulk_load_matches(connection, values, self.schema.match_model(phase), block_size=len(values))
+        self._write_shootouts(connection, shootouts)
+        return len(rows)
+
+    def _upsert(self, connection, by_phase, shootouts):
+        written, updated_ids = set(), []
+        for phase, values in by_phase.items():
+            inserted, updated, _ = upsert_block(connection, self.schema.match_model(phase), values)
+            written.update(v['id'] for v in inserted + updated)
+            updated_ids.extend(v['id'] for v in updated)
+        if updated_ids:
+            for table in reversed(inheritance_tables(self.schema.shootout)):
+                connection.execute(table.delete().where(list(table.primary_key.columns)[0].in_(updated_ids)))
+        self._write_shootouts(connection, [(v, s) for v, s in shootouts if v.get('id') in written])
+        return len(written)
+
+    def _write_shootouts(self, connection, shootouts):
+        if shootouts:
+            params = []
+            for values, shootout in shootouts:
+                shootout['id'] = values['id']
+                params.append(shootout)
+            for table in inheritance_tables(self.schema.shootout):
+                connection.execute(table.insert(), [
+                    dict((c.key, p.get(c.key)) for c in table.columns) for p in params])
+
+    def run(self, rows):
+        """
+        Import rows in chunks, generating a LoadStats object for every committed chunk.
+
+        :param rows: Iterable of dictionaries of import fields.
+        """
+        self.resolver.warm()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            start = time.time()
+            count = self.load_chunk(chunk)
+            yield LoadStats(count, time.time() - start)
@@ -0,0 +1,177 @@
+"""
+Loader option presets for common listings.
+
+Relationships used by season names and model representations (``Matches.season``,
+``Matches.competition``, ``Countries.confederation``, ``DomesticCompetitions.country``,
+``InternationalCompetitions.confederation`` and ``Clubs.country``) are loaded eagerly by
+default.  The presets below add the team relationships of a match model, so that a
+listing of matches with team names is loaded in one statement.
+
+Match models are mapped with three levels of joined-table inheritance, and a query
+against ``Matches`` loads the columns of the phase and team tables lazily for every
+row.  :func:`polymorphic_matches` builds an entity that outer-joins all match tables
+of a schema, and :func:`match_query` adds eager loading of the team relationships of
+every match model, so that a listing of mixed-phase matches is loaded in a fixed number
+of statements.  :func:`stream_matches` iterates over the same listing in chunks, with
+memory bounded by the chunk size.
+
+Club and national team match models share the phase identities of the ``Matches``
+hierarchy (``friendly``, ``group``, ``knockout``), and the mapper resolves each phase to
+the model that was mapped last.  The polymorphic entities of this module translate the
+phase into an identity qualified by schema (e.g. ``club:friendly``) that is registered
+for the model of that schema, so that they load the models of the requested schema
+whichever schema modules are imported.
+"""
+from sqlalchemy import or_, case
+from sqlalchemy.orm import joinedload, subqueryload, with_polymorphic
+
+import light.common.models as lcm
+from light.schemas import get_schema
+
+
+TEAM_RELATIONSHIPS = ('home_team', 'away_team', 'team', 'opener')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+LOADERS = {
+    'joined': joinedload,
+    'subquery': subqueryload
+}
+
+
+def match_listing_options(model):
+    """
+    Return loader options that load a match model with its competition, season and teams.
+
+    :param model: Mapped match, shootout or deduction class.
+    :return: List of loader options for ``Query.options``.
+    """
+    options = []
+    for name in ('competition', 'season') + TEAM_RELATIONSHIPS:
+        if hasattr(model, name):
+            options.append(joinedload(getattr(model, name)))
+    return options
+
+
+def _schema(schema):
+    return get_schema(schema) if isinstance(schema, str) else schema
+
+
+def schema_discriminator(schema):
+    """
+    Return an expression that qualifies the phase of a match with a schema name, matching the
+    identities registered by :func:`light.common.models.register_schema_identities`.
+
+    Phases that are not part of the schema are returned unchanged.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :return: Case expression, e.g. ``club:league`` for league matches of the club schema.
+    """
+    schema = _schema(schema)
+    whens = [(lcm.Matches.phase == phase, '{0}:{1}'.format(schema.name, phase))
+             for phase in sorted(schema.matches)]
+    return case(whens, else_=lcm.Matches.phase)
+
+
+def polymorphic_matches(schema):
+    """
+    Return an entity that loads ``Matches`` together with the columns of every match model of a schema,
+    as instances of the match models of that schema.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :return: AliasedClass for use in ``Session.query``.
+    """
+    schema = _schema(schema)
+    return with_polymorphic(lcm.Matches, list(schema.matches.values()),
+                            polymorphic_on=schema_discriminator(schema))
+
+
+def polymorphic_match_options(entity, schema, eager='subquery'):
+    """
+    Return loader options for the team relationships of every match model in a polymorphic entity.
+
+    ``subquery`` emits one additional statement per team relationship and match model;
+    ``joined`` loads everything in a single, wider statement.
+
+    :param entity: Entity returned by :func:`polymorphic_matches`.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param eager: Eager loading strategy, ``subquery`` or ``joined``.
+    :return: List of loader options for ``Query.options``.
+    """
+    loader = LOADERS[eager]
+    options = []
+    for model in _schema(schema).matches.values():
+        subclass = getattr(entity, model.__name__)
+        options.extend(loader(getattr(subclass, name)) for name in ('home_team', 'away_team'))
+    return options
+
+
+def match_query(session, schema, team_id=None, eager='subquery'):
+    """
+    Query all matches of a schema with phase columns and teams loaded in a bounded number of statements.
+
+    :param session: Session object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param team_id: Restrict to matches of a team, home or away.
+    :param eager: Eager loading strategy for teams, ``subquery`` or ``joined``.
+    :return: Query object.
+    """
+    schema = _schema(schema)
+    entity = polymorphic_matches(schema)
+    query = session.query(entity).options(*polymorphic_match_options(entity, schema, eager))
+    if team_id is not None:
+        clauses = []
+        for model in schema.matches.values():
+            subclass = getattr(entity, model.__name__)
+            clauses.extend([subclass.home_team_id == team_id, subclass.away_team_id == team_id])
+        query = query.filter(or_(*clauses))
+    return query
+
+
+def supports_server_side(bind):
+    """
+    Return True if statements on a bind can be read from a server-side cursor with ``stream_results``.
+
+    :param bind: Engine or Connection object.
+    """
+    return bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2'
+
+
+def stream_matches(session, schema, chunk_size=DEFAULT_CHUNK_SIZE, team_id=None, server_side=None):
+    """
+    Iterate over all matches of a schema with phase columns and teams, ordered by ID, in chunks.
+
+    On PostgreSQL (psycopg2), a single query is read from a server-side cursor ``chunk_size``
+    rows at a time with ``yield_per``, and teams are joined into the same statement.  Elsewhere (e.g. SQLite, whose driver fetches all rows of a statement),
+    every chunk is a separate query that starts after the last ID of the previous chunk,
+    with teams loaded by subquery.  Matches are held by the session only while they are
+    referenced, so memory does not grow with the number of matches.
+
+    :param session: Session object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param chunk_size: Number of matches loaded per round trip.
+    :param team_id: Restrict to matches of a team, home or away.
+    :param server_side: Read from a server-side cursor, detected from the database if None.
+    :return: Generator of match objects.
+    """
+    schema = _schema(schema)
+    if server_side is None:
+        server_side = supports_server_side(session.get_bind())
+    if server_side:
+        query = match_query(session, schema, team_id, eager='joined').order_by(lcm.Matches.id)
+        for match in query.yield_per(chunk_size).execution_options(stream_results=True):
+            yield match
+        return
+
+    last_id = None
+    while True:
+        query = match_query(session, schema, team_id)
+        if last_id is not None:
+            query = query.filter(lcm.Matches.id > last_id)
+        chunk = query.order_by(lcm.Matches.id).limit(chunk_size).all()
+        for match in chunk:
+            yield match
+        if len(chunk) < chunk_size:
+            break
+        last_id = chunk[-1].id
+        del chunk
@@ -1,5 +1,3 @@
-from copy import deepcopy
-
 from sqlalchemy import Column, Integer, ForeignKey
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declared_attr, declarative_base
@@ -9,25 +7,25 @@ import light.common.models as lcm
 
 
 NatlSchema = declarative_base(name="National Teams", metadata=lc.BaseSchema.metadata,
-                              class_registry=deepcopy(lc.BaseSchema._decl_class_registry))
+                              class_registry=lc.schema_registry())
 
 
 class NationalMixin(object):
 
     @declared_attr
     def team_id(cls):
-        return Column(Integer, ForeignKey('countries.id'))
+        return Column(Integer, ForeignKey('countries.id'), index=True)
 
 
 class NationalMatchMixin(object):
 
     @declared_attr
     def home_team_id(cls):
-        return Column(Integer, ForeignKey('countries.id'))
+        return Column(Integer, ForeignKey('countries.id'), index=True)
 
     @declared_attr
     def away_team_id(cls):
-        return Column(Integer, ForeignKey('countries.id'))
+        return Column(Integer, ForeignKey('countries.id'), index=True)
 
 
 class FriendlyMixin(object):
@@ -110,6 +108,10 @@ class NationalKnockoutMatches(KnockoutMixin, NationalMatchMixin, NatlSchema, lcm
     id = Column(Integer, ForeignKey('knockout_matches.id'), primary_key=True)
 
 
+lcm.register_schema_identities('natl', (NationalFriendlyMatches, NationalGroupMatches,
+                                        NationalKnockoutMatches))
+
+
 class NationalShootoutMatches(ShootoutMixin, NationalMatchMixin, NatlSchema, lcm.MatchShootouts):
     __tablename__ = "natl_shootout_matches"
     id = Column(Integer, ForeignKey('match_shootouts.id'), primary_key=True)
@@ -126,3 +128,19 @@ class NationalDeductions(NationalMixin, NatlSchema, lcm.Deductions):
     id = Column(Integer, ForeignKey('deductions.id'), primary_key=True)
 
     team = relationship('Countries', foreign_keys="NationalDeductions.team_id", backref=backref('deductions'))
+
+
+class NationalHeadToHead(lcm.HeadToHeadMixin, NatlSchema):
+    """
+    Head-to-head record of a pair of national teams over all matches, keyed by the lower team ID (``team_id``)
+    and the higher team ID (``opponent_id``).
+
+    Rows are maintained by :mod:`light.head_to_head`.
+    """
+    __tablename__ = "natl_head_to_head"
+    __team_table__ = "countries"
+    __team_model__ = "Countries"
+
+    def __repr__(self):
+        return "<NationalHeadToHead(team_id={0}, opponent_id={1}, played={2}, record={3}-{4}-{5})>".format(
+            self.team_id, self.opponent_id, self.played, self.team_wins, self.draws, self.opponent_wins)
@@ -0,0 +1,239 @@
+"""
+SQL statement instrumentation.
+
+:class:`Instrumentation` listens to the cursor execution events of an engine and
+records every statement executed by the current thread while a profile is active:
+the number of statements, their latency, the rows they report and, per normalized
+statement (literals and bound parameters replaced by ``?``), the count and time
+spent.  Profiles are sampled when they start, so that unsampled profiles cost one
+random draw and a thread-local check per statement, and a sampled profile records
+all of its statements.  Statements outside any profile are not recorded, and
+statements that fail are not recorded either.
+
+Drivers report rows for data changes; rows returned by queries are counted only by
+drivers that set ``cursor.rowcount`` for SELECT statements (e.g. psycopg2, not sqlite3).
+"""
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+DEFAULT_TOP = 10
+
+DEFAULT_MAX_SAMPLES = 10000
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|\b\d+(?:\.\d+)?\b|:\w+|\$\d+|%s")
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_normalized = {}
+_normalized_lock = threading.Lock()
+
+
+def normalize(statement):
+    """
+    Return a statement with whitespace collapsed, literals and bound parameters replaced by ``?``,
+    and lists of parameters (e.g. ``IN (?, ?, ?)``) collapsed to ``(?)``.
+    """
+    with _normalized_lock:
+        text = _normalized.get(statement)
+    if text is not None:
+        return text
+    text = _LISTS.sub('(?)', _LITERALS.sub('?', _WHITESPACE.sub(' ', statement).strip()))
+    with _normalized_lock:
+        if len(_normalized) >= 1000:
+            _normalized.clear()
+        _normalized[statement] = text
+    return text
+
+
+class StatementStats(object):
+    """
+    Totals of a normalized statement.
+
+    :param statement: Normalized statement text.
+    """
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'statement': self.statement, 'count': self.count, 'total_time': self.total_time,
+                'max_time': self.max_time, 'rows': self.rows}
+
+    def __repr__(self):
+        return "<StatementStats(count={0}, total_time={1:.4f}s, statement={2!r})>".format(
+            self.count, self.total_time, self.statement[:60])
+
+
+class QueryStats(object):
+    """
+    Statistics of the statements executed in one or more profiles.
+
+    Latencies are kept for percentiles; above ``max_samples`` statements a uniform
+    random sample of that size is kept.
+
+    :param top: Default number of statements returned by :meth:`slowest`.
+    :param max_samples: Maximum number of latencies kept.
+    :param sampled: False for a profile that was not selected for recording.
+    """
+
+    def __init__(self, top=DEFAULT_TOP, max_samples=DEFAULT_MAX_SAMPLES, sampled=True):
+        self.top = top
+        self.max_samples = max_samples
+        self.sampled = sampled
+        self.statements = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.latencies = []
+        self.by_statement = {}
+
+    def record(self, statement, elapsed, rows):
+        """
+        Record an executed statement.
+
+        :param statement: Statement text as sent to the driver.
+        :param elapsed: Latency in seconds.
+        :param rows: Row count reported by the driver, or a negative value if unknown.
+        """
+        self.statements += 1
+        self.total_time += elapsed
+        if len(self.latencies) < self.max_samples:
+            self.latencies.append(elapsed)
+        else:
+            position = random.randint(0, self.statements - 1)
+            if position < self.max_samples:
+                self.latencies[position] = elapsed
+        key = normalize(statement)
+        totals = self.by_statement.get(key)
+        if totals is None:
+            totals = self.by_statement[key] = StatementStats(key)
+        totals.count += 1
+        totals.total_time += elapsed
+        totals.max_time = max(totals.max_time, elapsed)
+        if rows > 0:
+            self.rows += rows
+            totals.rows += rows
+
+    def percentile(self, percent):
+        """Return the latency below which ``percent`` percent of statements fall, or None without statements."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = int(round(percent / 100.0 * len(ordered) + 0.5)) - 1
+        return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+    def slowest(self, n=None):
+        """Return the StatementStats of the ``n`` normalized statements with the most total time."""
+        ordered = sorted(self.by_statement.values(), key=lambda s: s.total_time, reverse=True)
+        return ordered[:self.top if n is None else n]
+
+    def as_dict(self):
+        return {
+            'statements': self.statements,
+            'rows': self.rows,
+            'total_time': self.total_time,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'slowest': [s.as_dict() for s in self.slowest()]
+        }
+
+    def __repr__(self):
+        return "<QueryStats(statements={0}, rows={1}, total_time={2:.4f}s)>".format(
+            self.statements, self.rows, self.total_time)
+
+
+class Instrumentation(object):
+    """
+    Statement instrumentation of an engine.
+
+    :param engine: Engine object.
+    :param sample_rate: Fraction of profiles that record statements.
+    :param top: Number of slowest statements reported by QueryStats objects.
+    :param callback: Function called with the QueryStats object of every sampled profile when it ends.
+    """
+
+    def __init__(self, engine, sample_rate=1.0, top=DEFAULT_TOP, callback=None):
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.top = top
+        self.callback = callback
+        self.stats = QueryStats(top)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _active(self):
+        return getattr(self._local, 'profiles', None)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active():
+            conn.info.setdefault('profile_start', []).append(time.time())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        profiles = self._active()
+        starts = conn.info.get('profile_start')
+        if not profiles or not starts:
+            return
+        elapsed = time.time() - starts.pop()
+        rows = getattr(cursor, 'rowcount', -1)
+        for stats in profiles:
+            stats.record(statement, elapsed, rows)
+        with self._lock:
+            self.stats.record(statement, elapsed, rows)
+
+    def _error(self, context):
+        connection = context.connection
+        starts = connection.info.get('profile_start') if connection is not None else None
+        if starts:
+            starts.pop()
+
+    def listen(self):
+        """Start listening to the cursor execution and error events of the engine."""
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+        event.listen(self.engine, 'handle_error', self._error)
+
+    def remove(self):
+        """Stop listening to the cursor execution and error events of the engine."""
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+        event.remove(self.engine, 'handle_error', self._error)
+
+    def reset(self):
+        """Clear the statistics of all profiles."""
+        with self._lock:
+            self.stats = QueryStats(self.top)
+
+    @contextmanager
+    def profile(self, sample_rate=None):
+        """
+        Record the statements executed by the current thread within the block.
+
+        Profiles can be nested; statements are recorded in every active profile.
+
+        :param sample_rate: Override of the sampling rate of the instrumentation.
+        :return: QueryStats object of the profile, with ``sampled`` False if it was not selected.
+        """
+        rate = self.sample_rate if sample_rate is None else sample_rate
+        stats = QueryStats(self.top, sampled=rate >= 1.0 or random.random() < rate)
+        if not stats.sampled:
+            yield stats
+            return
+        profiles = self._active()
+        if profiles is None:
+            profiles = self._local.profiles = []
+        profiles.append(stats)
+        try:
+            yield stats
+        finally:
+            profiles.remove(stats)
+            if self.callback is not None:
+                self.callback(stats)
@@ -0,0 +1,78 @@
+"""
+Common match result queries.
+
+Results of a schema are selected from every match model with one SELECT per phase,
+combined with UNION ALL, so that criteria on teams are applied to the indexed team
+columns of each phase table.  Penalty shootout goals are outer-joined and are NULL for
+matches without a shootout.
+"""
+from sqlalchemy import select, union_all, and_, or_
+
+import light.common.models as lcm
+from light.bulk import inheritance_tables
+from light.schemas import get_schema
+
+
+RESULT_COLUMNS = ('id', 'phase', 'date', 'competition_id', 'season_id', 'home_team_id', 'away_team_id',
+                  'home_goals', 'away_goals', 'home_shootout_goals', 'away_shootout_goals')
+
+
+def _schema(schema):
+    return get_schema(schema) if isinstance(schema, str) else schema
+
+
+def match_results_select(schema, criteria=None):
+    """
+    Build a selectable of match results across all phases of a schema.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param criteria: Function of (matches table, phase table) that returns a WHERE clause for each phase.
+    :return: Selectable with the columns in ``RESULT_COLUMNS``.
+    """
+    matches = lcm.Matches.__table__
+    shootouts = lcm.MatchShootouts.__table__
+    selects = []
+    for model in _schema(schema).matches.values():
+        tables = inheritance_tables(model)
+        joined = matches
+        for table in tables[1:]:
+            joined = joined.join(table, matches.c.id == table.c.id)
+        joined = joined.outerjoin(shootouts, matches.c.id == shootouts.c.id)
+        phase_table = tables[-1]
+        query = select([matches.c.id, matches.c.phase, matches.c.date, matches.c.competition_id,
+                        matches.c.season_id, phase_table.c.home_team_id, phase_table.c.away_team_id,
+                        matches.c.home_goals, matches.c.away_goals,
+                        shootouts.c.home_shootout_goals, shootouts.c.away_shootout_goals]).select_from(joined)
+        if criteria is not None:
+            query = query.where(criteria(matches, phase_table))
+        selects.append(query)
+    return union_all(*selects).alias('results')
+
+
+def fixtures_select(schema, competition_id, season_id):
+    """
+    Build the query of all fixtures and results of a competition and season, ordered by date.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param competition_id: Competition ID.
+    :param season_id: Season ID.
+    :return: Select object.
+    """
+    results = match_results_select(schema, lambda matches, phase_table: and_(
+        matches.c.competition_id == competition_id, matches.c.season_id == season_id))
+    return select([results]).order_by(results.c.date, results.c.id)
+
+
+def head_to_head_select(schema, team_id, opponent_id):
+    """
+    Build the query of all matches between two teams, home or away, ordered by date.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param team_id: Team ID.
+    :param opponent_id: Opponent team ID.
+    :return: Select object.
+    """
+    results = match_results_select(schema, lambda matches, phase_table: or_(
+        and_(phase_table.c.home_team_id == team_id, phase_table.c.away_team_id == opponent_id),
+        and_(phase_table.c.home_team_id == opponent_id, phase_table.c.away_team_id == team_id)))
+    return select([results]).order_by(results.c.date, results.c.id)
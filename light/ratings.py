@@ -0,0 +1,237 @@
+"""
+Elo ratings of teams.
+
+Ratings are computed in one pass over the match results of a club or national team
+database in date order.  Results are streamed as plain rows from a Core select across
+the match tables, the current ratings of all teams are held in a flat array of floats,
+and the ratings of both teams before and after every match are written to
+``match_ratings`` with one executemany per batch.  Rating resumes after the last rated
+match, so new matches are rated without recomputing the history; matches dated on or
+before the last rated match, or a change of rating parameters, require
+:func:`rebuild_ratings`.
+"""
+from array import array
+
+from sqlalchemy import select, func, case, union_all, and_, or_
+
+import light.common.models as lcm
+from light.queries import match_results_select
+from light.schemas import get_schema
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+RATING_COLUMNS = ('sequence', 'match_id', 'date', 'home_team_id', 'away_team_id',
+                  'home_rating_pre', 'away_rating_pre', 'home_rating_post', 'away_rating_post')
+
+
+def _schema(schema):
+    return get_schema(schema) if isinstance(schema, str) else schema
+
+
+class TeamRatings(object):
+    """
+    Current ratings of teams, stored in a flat array of floats indexed by team.
+
+    :param initial: Rating of a team without rated matches.
+    :param ratings: Dictionary of ratings keyed by team ID.
+    """
+
+    def __init__(self, initial=1500.0, ratings=None):
+        self.initial = initial
+        self.index = {}
+        self.values = array('d')
+        for team_id, rating in (ratings or {}).items():
+            self[team_id] = rating
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, team_id):
+        return team_id in self.index
+
+    def __getitem__(self, team_id):
+        position = self.index.get(team_id)
+        return self.initial if position is None else self.values[position]
+
+    def __setitem__(self, team_id, rating):
+        position = self.index.get(team_id)
+        if position is None:
+            self.index[team_id] = len(self.values)
+            self.values.append(rating)
+        else:
+            self.values[position] = rating
+
+    def items(self):
+        """Return a list of (team ID, rating) tuples."""
+        return [(team_id, self.values[position]) for team_id, position in self.index.items()]
+
+
+class Elo(object):
+    """
+    Parameters of the Elo rating model.
+
+    The expected score of the home team is ``1 / (1 + 10 ** ((away - home - home_advantage) / 400))``
+    and both ratings change by ``k * margin * (score - expected)``.  The margin multiplier is 1 for
+    a win by one goal, 1.5 for two goals and (11 + N) / 8 for N goals above that.  A match decided
+    by a penalty shootout is scored as a draw moved by ``shootout_score`` toward the winner.
+
+    :param k: Rating change factor.
+    :param home_advantage: Rating points added to the home team when computing expected scores.
+    :param initial: Rating of a team without rated matches.
+    :param shootout_score: Score added to the shootout winner, and taken from the loser.
+    """
+
+    def __init__(self, k=20.0, home_advantage=100.0, initial=1500.0, shootout_score=0.25):
+        self.k = k
+        self.home_advantage = home_advantage
+        self.initial = initial
+        self.shootout_score = shootout_score
+
+    def __repr__(self):
+        return "<Elo(k={0}, home_advantage={1}, initial={2}, shootout_score={3})>".format(
+            self.k, self.home_advantage, self.initial, self.shootout_score)
+
+    def expected(self, home_rating, away_rating):
+        """Return the expected score of the home team, between 0 and 1."""
+        return 1.0 / (1.0 + 10.0 ** ((away_rating - home_rating - self.home_advantage) / 400.0))
+
+    def rate(self, results, ratings):
+        """
+        Generate the ratings of a sequence of match results in date order.
+
+        :param results: Iterable of (match ID, date, home team ID, away team ID, home goals,
+            away goals, home shootout goals, away shootout goals) tuples.
+        :param ratings: TeamRatings object, updated in place.
+        :return: Generator of (match ID, date, home team ID, away team ID, home rating before,
+            away rating before, home rating after, away rating after) tuples.
+        """
+        k, home_advantage, shootout_score = self.k, self.home_advantage, self.shootout_score
+        index, values, initial = ratings.index, ratings.values, ratings.initial
+        for match_id, date, home, away, home_goals, away_goals, home_shootout, away_shootout in results:
+            h = index.get(home)
+            if h is None:
+                h = index[home] = len(values)
+                values.append(initial)
+            a = index.get(away)
+            if a is None:
+                a = index[away] = len(values)
+                values.append(initial)
+            home_pre, away_pre = values[h], values[a]
+
+            expected = 1.0 / (1.0 + 10.0 ** ((away_pre - home_pre - home_advantage) / 400.0))
+            difference = home_goals - away_goals
+            if difference > 0:
+                score = 1.0
+            elif difference < 0:
+                score, difference = 0.0, -difference
+            elif home_shootout is None or away_shootout is None or home_shootout == away_shootout:
+                score = 0.5
+            else:
+                score = 0.5 + shootout_score if home_shootout > away_shootout else 0.5 - shootout_score
+            margin = 1.0 if difference <= 1 else 1.5 if difference == 2 else (11.0 + difference) / 8.0
+
+            change = k * margin * (score - expected)
+            values[h] = home_pre + change
+            values[a] = away_pre - change
+            yield match_id, date, home, away, home_pre, away_pre, home_pre + change, away_pre - change
+
+
+def _rateable(after=None):
+    """Restrict results to played matches after a (date, match ID) position."""
+    def criteria(matches, phase_table):
+        clauses = [matches.c.date.isnot(None), matches.c.home_goals.isnot(None), matches.c.away_goals.isnot(None),
+                   phase_table.c.home_team_id.isnot(None), phase_table.c.away_team_id.isnot(None)]
+        if after is not None:
+            last_date, last_id = after
+            clauses.append(or_(matches.c.date > last_date,
+                               and_(matches.c.date == last_date, matches.c.id > last_id)))
+        return and_(*clauses)
+    return criteria
+
+
+def ratings_select(schema, after=None):
+    """
+    Build the query of match results to rate, ordered by date and ID.
+
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param after: (date, match ID) of the last rated match.
+    :return: Select object with the columns expected by :meth:`Elo.rate`.
+    """
+    results = match_results_select(_schema(schema), _rateable(after))
+    return select([results.c.id, results.c.date, results.c.home_team_id, results.c.away_team_id,
+                   results.c.home_goals, results.c.away_goals,
+                   results.c.home_shootout_goals, results.c.away_shootout_goals])\
+        .order_by(results.c.date, results.c.id)
+
+
+def current_ratings(connection):
+    """
+    Return the rating of every team after its last rated match.
+
+    :param connection: Connection object.
+    :return: Dictionary of ratings keyed by team ID.
+    """
+    table = lcm.MatchRatings.__table__
+    sides = union_all(select([table.c.home_team_id.label('team_id'), table.c.sequence]),
+                      select([table.c.away_team_id.label('team_id'), table.c.sequence])).alias('sides')
+    latest = select([sides.c.team_id, func.max(sides.c.sequence).label('sequence')])\
+        .group_by(sides.c.team_id).alias('latest')
+    rating = case([(table.c.home_team_id == latest.c.team_id, table.c.home_rating_post)],
+                  else_=table.c.away_rating_post)
+    query = select([latest.c.team_id, rating]).select_from(latest.join(table, table.c.sequence == latest.c.sequence))
+    return dict((team_id, value) for team_id, value in connection.execute(query))
+
+
+def rate_matches(connection, schema, elo=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Rate the matches played after the last rated match and write their ratings.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param elo: Elo object with the rating parameters, defaults to ``Elo()``.
+    :param batch_size: Number of matches fetched and written per round trip.
+    :return: Number of matches rated.
+    """
+    elo = elo or Elo()
+    table = lcm.MatchRatings.__table__
+    last = connection.execute(select([table.c.sequence, table.c.date, table.c.match_id])
+                              .order_by(table.c.sequence.desc()).limit(1)).first()
+    if last is None:
+        sequence, after, ratings = 0, None, TeamRatings(elo.initial)
+    else:
+        sequence, after = last.sequence, (last.date, last.match_id)
+        ratings = TeamRatings(elo.initial, current_ratings(connection))
+
+    rated = 0
+    result = connection.execution_options(stream_results=True).execute(ratings_select(schema, after))
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            records = []
+            for rating in elo.rate(rows, ratings):
+                sequence += 1
+                records.append(dict(zip(RATING_COLUMNS, (sequence,) + rating)))
+            connection.execute(table.insert(), records)
+            rated += len(records)
+    finally:
+        result.close()
+    return rated
+
+
+def rebuild_ratings(connection, schema, elo=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Rate all matches of a schema again.  Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param elo: Elo object with the rating parameters, defaults to ``Elo()``.
+    :param batch_size: Number of matches fetched and written per round trip.
+    :return: Number of matches rated.
+    """
+    connection.execute(lcm.MatchRatings.__table__.delete())
+    return rate_matches(connection, schema, elo, batch_size)
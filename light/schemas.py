@@ -0,0 +1,89 @@
+"""
+Lookup of the models that make up the club and national team schemas.
+
+Subsystems that work against either schema (importers, derived tables, exports)
+use this module instead of importing ``light.club`` or ``light.natl`` directly,
+so that only the requested schema is mapped.
+"""
+
+
+class SchemaModels(object):
+    """
+    Models that make up a team schema.
+
+    :param name: Schema name, ``club`` or ``natl``.
+    :param base: Declarative base of the schema.
+    :param team: Team model (``Clubs`` or ``Countries``).
+    :param matches: Dictionary of match models keyed by phase.
+    :param shootout: Shootout model.
+    :param deduction: Deduction model.
+    :param head_to_head: Head-to-head summary model.
+    """
+
+    def __init__(self, name, base, team, matches, shootout, deduction, head_to_head):
+        self.name = name
+        self.base = base
+        self.team = team
+        self.matches = matches
+        self.shootout = shootout
+        self.deduction = deduction
+        self.head_to_head = head_to_head
+
+    def match_model(self, phase):
+        """
+        Return the match model for a phase.
+
+        :param phase: Match phase (``friendly``, ``league``, ``group`` or ``knockout``).
+        :raises ValueError: if the phase is not part of the schema.
+        """
+        try:
+            return self.matches[phase]
+        except KeyError:
+            raise ValueError("Phase '{0}' is not supported by the {1} schema".format(phase, self.name))
+
+    def __repr__(self):
+        return "<SchemaModels({0})>".format(self.name)
+
+
+def get_schema(name):
+    """
+    Return the models of a team schema, importing the schema module on first use.
+
+    :param name: ``club`` or ``natl``.
+    :return: SchemaModels object.
+    """
+    if name == 'club':
+        import light.club as mod
+        return SchemaModels('club', mod.ClubSchema, mod.Clubs, {
+            'friendly': mod.ClubFriendlyMatches,
+            'league': mod.ClubLeagueMatches,
+            'group': mod.ClubGroupMatches,
+            'knockout': mod.ClubKnockoutMatches
+        }, mod.ClubShootoutMatches, mod.ClubDeductions, mod.ClubHeadToHead)
+    elif name == 'natl':
+        import light.natl as mod
+        import light.common.models as lcm
+        return SchemaModels('natl', mod.NatlSchema, lcm.Countries, {
+            'friendly': mod.NationalFriendlyMatches,
+            'group': mod.NationalGroupMatches,
+            'knockout': mod.NationalKnockoutMatches
+        }, mod.NationalShootoutMatches, mod.NationalDeductions, mod.NationalHeadToHead)
+    raise ValueError("Unknown schema '{0}'".format(name))
+
+
+def warm_up(*names):
+    """
+    Import the modules of team schemas and configure all mappers.
+
+    SQLAlchemy configures mappers (relationships, backrefs and inheritance) on the first
+    query or object construction after new classes are mapped; warming up moves that cost
+    to a point of the caller's choice.  Mappers are configured once, so later calls return
+    without work unless new classes were mapped in between.
+
+    :param names: Schema names, ``club`` and/or ``natl``.
+    :return: List of SchemaModels objects.
+    """
+    from sqlalchemy.orm import configure_mappers
+    schemas = [get_schema(name) for name in names]
+    configure_mappers()
+    return schemas
@@ -0,0 +1,348 @@
+"""
+COPY-based loading of match results into PostgreSQL.
+
+Import rows (see :mod:`light.importer` for the fields) are streamed into a
+temporary staging table with ``COPY FROM STDIN``, and then merged into the database
+with a fixed number of statements in the caller's transaction:
+
+1. natural keys of teams and competitions are resolved with ``UPDATE ... FROM``,
+   and unknown or ambiguous names are rejected;
+2. missing years, seasons, group rounds and knockout rounds are created with
+   ``INSERT ... SELECT`` and resolved in turn;
+3. match IDs are drawn from the match sequence for all staged rows at once; the natural
+   key and content digests are computed in Python, as by the bulk loader, from one read
+   of the staged rows of each phase, and written back with one executemany per phase;
+4. the staged rows are distributed into every level of the match hierarchy
+   (e.g. ``matches``, ``league_matches``, ``club_league_matches``) and the shootout
+   tables with one ``INSERT ... SELECT`` per table.
+
+The number of statements depends on the phases present, not on the number of rows.
+All steps but the digests are set-based; staged rows make one round trip through the
+client for their digests.  Temporary tables are private to the connection and are not
+written to the write-ahead log, so staging costs no more than an unlogged table and
+concurrent loads do not interfere.
+
+Databases without COPY support (e.g. SQLite) fall back to :class:`~light.importer.MatchImporter`,
+which resolves natural keys in memory and writes with the bulk loader.
+"""
+import io
+import time
+from datetime import date
+from itertools import islice
+
+from sqlalchemy import (MetaData, Table, Column, Integer, Boolean, String, Unicode, Date,
+                        select, func, case, and_, exists, cast, bindparam)
+from sqlalchemy.orm import class_mapper
+
+import light.common.models as lcm
+from light.bulk import LoadStats, inheritance_tables, match_key, content_hash, DIGEST_COLUMNS
+from light.importer import MatchImporter, TRUE_VALUES, DEFAULT_CHUNK_SIZE
+from light.schemas import get_schema
+
+
+STAGING_TABLE = 'match_staging'
+
+COPY_BLOCK_SIZE = 50000
+
+# Import fields copied into the staging table, in COPY column order.
+STAGED_FIELDS = ('phase', 'date', 'competition', 'season', 'home_team', 'away_team', 'home_goals', 'away_goals',
+                 'matchday', 'group', 'group_round', 'ko_round', 'extra_time',
+                 'home_shootout_goals', 'away_shootout_goals')
+
+# Import fields that every staged row must have.
+REQUIRED_FIELDS = ('competition', 'season', 'home_team', 'away_team')
+
+_text = type(u'')
+
+
+def staging_table(metadata, name=STAGING_TABLE):
+    """
+    Define the temporary staging table of import rows.
+
+    Natural keys are copied into the first columns; the ``*_id`` columns are filled when
+    the rows are merged, and are named after the match columns they are written to.
+
+    :param metadata: MetaData object that holds the table.
+    :param name: Table name.
+    :return: Table object.
+    """
+    return Table(
+        name, metadata,
+        Column('phase', String(20)),
+        Column('date', Date),
+        Column('competition', Unicode(80)),
+        Column('season', String(9)),
+        Column('home_team', Unicode(60)),
+        Column('away_team', Unicode(60)),
+        Column('home_goals', Integer),
+        Column('away_goals', Integer),
+        Column('matchday', Integer),
+        Column('group', String(2)),
+        Column('group_round', Unicode(40)),
+        Column('ko_round', Unicode(40)),
+        Column('extra_time', Boolean),
+        Column('home_shootout_goals', Integer),
+        Column('away_shootout_goals', Integer),
+        Column('match_id', Integer),
+        Column('competition_id', Integer),
+        Column('season_id', Integer),
+        Column('start_yr', Integer),
+        Column('end_yr', Integer),
+        Column('label', String(9)),
+        Column('home_team_id', Integer),
+        Column('away_team_id', Integer),
+        Column('group_round_id', Integer),
+        Column('ko_round_id', Integer),
+        Column('match_key', String(40)),
+        Column('content_hash', String(40)),
+        prefixes=['TEMPORARY']
+    )
+
+
+def supports_copy(connection):
+    """Return True if rows can be loaded into the database of a connection with COPY."""
+    return connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+
+def _copy_value(field, value):
+    if value is None or value == '':
+        return u'\\N'
+    if field == 'extra_time':
+        if not isinstance(value, bool):
+            value = _text(value).strip().lower() in TRUE_VALUES
+        return u't' if value else u'f'
+    if isinstance(value, date):
+        value = value.isoformat()
+    value = value.decode('utf-8') if isinstance(value, bytes) else _text(value)
+    return value.replace(u'\\', u'\\\\').replace(u'\t', u'\\t').replace(u'\n', u'\\n').replace(u'\r', u'\\r')
+
+
+def checked_rows(rows):
+    """
+    Generate import rows, rejecting rows without a competition, season or team name.
+
+    :param rows: Iterable of dictionaries of import fields.
+    :raises ValueError: if a required field of a row is missing or empty.
+    """
+    for number, row in enumerate(rows, 1):
+        for field in REQUIRED_FIELDS:
+            if row.get(field) is None or row.get(field) == '':
+                raise ValueError("Row {0} has no {1}".format(number, field))
+        yield row
+
+
+def _check_staged(connection, staging):
+    """Reject staged rows without a competition, season or team name."""
+    for field in REQUIRED_FIELDS:
+        if connection.execute(select([staging.c.phase]).where(staging.c[field].is_(None)).limit(1)).first():
+            raise ValueError("Staged rows have no {0}".format(field))
+
+
+def copy_rows(connection, table, rows, block_size=COPY_BLOCK_SIZE):
+    """
+    Stream import rows into a staging table with ``COPY FROM STDIN``, one COPY per block of rows.
+
+    Rows without a phase are staged as league matches.
+
+    :param connection: Connection object to a PostgreSQL database (psycopg2).
+    :param table: Staging table.
+    :param rows: Iterable of dictionaries of import fields.
+    :param block_size: Number of rows per COPY statement.
+    :return: Number of rows copied.
+    """
+    columns = ', '.join(connection.dialect.identifier_preparer.quote(field) for field in STAGED_FIELDS)
+    statement = "COPY {0} ({1}) FROM STDIN".format(connection.dialect.identifier_preparer.format_table(table),
+                                                   columns)
+    cursor = connection.connection.cursor()
+    rows = iter(rows)
+    count = 0
+    try:
+        while True:
+            block = list(islice(rows, block_size))
+            if not block:
+                break
+            lines = []
+            for row in block:
+                values = dict(row, phase=row.get('phase') or 'league')
+                lines.append(u'\t'.join(_copy_value(field, values.get(field)) for field in STAGED_FIELDS))
+            cursor.copy_expert(statement, io.BytesIO((u'\n'.join(lines) + u'\n').encode('utf-8')))
+            count += len(block)
+    finally:
+        cursor.close()
+    return count
+
+
+def _resolve(connection, staging, name_column, id_column, model, kind):
+    """Resolve natural keys to primary keys, rejecting unknown and ambiguous names."""
+    table = model.__table__
+    ambiguous = connection.execute(
+        select([table.c.name]).where(table.c.name.in_(select([name_column]).distinct()))
+        .group_by(table.c.name).having(func.count(table.c.id) > 1).limit(1)).scalar()
+    if ambiguous is not None:
+        raise LookupError("Ambiguous {0}: {1}".format(kind, ambiguous))
+    connection.execute(staging.update().values({id_column: table.c.id}).where(table.c.name == name_column))
+    unknown = connection.execute(
+        select([name_column]).where(and_(name_column.isnot(None), id_column.is_(None))).limit(1)).scalar()
+    if unknown is not None:
+        raise LookupError("Unknown {0}: {1}".format(kind, unknown))
+
+
+def _create_rounds(connection, staging, name_column, id_column, model):
+    """Create rounds that are named in staged rows but missing from the database, and resolve them."""
+    table = model.__table__
+    names = select([name_column.label('name')]).where(name_column.isnot(None)).distinct().alias()
+    connection.execute(table.insert().from_select(
+        ['id', 'name'],
+        select([table.c.id.default.next_value(), names.c.name])
+        .where(~exists().where(table.c.name == names.c.name))))
+    connection.execute(staging.update().values({id_column: table.c.id}).where(table.c.name == name_column))
+
+
+def _create_seasons(connection, staging):
+    """Create the years and seasons of staged rows that are missing from the database, and resolve them."""
+    years, seasons = lcm.Years.__table__, lcm.Seasons.__table__
+    start = cast(func.split_part(staging.c.season, '-', 1), Integer)
+    end = func.coalesce(cast(func.nullif(func.split_part(staging.c.season, '-', 2), ''), Integer), start)
+    connection.execute(staging.update().values(start_yr=start, end_yr=end))
+    connection.execute(staging.update().values(label=case(
+        [(staging.c.start_yr == staging.c.end_yr, cast(staging.c.start_yr, String))],
+        else_=cast(staging.c.start_yr, String) + '-' + cast(staging.c.end_yr, String))))
+
+    staged_years = select([staging.c.start_yr.label('yr')]).union(select([staging.c.end_yr])).alias()
+    connection.execute(years.insert().from_select(
+        ['id', 'yr'],
+        select([years.c.id.default.next_value(), staged_years.c.yr])
+        .where(~exists().where(years.c.yr == staged_years.c.yr))))
+
+    labels = select([staging.c.label, staging.c.start_yr, staging.c.end_yr]).distinct().alias()
+    start_year, end_year = years.alias(), years.alias()
+    connection.execute(seasons.insert().from_select(
+        ['id', 'start_year_id', 'end_year_id', 'label', 'start_yr', 'end_yr'],
+        select([seasons.c.id.default.next_value(), start_year.c.id, end_year.c.id,
+                labels.c.label, labels.c.start_yr, labels.c.end_yr])
+        .where(and_(start_year.c.yr == labels.c.start_yr, end_year.c.yr == labels.c.end_yr,
+                    ~exists().where(seasons.c.label == labels.c.label)))))
+    connection.execute(staging.update().values(season_id=seasons.c.id).where(seasons.c.label == staging.c.label))
+
+
+def _digest_staged(connection, staging, phase, model):
+    """Write the natural key and content digests of the staged rows of a phase."""
+    tables = inheritance_tables(model)
+    discriminator = class_mapper(model).polymorphic_on
+    columns = [staging.c[c.key] for table in tables for c in table.columns
+               if not c.primary_key and c is not discriminator and c.key not in DIGEST_COLUMNS and c.key in staging.c]
+    shootouts = [staging.c.home_shootout_goals, staging.c.away_shootout_goals]
+    params = []
+    for row in connection.execute(select([staging.c.match_id] + shootouts + columns).where(staging.c.phase == phase)):
+        values = dict((c.key, row[c]) for c in columns if row[c] is not None)
+        if all(row[c] is not None for c in shootouts):
+            values.update((c.key, row[c]) for c in shootouts)
+        params.append({'_id': row[staging.c.match_id], '_match_key': match_key(values, phase),
+                       '_content_hash': content_hash(values, tables)})
+    if params:
+        connection.execute(staging.update().where(staging.c.match_id == bindparam('_id')).values(
+            match_key=bindparam('_match_key'), content_hash=bindparam('_content_hash')), params)
+
+
+def _source(staging, column):
+    """Return the staged expression written to a column of the match hierarchy, or None."""
+    if column.primary_key:
+        return staging.c.match_id
+    source = staging.c.get(column.key)
+    if source is None:
+        return None
+    default = column.default
+    if default is not None and default.is_scalar:
+        return func.coalesce(source, default.arg)
+    return source
+
+
+def _distribute(connection, staging, table, criterion):
+    pairs = [(c.key, _source(staging, c)) for c in table.columns]
+    pairs = [(key, source) for key, source in pairs if source is not None]
+    connection.execute(table.insert().from_select(
+        [key for key, _ in pairs], select([source for _, source in pairs]).where(criterion)))
+
+
+def merge_staged(connection, schema, staging):
+    """
+    Merge the rows of a staging table into a club or national team database.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object to a PostgreSQL database.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param staging: Staging table filled by :func:`copy_rows`.
+    :raises LookupError: if a team or competition name is unknown or ambiguous.
+    :raises ValueError: if a phase is not part of the schema, or a staged row has no
+        competition, season or team name.
+    :raises IntegrityError: if the natural key of a staged match is taken; corrections are
+        re-imported with the upsert mode of :class:`~light.importer.MatchImporter` instead.
+    """
+    schema = get_schema(schema) if isinstance(schema, str) else schema
+    _check_staged(connection, staging)
+    phases = sorted(row[0] for row in connection.execute(select([staging.c.phase]).distinct()))
+    models = [(phase, schema.match_model(phase)) for phase in phases]
+
+    team = schema.team
+    _resolve(connection, staging, staging.c.competition, staging.c.competition_id, lcm.Competitions, 'competition')
+    _resolve(connection, staging, staging.c.home_team, staging.c.home_team_id, team, 'team')
+    _resolve(connection, staging, staging.c.away_team, staging.c.away_team_id, team, 'team')
+    _create_seasons(connection, staging)
+    _create_rounds(connection, staging, staging.c.group_round, staging.c.group_round_id, lcm.GroupRounds)
+    _create_rounds(connection, staging, staging.c.ko_round, staging.c.ko_round_id, lcm.KnockoutRounds)
+
+    root = lcm.Matches.__table__
+    connection.execute(staging.update().values(match_id=root.c.id.default.next_value()))
+    for phase, model in models:
+        _digest_staged(connection, staging, phase, model)
+    _distribute(connection, staging, root, staging.c.phase.in_(phases))
+    for phase, model in models:
+        for table in inheritance_tables(model)[1:]:
+            _distribute(connection, staging, table, staging.c.phase == phase)
+
+    shootouts = and_(staging.c.home_shootout_goals.isnot(None), staging.c.away_shootout_goals.isnot(None))
+    for table in inheritance_tables(schema.shootout):
+        _distribute(connection, staging, table, shootouts)
+
+
+def stage_matches(session, rows, schema='club', block_size=COPY_BLOCK_SIZE):
+    """
+    Load import rows into a club or national team database with COPY and set-based merges.
+
+    On databases without COPY support the rows are imported with :class:`~light.importer.MatchImporter`
+    instead, ``block_size`` rows at a time.  Either way all rows are written in the session's
+    transaction, which is left to the caller to commit.  The load stops at the first row without
+    a competition, season or team name, before the block of that row is written.  The COPY load
+    runs in a savepoint, so that a failed load drops the staging table and writes no rows.
+
+    :param session: Session object.
+    :param rows: Iterable of dictionaries of import fields.
+    :param schema: Schema name (``club`` or ``natl``) or SchemaModels object.
+    :param block_size: Number of rows per COPY statement or per importer chunk.
+    :return: LoadStats object.
+    :raises ValueError: if a row has no competition, season or team name.
+    """
+    schema = get_schema(schema) if isinstance(schema, str) else schema
+    rows = checked_rows(rows)
+    connection = session.connection()
+    stats = LoadStats()
+    start = time.time()
+    if supports_copy(connection):
+        staging = staging_table(MetaData())
+        with connection.begin_nested():
+            staging.create(connection)
+            stats.rows = copy_rows(connection, staging, rows, block_size)
+            connection.execute("ANALYZE {0}".format(staging.name))
+            merge_staged(connection, schema, staging)
+            staging.drop(connection)
+    else:
+        importer = MatchImporter(session, schema, block_size or DEFAULT_CHUNK_SIZE)
+        importer.resolver.warm()
+        while True:
+            chunk = list(islice(rows, importer.chunk_size))
+            if not chunk:
+                break
+            stats.rows += importer.write(chunk)
+    stats.elapsed = time.time() - start
+    return stats
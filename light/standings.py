@@ -0,0 +1,409 @@
+"""
+League standings computed from club league matches and point deductions.
+
+Standings are aggregated in the database with a single set-based statement and
+persisted to the ``club_standings`` table, so that reading a league table is one
+indexed SELECT.  Rows can be rebuilt for the whole database or a competition/season,
+and are updated after every ORM flush that writes league matches or club deductions
+once :func:`track_standings` has been called.  Matches written with the bulk loader
+bypass the ORM and require an explicit :func:`refresh_standings`.
+
+Cumulative standings after every matchday are persisted to ``club_matchday_standings``
+by :func:`refresh_matchday_standings`, so the table after any matchday is also a single
+indexed SELECT.  Deductions count from the first matchday whose last match is played
+on or after the date of the deduction.
+"""
+from multiprocessing.pool import ThreadPool
+
+from sqlalchemy import event, select, func, case, and_, or_, union_all, literal_column
+from sqlalchemy.orm.session import Session
+from sqlalchemy.orm.attributes import get_history
+
+import light.common.models as lcm
+from light.club import ClubLeagueMatches, ClubDeductions, ClubStandings, ClubMatchdayStandings
+
+
+STAT_FIELDS = ('played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against')
+
+
+class StandingsRules(object):
+    """
+    Points awarded per result and tie-breakers used to order a league table.
+
+    Tie-breakers are names of standings fields; ``goals_against`` and ``losses``
+    rank ascending and all other fields descending.
+
+    :param win: Points for a win.
+    :param draw: Points for a draw.
+    :param loss: Points for a loss.
+    :param tiebreakers: Sequence of field names in order of precedence.
+    """
+
+    ASCENDING = ('goals_against', 'losses')
+
+    def __init__(self, win=3, draw=1, loss=0, tiebreakers=('points', 'goal_difference', 'goals_for')):
+        self.win = win
+        self.draw = draw
+        self.loss = loss
+        self.tiebreakers = tuple(tiebreakers)
+
+    def points(self, wins, draws, losses, deducted):
+        """Return league points for result counts (numbers or SQL expressions)."""
+        return wins * self.win + draws * self.draw + losses * self.loss - deducted
+
+    def order_by(self, model=ClubStandings):
+        """Return ORDER BY clauses for the tie-breakers, with team ID as final key."""
+        clauses = []
+        for name in self.tiebreakers:
+            field = getattr(model, name)
+            clauses.append(field.asc() if name in self.ASCENDING else field.desc())
+        clauses.append(model.team_id.asc())
+        return clauses
+
+    def __repr__(self):
+        return "<StandingsRules(win={0}, draw={1}, loss={2}, tiebreakers={3})>".format(
+            self.win, self.draw, self.loss, self.tiebreakers)
+
+
+DEFAULT_RULES = StandingsRules()
+
+
+def _key_filter(columns, competition_id, season_id, team_ids):
+    competition, season, team = columns
+    clauses = []
+    if competition_id is not None:
+        clauses.append(competition == competition_id)
+    if season_id is not None:
+        clauses.append(season == season_id)
+    if team_ids is not None and team is not None:
+        clauses.append(team.in_(list(team_ids)))
+    return and_(*clauses)
+
+
+def _team_results(competition_id, season_id, team_ids=None):
+    """League results from the point of view of each team, one row per team and match."""
+    matches = lcm.Matches.__table__
+    league_matches = lcm.LeagueMatches.__table__
+    club_matches = ClubLeagueMatches.__table__
+    joined = matches.join(league_matches, matches.c.id == league_matches.c.id)\
+        .join(club_matches, matches.c.id == club_matches.c.id)
+
+    sides = []
+    for team, goals_for, goals_against in [
+            (club_matches.c.home_team_id, matches.c.home_goals, matches.c.away_goals),
+            (club_matches.c.away_team_id, matches.c.away_goals, matches.c.home_goals)]:
+        sides.append(select([matches.c.competition_id, matches.c.season_id, team.label('team_id'),
+                             matches.c.date, league_matches.c.matchday,
+                             goals_for.label('goals_for'), goals_against.label('goals_against')])
+                     .select_from(joined)
+                     .where(_key_filter((matches.c.competition_id, matches.c.season_id, team),
+                                        competition_id, season_id, team_ids)))
+    return union_all(*sides).alias('results')
+
+
+def _totals(results):
+    """Aggregate expressions for the statistics fields over a team results selectable."""
+    return [
+        func.count(literal_column('*')).label('played'),
+        func.sum(case([(results.c.goals_for > results.c.goals_against, 1)], else_=0)).label('wins'),
+        func.sum(case([(results.c.goals_for == results.c.goals_against, 1)], else_=0)).label('draws'),
+        func.sum(case([(results.c.goals_for < results.c.goals_against, 1)], else_=0)).label('losses'),
+        func.sum(results.c.goals_for).label('goals_for'),
+        func.sum(results.c.goals_against).label('goals_against')
+    ]
+
+
+def _deductions(competition_id, season_id, team_ids=None):
+    deductions = lcm.Deductions.__table__
+    club_deductions = ClubDeductions.__table__
+    return deductions.join(club_deductions, deductions.c.id == club_deductions.c.id), \
+        (deductions.c.competition_id, deductions.c.season_id, club_deductions.c.team_id), \
+        _key_filter((deductions.c.competition_id, deductions.c.season_id, club_deductions.c.team_id),
+                    competition_id, season_id, team_ids)
+
+
+def standings_select(competition_id=None, season_id=None, team_ids=None, rules=DEFAULT_RULES):
+    """
+    Build the aggregate that computes standings rows from league matches and deductions.
+
+    :param competition_id: Restrict to a competition.
+    :param season_id: Restrict to a season.
+    :param team_ids: Restrict to a collection of team IDs.
+    :param rules: StandingsRules object.
+    :return: Select object with the columns of ``club_standings``.
+    """
+    results = _team_results(competition_id, season_id, team_ids)
+
+    source, keys, where = _deductions(competition_id, season_id, team_ids)
+    points = lcm.Deductions.__table__.c.points
+    deducted = select(list(keys) + [func.sum(points).label('points')])\
+        .select_from(source).where(where).group_by(*keys).alias('deducted')
+
+    totals = dict((c.name, c) for c in _totals(results))
+    penalty = func.coalesce(func.max(deducted.c.points), 0)
+
+    return select([results.c.competition_id, results.c.season_id, results.c.team_id] +
+                  [totals[name] for name in STAT_FIELDS] + [
+        penalty.label('deducted'),
+        rules.points(totals['wins'], totals['draws'], totals['losses'], penalty).label('points')
+    ]).select_from(
+        results.outerjoin(deducted, and_(results.c.competition_id == deducted.c.competition_id,
+                                         results.c.season_id == deducted.c.season_id,
+                                         results.c.team_id == deducted.c.team_id))
+    ).group_by(results.c.competition_id, results.c.season_id, results.c.team_id)
+
+
+def refresh_standings(connection, competition_id=None, season_id=None, team_ids=None, rules=DEFAULT_RULES):
+    """
+    Recompute persisted standings rows.  With no arguments the whole table is rebuilt.
+
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param competition_id: Restrict to a competition.
+    :param season_id: Restrict to a season.
+    :param team_ids: Restrict to a collection of team IDs.
+    :param rules: StandingsRules object.
+    """
+    table = ClubStandings.__table__
+    connection.execute(table.delete().where(
+        _key_filter((table.c.competition_id, table.c.season_id, table.c.team_id),
+                    competition_id, season_id, team_ids)))
+    query = standings_select(competition_id, season_id, team_ids, rules)
+    connection.execute(table.insert().from_select([c.name for c in query.columns], query))
+
+
+def league_table(session, competition_id, season_id, rules=DEFAULT_RULES):
+    """
+    Return the ordered league table of a competition and season.
+
+    :param session: Session object.
+    :param competition_id: Competition ID.
+    :param season_id: Season ID.
+    :param rules: StandingsRules object.  Only the tie-breakers are used; points are read as persisted.
+    :return: List of ClubStandings objects.
+    """
+    return session.query(ClubStandings).filter(
+        ClubStandings.competition_id == competition_id,
+        ClubStandings.season_id == season_id
+    ).order_by(*rules.order_by()).all()
+
+
+def _matchday_deltas(competition_id, season_id):
+    """Statistics per team and matchday, plus the date of the last match of every matchday."""
+    results = _team_results(competition_id, season_id)
+    keys = [results.c.competition_id, results.c.season_id, results.c.team_id, results.c.matchday]
+    deltas = select(keys + _totals(results)).group_by(*keys)
+
+    results = _team_results(competition_id, season_id)
+    keys = [results.c.competition_id, results.c.season_id, results.c.matchday]
+    matchdays = select(keys + [func.max(results.c.date).label('last_date')]).group_by(*keys)
+    return deltas, matchdays
+
+
+def matchday_standings_select(competition_id=None, season_id=None, rules=DEFAULT_RULES):
+    """
+    Build the statement that computes cumulative standings for every team after every matchday.
+
+    Every team has a row for every matchday of its competition and season, and running totals
+    are computed with window functions partitioned by team and ordered by matchday.
+
+    :param competition_id: Restrict to a competition.
+    :param season_id: Restrict to a season.
+    :param rules: StandingsRules object.
+    :return: Select object with the columns of ``club_matchday_standings``.
+    """
+    deltas, matchdays = _matchday_deltas(competition_id, season_id)
+    deltas = deltas.alias('deltas')
+    matchdays = matchdays.alias('matchdays')
+
+    teams = select([deltas.c.competition_id, deltas.c.season_id, deltas.c.team_id]).distinct().alias('teams')
+    grid = select([teams.c.competition_id, teams.c.season_id, teams.c.team_id,
+                   matchdays.c.matchday, matchdays.c.last_date]).select_from(
+        teams.join(matchdays, and_(teams.c.competition_id == matchdays.c.competition_id,
+                                   teams.c.season_id == matchdays.c.season_id))).alias('grid')
+
+    source, keys, where = _deductions(competition_id, season_id)
+    competition, season, team = keys
+    deduction_date, points = lcm.Deductions.__table__.c.date, lcm.Deductions.__table__.c.points
+    ded_keys = [competition, season, team, matchdays.c.matchday]
+    deducted = select(ded_keys + [func.sum(points).label('points')]).select_from(
+        source.join(matchdays, and_(competition == matchdays.c.competition_id, season == matchdays.c.season_id,
+                                    or_(deduction_date == None, deduction_date <= matchdays.c.last_date)))
+    ).where(where).group_by(*ded_keys).alias('deducted')
+
+    def matches_key(other):
+        return and_(grid.c.competition_id == other.c.competition_id, grid.c.season_id == other.c.season_id,
+                    grid.c.team_id == other.c.team_id, grid.c.matchday == other.c.matchday)
+
+    window = dict(partition_by=[grid.c.competition_id, grid.c.season_id, grid.c.team_id],
+                  order_by=grid.c.matchday)
+    totals = dict((name, func.sum(func.coalesce(deltas.c[name], 0)).over(**window)) for name in STAT_FIELDS)
+    penalty = func.coalesce(deducted.c.points, 0)
+
+    return select([grid.c.competition_id, grid.c.season_id, grid.c.matchday, grid.c.team_id] +
+                  [totals[name].label(name) for name in STAT_FIELDS] + [
+        penalty.label('deducted'),
+        rules.points(totals['wins'], totals['draws'], totals['losses'], penalty).label('points')
+    ]).select_from(grid.outerjoin(deltas, matches_key(deltas)).outerjoin(deducted, matches_key(deducted)))
+
+
+def _matchday_standings_rows(connection, competition_id, season_id, rules):
+    """Compute cumulative matchday standings in Python from per-matchday statistics."""
+    deltas, matchdays = _matchday_deltas(competition_id, season_id)
+
+    calendar = {}
+    for row in connection.execute(matchdays):
+        calendar.setdefault((row.competition_id, row.season_id), []).append((row.matchday, row.last_date))
+
+    stats = {}
+    for row in connection.execute(deltas):
+        stats.setdefault((row.competition_id, row.season_id, row.team_id), {})[row.matchday] = row
+
+    source, keys, where = _deductions(competition_id, season_id)
+    deductions = {}
+    for competition, season, team, deduction_date, points in connection.execute(
+            select(list(keys) + [lcm.Deductions.__table__.c.date, lcm.Deductions.__table__.c.points])
+            .select_from(source).where(where)):
+        deductions.setdefault((competition, season, team), []).append((deduction_date, points or 0))
+
+    for (competition, season, team), by_matchday in stats.items():
+        running = dict((name, 0) for name in STAT_FIELDS)
+        for matchday, last_date in sorted(calendar.get((competition, season), [])):
+            delta = by_matchday.get(matchday)
+            if delta is not None:
+                for name in STAT_FIELDS:
+                    running[name] += delta[name] or 0
+            penalty = sum(points for deduction_date, points in deductions.get((competition, season, team), [])
+                          if deduction_date is None or deduction_date <= last_date)
+            row = dict(running, competition_id=competition, season_id=season, team_id=team,
+                       matchday=matchday, deducted=penalty)
+            row['points'] = rules.points(running['wins'], running['draws'], running['losses'], penalty)
+            yield row
+
+
+def refresh_matchday_standings(connection, competition_id=None, season_id=None, rules=DEFAULT_RULES):
+    """
+    Recompute cumulative matchday standings.  With no arguments the whole table is rebuilt.
+
+    Running totals are computed in one statement with window functions, except on SQLite,
+    where per-matchday statistics are aggregated in the database and summed in Python.
+    Transaction control is left to the caller.
+
+    :param connection: Connection object.
+    :param competition_id: Restrict to a competition.
+    :param season_id: Restrict to a season.
+    :param rules: StandingsRules object.
+    """
+    table = ClubMatchdayStandings.__table__
+    connection.execute(table.delete().where(
+        _key_filter((table.c.competition_id, table.c.season_id, None), competition_id, season_id, None)))
+    if connection.dialect.name == 'sqlite':
+        rows = list(_matchday_standings_rows(connection, competition_id, season_id, rules))
+        if rows:
+            connection.execute(table.insert(), rows)
+    else:
+        query = matchday_standings_select(competition_id, season_id, rules)
+        connection.execute(table.insert().from_select([c.name for c in query.columns], query))
+
+
+def backfill_matchday_standings(engine, rules=DEFAULT_RULES, workers=4):
+    """
+    Rebuild cumulative matchday standings of every competition and season with league matches.
+
+    Every competition/season is rebuilt in its own transaction on a pool of worker threads,
+    each drawing its own connection from the engine.  SQLite databases allow one writer at a
+    time and give every thread a connection of its own, so they are rebuilt in the calling
+    thread instead.
+
+    :param engine: Engine object.
+    :param rules: StandingsRules object.
+    :param workers: Number of worker threads, ignored for SQLite databases.
+    :return: List of (competition ID, season ID) tuples that were rebuilt.
+    """
+    matches = lcm.Matches.__table__
+    league_matches = lcm.LeagueMatches.__table__
+    partitions = [tuple(row) for row in engine.execute(
+        select([matches.c.competition_id, matches.c.season_id]).distinct()
+        .select_from(matches.join(league_matches, matches.c.id == league_matches.c.id)))]
+
+    def rebuild(partition):
+        with engine.begin() as connection:
+            refresh_matchday_standings(connection, partition[0], partition[1], rules)
+        return partition
+
+    if engine.dialect.name == 'sqlite':
+        return [rebuild(partition) for partition in partitions]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(rebuild, partitions)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def matchday_table(session, competition_id, season_id, matchday, rules=DEFAULT_RULES):
+    """
+    Return the ordered league table of a competition and season after a matchday.
+
+    :param session: Session object.
+    :param competition_id: Competition ID.
+    :param season_id: Season ID.
+    :param matchday: Matchday number.
+    :param rules: StandingsRules object.  Only the tie-breakers are used; points are read as persisted.
+    :return: List of ClubMatchdayStandings objects.
+    """
+    return session.query(ClubMatchdayStandings).filter(
+        ClubMatchdayStandings.competition_id == competition_id,
+        ClubMatchdayStandings.season_id == season_id,
+        ClubMatchdayStandings.matchday == matchday
+    ).order_by(*rules.order_by(ClubMatchdayStandings)).all()
+
+
+def _values(obj, name):
+    """Return the current and previous values of an attribute in a flush, without None."""
+    return set(value for value in get_history(obj, name).sum() if value is not None)
+
+
+def _affected_keys(session):
+    keys = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ClubLeagueMatches):
+            names = ('home_team_id', 'away_team_id')
+        elif isinstance(obj, ClubDeductions):
+            names = ('team_id',)
+        else:
+            continue
+        teams = set(team_id for name in names for team_id in _values(obj, name))
+        for competition_id in _values(obj, 'competition_id'):
+            for season_id in _values(obj, 'season_id'):
+                keys.setdefault((competition_id, season_id), set()).update(teams)
+    return keys
+
+
+_tracked_rules = []
+
+
+def _update_standings(session, flush_context):
+    keys = _affected_keys(session)
+    if not keys:
+        return
+    connection = session.connection()
+    for (competition_id, season_id), team_ids in keys.items():
+        if team_ids:
+            refresh_standings(connection, competition_id, season_id, team_ids, _tracked_rules[0])
+
+
+def track_standings(rules=DEFAULT_RULES):
+    """
+    Update standings rows of the teams affected by every ORM flush of league matches or deductions.
+
+    Calling the function again replaces the rules used for updates.
+
+    :param rules: StandingsRules object.
+    """
+    if not _tracked_rules:
+        event.listen(Session, 'after_flush', _update_standings)
+        _tracked_rules.append(rules)
+    else:
+        _tracked_rules[0] = rules
@@ -0,0 +1,167 @@
+"""
+Pytest plugin that limits relationship lazy loads.
+
+Relationships such as ``home_team``, ``away_team``, ``opener`` and ``team`` load with a
+separate SELECT the first time they are read from an object, so a loop over query
+results can silently issue one statement per row.  :class:`LazyLoadTracker` counts
+the lazy loads that reach the database, keyed by model and attribute, and raises
+:class:`LazyLoadBudgetExceeded` with a report of the attributes that triggered them
+as soon as a budget is exceeded.  Lazy loads answered from the identity map are not
+counted.
+
+Enable the plugin in ``conftest.py``::
+
+    pytest_plugins = ['light.testing']
+
+and set budgets on tests with the ``lazy_load_budget`` marker, either in total or per
+``Model.attribute`` (use ``Model__attribute`` for keyword arguments)::
+
+    @pytest.mark.lazy_load_budget(0)
+    def test_listing(session):
+        ...
+
+    @pytest.mark.lazy_load_budget(Seasons__start_year=1)
+    def test_season(session, lazy_loads):
+        ...
+        assert lazy_loads.loads == {'Seasons.start_year': 1}
+
+Marked tests are tracked by the ``lazy_loads`` fixture, which returns the tracker of the
+test; unmarked tests run against unpatched SQLAlchemy unless they request the fixture,
+which then counts lazy loads without a budget.
+"""
+import pytest
+from sqlalchemy.orm.strategies import LazyLoader
+
+
+class LazyLoadBudgetExceeded(AssertionError):
+    """Raised when more relationship lazy loads are made than a budget allows."""
+
+
+_trackers = []
+_original = []
+
+
+def _emit_lazyload(loader, session, state, *args, **kwargs):
+    key = "{0}.{1}".format(state.class_.__name__, loader.key)
+    for tracker in list(_trackers):
+        tracker.record(session, key)
+    return _original[0](loader, session, state, *args, **kwargs)
+
+
+def _install():
+    if not _original:
+        _original.append(LazyLoader._emit_lazyload)
+        LazyLoader._emit_lazyload = _emit_lazyload
+
+
+def _uninstall():
+    if _original and not _trackers:
+        LazyLoader._emit_lazyload = _original.pop()
+
+
+class LazyLoadTracker(object):
+    """
+    Count relationship lazy loads within a ``with`` block and enforce budgets.
+
+    :param budget: Maximum number of lazy loads in total, or None for no limit.
+    :param attributes: Dictionary of maximum number of lazy loads keyed by ``Model.attribute``.
+    :param session: Count only the lazy loads of a session.
+    """
+
+    def __init__(self, budget=None, attributes=None, session=None):
+        self.budget = budget
+        self.attributes = dict(attributes or {})
+        self.session = session
+        self.loads = {}
+        self.failed = False
+
+    @property
+    def total(self):
+        """Number of lazy loads counted."""
+        return sum(self.loads.values())
+
+    def record(self, session, key):
+        """Count a lazy load of an attribute, and raise if it exceeds a budget."""
+        if self.session is not None and session is not self.session:
+            return
+        self.loads[key] = self.loads.get(key, 0) + 1
+        self.check()
+
+    def exceeded(self):
+        """Return descriptions of the budgets that have been exceeded."""
+        messages = []
+        if self.budget is not None and self.total > self.budget:
+            messages.append("{0} lazy loads, budget {1}".format(self.total, self.budget))
+        for key, budget in sorted(self.attributes.items()):
+            if self.loads.get(key, 0) > budget:
+                messages.append("{0} lazy loads of {1}, budget {2}".format(self.loads[key], key, budget))
+        return messages
+
+    def check(self):
+        """
+        :raises LazyLoadBudgetExceeded: if a budget has been exceeded.
+        """
+        messages = self.exceeded()
+        if messages:
+            self.failed = True
+            raise LazyLoadBudgetExceeded("; ".join(messages) + "\n" + self.report())
+
+    def report(self):
+        """Return the number of lazy loads per attribute, most frequent first, one per line."""
+        ordered = sorted(self.loads.items(), key=lambda item: (-item[1], item[0]))
+        return "\n".join("{0}: {1}".format(key, count) for key, count in ordered)
+
+    def start(self):
+        _trackers.append(self)
+        _install()
+        return self
+
+    def stop(self):
+        if self in _trackers:
+            _trackers.remove(self)
+        _uninstall()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __repr__(self):
+        return "<LazyLoadTracker(total={0}, budget={1})>".format(self.total, self.budget)
+
+
+def _marker(node, name):
+    get_marker = getattr(node, 'get_closest_marker', None) or node.get_marker
+    return get_marker(name)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'lazy_load_budget(total=None, **attributes): fail the test when it makes '
+                                       'more relationship lazy loads than allowed, in total or per Model__attribute')
+
+
+def pytest_collection_modifyitems(items):
+    for item in items:
+        if _marker(item, 'lazy_load_budget') is not None and 'lazy_loads' not in item.fixturenames:
+            item.fixturenames.append('lazy_loads')
+
+
+@pytest.fixture
+def lazy_loads(request):
+    """Track the relationship lazy loads of a test, with the budgets of its ``lazy_load_budget`` marker."""
+    marker = _marker(request.node, 'lazy_load_budget')
+    if marker is None:
+        tracker = LazyLoadTracker()
+    else:
+        budget = marker.args[0] if marker.args else marker.kwargs.get('total')
+        attributes = dict((key.replace('__', '.'), value) for key, value in marker.kwargs.items() if key != 'total')
+        tracker = LazyLoadTracker(budget, attributes)
+    tracker.start()
+
+    def fin():
+        tracker.stop()
+        if not tracker.failed:
+            tracker.check()
+    request.addfinalizer(fin)
+    return tracker
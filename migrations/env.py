@@ -0,0 +1,49 @@
+from __future__ import with_statement
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from light.config.local import LocalConfig
+from light.common import BaseSchema
+
+
+config = context.config
+fileConfig(config.config_file_name)
+
+target_metadata = BaseSchema.metadata
+
+
+def run_migrations_offline():
+    """
+    Run migrations in 'offline' mode, emitting SQL to the script output.
+    """
+    context.configure(url=LocalConfig().DATABASE_URI, target_metadata=target_metadata, literal_binds=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Run migrations in 'online' mode against the database in the local configuration.
+    """
+    engine = create_engine(LocalConfig().DATABASE_URI)
+    connection = engine.connect()
+    context.configure(connection=connection, target_metadata=target_metadata)
+
+    try:
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        connection.close()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,44 @@
+"""Persist season name and years in seasons table
+
+Revision ID: 1a2b3c4d5e6f
+Revises:
+Create Date: 2016-03-01 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1a2b3c4d5e6f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('seasons', sa.Column('label', sa.String(9)))
+    op.add_column('seasons', sa.Column('start_yr', sa.Integer))
+    op.add_column('seasons', sa.Column('end_yr', sa.Integer))
+
+    seasons = sa.table('seasons', sa.column('start_year_id'), sa.column('end_year_id'),
+                       sa.column('label'), sa.column('start_yr'), sa.column('end_yr'))
+    years = sa.table('years', sa.column('id'), sa.column('yr'))
+    op.execute(seasons.update().values(
+        start_yr=sa.select([years.c.yr]).where(years.c.id == seasons.c.start_year_id).as_scalar(),
+        end_yr=sa.select([years.c.yr]).where(years.c.id == seasons.c.end_year_id).as_scalar()
+    ))
+    op.execute(seasons.update().values(
+        label=sa.case([(seasons.c.start_yr == seasons.c.end_yr, sa.cast(seasons.c.start_yr, sa.String))],
+                      else_=sa.cast(seasons.c.start_yr, sa.String) + '-' + sa.cast(seasons.c.end_yr, sa.String))
+    ))
+
+    op.create_index('ix_seasons_label', 'seasons', ['label'])
+
+
+def downgrade():
+    op.drop_index('ix_seasons_label', 'seasons')
+    with op.batch_alter_table('seasons') as batch_op:
+        batch_op.drop_column('end_yr')
+        batch_op.drop_column('start_yr')
+        batch_op.drop_column('label')
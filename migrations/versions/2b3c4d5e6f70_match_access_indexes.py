@@ -0,0 +1,47 @@
+"""Add indexes for competition, season, date and team access paths
+
+Revision ID: 2b3c4d5e6f70
+Revises: 1a2b3c4d5e6f
+Create Date: 2016-03-08 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2b3c4d5e6f70'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+from sqlalchemy.engine.reflection import Inspector
+
+
+INDEXES = [
+    ('ix_matches_competition_season_date', 'matches', ['competition_id', 'season_id', 'date']),
+    ('ix_matches_season_id', 'matches', ['season_id']),
+    ('ix_matches_date', 'matches', ['date']),
+    ('ix_deductions_competition_season', 'deductions', ['competition_id', 'season_id'])
+]
+
+for prefix in ('club', 'natl'):
+    for phase in ('friendly', 'league', 'group', 'knockout', 'shootout'):
+        table = '{0}_{1}_matches'.format(prefix, phase)
+        for column in ('home_team_id', 'away_team_id'):
+            INDEXES.append(('ix_{0}_{1}'.format(table, column), table, [column]))
+    INDEXES.append(('ix_{0}_deductions_team_id'.format(prefix), '{0}_deductions'.format(prefix), ['team_id']))
+
+
+def existing_indexes():
+    """Return the indexes whose table exists in the database (club and national team databases differ)."""
+    tables = set(Inspector.from_engine(op.get_bind()).get_table_names())
+    return [index for index in INDEXES if index[1] in tables]
+
+
+def upgrade():
+    for name, table, columns in existing_indexes():
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in existing_indexes():
+        op.drop_index(name, table)
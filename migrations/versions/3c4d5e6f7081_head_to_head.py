@@ -0,0 +1,55 @@
+"""Add head-to-head tables
+
+Revision ID: 3c4d5e6f7081
+Revises: 2b3c4d5e6f70
+Create Date: 2016-03-15 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c4d5e6f7081'
+down_revision = '2b3c4d5e6f70'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# Head-to-head table, team table and a match table that identifies the database type.
+TABLES = [
+    ('club_head_to_head', 'clubs', 'club_friendly_matches'),
+    ('natl_head_to_head', 'countries', 'natl_friendly_matches')
+]
+
+
+def upgrade():
+    tables = set(Inspector.from_engine(op.get_bind()).get_table_names())
+    for name, teams, matches in TABLES:
+        if matches not in tables or name in tables:
+            continue
+        op.create_table(
+            name,
+            sa.Column('team_id', sa.Integer, sa.ForeignKey('{0}.id'.format(teams)), primary_key=True),
+            sa.Column('opponent_id', sa.Integer, sa.ForeignKey('{0}.id'.format(teams)), primary_key=True),
+            sa.Column('played', sa.Integer),
+            sa.Column('team_wins', sa.Integer),
+            sa.Column('opponent_wins', sa.Integer),
+            sa.Column('draws', sa.Integer),
+            sa.Column('team_goals', sa.Integer),
+            sa.Column('opponent_goals', sa.Integer),
+            sa.Column('shootouts', sa.Integer),
+            sa.Column('team_shootout_wins', sa.Integer),
+            sa.Column('opponent_shootout_wins', sa.Integer),
+            sa.Column('last_date', sa.Date)
+        )
+        op.create_index('ix_{0}_opponent_id'.format(name), name, ['opponent_id'])
+
+
+def downgrade():
+    tables = set(Inspector.from_engine(op.get_bind()).get_table_names())
+    for name, teams, matches in TABLES:
+        if name in tables:
+            op.drop_index('ix_{0}_opponent_id'.format(name), name)
+            op.drop_table(name)
@@ -0,0 +1,51 @@
+"""Add match facts table
+
+Revision ID: 4d5e6f708192
+Revises: 3c4d5e6f7081
+Create Date: 2016-03-22 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4d5e6f708192'
+down_revision = '3c4d5e6f7081'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'match_facts',
+        sa.Column('match_id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('date', sa.Date),
+        sa.Column('phase', sa.String(20)),
+        sa.Column('competition_id', sa.Integer),
+        sa.Column('competition_name', sa.Unicode(80)),
+        sa.Column('competition_level', sa.Integer),
+        sa.Column('season_id', sa.Integer),
+        sa.Column('season_label', sa.String(9)),
+        sa.Column('home_team_id', sa.Integer),
+        sa.Column('home_team_name', sa.Unicode(60)),
+        sa.Column('away_team_id', sa.Integer),
+        sa.Column('away_team_name', sa.Unicode(60)),
+        sa.Column('home_goals', sa.Integer),
+        sa.Column('away_goals', sa.Integer),
+        sa.Column('matchday', sa.Integer),
+        sa.Column('group', sa.String(2)),
+        sa.Column('group_round', sa.Unicode(40)),
+        sa.Column('ko_round', sa.Unicode(40)),
+        sa.Column('extra_time', sa.Boolean),
+        sa.Column('home_shootout_goals', sa.Integer),
+        sa.Column('away_shootout_goals', sa.Integer)
+    )
+    op.create_index('ix_match_facts_competition_season', 'match_facts', ['competition_id', 'season_id'])
+    op.create_index('ix_match_facts_date', 'match_facts', ['date'])
+
+
+def downgrade():
+    op.drop_index('ix_match_facts_date', 'match_facts')
+    op.drop_index('ix_match_facts_competition_season', 'match_facts')
+    op.drop_table('match_facts')
@@ -0,0 +1,41 @@
+"""Add match ratings table
+
+Revision ID: 5e6f708192a3
+Revises: 4d5e6f708192
+Create Date: 2016-04-05 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e6f708192a3'
+down_revision = '4d5e6f708192'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'match_ratings',
+        sa.Column('match_id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('sequence', sa.Integer, nullable=False),
+        sa.Column('date', sa.Date),
+        sa.Column('home_team_id', sa.Integer),
+        sa.Column('away_team_id', sa.Integer),
+        sa.Column('home_rating_pre', sa.Float),
+        sa.Column('away_rating_pre', sa.Float),
+        sa.Column('home_rating_post', sa.Float),
+        sa.Column('away_rating_post', sa.Float)
+    )
+    op.create_index('ix_match_ratings_sequence', 'match_ratings', ['sequence'], unique=True)
+    op.create_index('ix_match_ratings_home_team', 'match_ratings', ['home_team_id'])
+    op.create_index('ix_match_ratings_away_team', 'match_ratings', ['away_team_id'])
+
+
+def downgrade():
+    op.drop_index('ix_match_ratings_away_team', 'match_ratings')
+    op.drop_index('ix_match_ratings_home_team', 'match_ratings')
+    op.drop_index('ix_match_ratings_sequence', 'match_ratings')
+    op.drop_table('match_ratings')
@@ -0,0 +1,146 @@
+"""Add natural key and content digests to matches table
+
+Revision ID: 6f708192a3b4
+Revises: 5e6f708192a3
+Create Date: 2016-04-12 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6f708192a3b4'
+down_revision = '5e6f708192a3'
+branch_labels = None
+depends_on = None
+
+import hashlib
+from datetime import date
+from collections import OrderedDict
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# Match tables as they stand at this revision.  The digests are computed as by light.bulk at
+# this revision, so that later changes to the models or the loaders do not change this migration.
+matches = sa.table(
+    'matches',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('home_goals', sa.Integer),
+    sa.column('away_goals', sa.Integer),
+    sa.column('phase', sa.String),
+    sa.column('competition_id', sa.Integer),
+    sa.column('season_id', sa.Integer),
+    sa.column('match_key', sa.String),
+    sa.column('content_hash', sa.String)
+)
+
+match_shootouts = sa.table(
+    'match_shootouts',
+    sa.column('id', sa.Integer),
+    sa.column('home_shootout_goals', sa.Integer),
+    sa.column('away_shootout_goals', sa.Integer)
+)
+
+PHASE_TABLES = {
+    'friendly': sa.table('friendly_matches', sa.column('id', sa.Integer)),
+    'league': sa.table('league_matches', sa.column('id', sa.Integer), sa.column('matchday', sa.Integer)),
+    'group': sa.table('group_matches', sa.column('id', sa.Integer), sa.column('matchday', sa.Integer),
+                      sa.column('group', sa.String), sa.column('group_round_id', sa.Integer)),
+    'knockout': sa.table('knockout_matches', sa.column('id', sa.Integer), sa.column('matchday', sa.Integer),
+                         sa.column('extra_time', sa.Boolean), sa.column('ko_round_id', sa.Integer))
+}
+
+# Schema name, match table that identifies the database type, and phases of the schema.
+SCHEMAS = [
+    ('club', 'club_friendly_matches', ('friendly', 'group', 'knockout', 'league')),
+    ('natl', 'natl_friendly_matches', ('friendly', 'group', 'knockout'))
+]
+
+NATURAL_KEY = ('competition_id', 'season_id', 'date', 'home_team_id', 'away_team_id')
+
+DIGEST_COLUMNS = ('match_key', 'content_hash')
+
+DEFAULTS = {'home_goals': 0, 'away_goals': 0, 'extra_time': False}
+
+
+def _digest(values):
+    text = u'\x1f'.join(u'' if v is None else v.isoformat() if isinstance(v, date) else u'{0}'.format(v)
+                        for v in values)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _team_table(schema, phase):
+    return sa.table('{0}_{1}_matches'.format(schema, phase), sa.column('id', sa.Integer),
+                    sa.column('home_team_id', sa.Integer), sa.column('away_team_id', sa.Integer))
+
+
+def _content_hash(values, tables):
+    """Digest the columns of the match tables with defaults applied, then the shootout goals."""
+    digest = []
+    for table in tables:
+        for column in table.columns:
+            if column.name == 'id' or column.name in DIGEST_COLUMNS:
+                continue
+            value = values.get(column.name) if column.name != 'phase' else None
+            digest.append(DEFAULTS.get(column.name) if value is None else value)
+    for name in ('away_shootout_goals', 'home_shootout_goals'):
+        if name in values:
+            digest.extend([name, values[name]])
+    return _digest(digest)
+
+
+def _key_matches(connection, schema, phase):
+    """Key the matches of a phase without digests, the lowest ID of a natural key first."""
+    tables = [matches, PHASE_TABLES[phase], _team_table(schema, phase)]
+    source = matches.join(tables[1], tables[1].c.id == matches.c.id)\
+        .join(tables[2], tables[2].c.id == matches.c.id)\
+        .outerjoin(match_shootouts, match_shootouts.c.id == matches.c.id)
+    columns = [c for table in tables for c in table.columns
+               if c.name != 'id' and c.name != 'phase' and c.name not in DIGEST_COLUMNS]
+    criterion = sa.and_(matches.c.phase == phase, matches.c.match_key.is_(None))
+    query = sa.select([matches.c.id, match_shootouts.c.home_shootout_goals, match_shootouts.c.away_shootout_goals]
+                      + columns).select_from(source).where(criterion).order_by(matches.c.id).apply_labels()
+    stmt = matches.update().where(matches.c.id == sa.bindparam('_id')).values(
+        match_key=sa.bindparam('_match_key'), content_hash=sa.bindparam('_content_hash'))
+
+    partitions = connection.execute(
+        sa.select([matches.c.competition_id, matches.c.season_id]).where(criterion).distinct()).fetchall()
+    for competition_id, season_id in partitions:
+        keyed = OrderedDict()
+        for row in connection.execute(query.where(sa.and_(matches.c.competition_id == competition_id,
+                                                          matches.c.season_id == season_id))):
+            values = dict((c.name, row[c]) for c in columns if row[c] is not None)
+            if row[match_shootouts.c.home_shootout_goals] is not None:
+                values['home_shootout_goals'] = row[match_shootouts.c.home_shootout_goals]
+                values['away_shootout_goals'] = row[match_shootouts.c.away_shootout_goals]
+            key = _digest([values.get(name) for name in NATURAL_KEY] + [phase])
+            if key not in keyed:
+                keyed[key] = {'_id': row[matches.c.id], '_match_key': key,
+                              '_content_hash': _content_hash(values, tables)}
+        if keyed:
+            for taken, in connection.execute(sa.select([matches.c.match_key])
+                                             .where(matches.c.match_key.in_(list(keyed)))):
+                keyed.pop(taken, None)
+        if keyed:
+            connection.execute(stmt, list(keyed.values()))
+
+
+def upgrade():
+    op.add_column('matches', sa.Column('match_key', sa.String(40)))
+    op.add_column('matches', sa.Column('content_hash', sa.String(40)))
+    bind = op.get_bind()
+    tables = set(Inspector.from_engine(bind).get_table_names())
+    for schema, identifier, phases in SCHEMAS:
+        if identifier in tables:
+            for phase in phases:
+                _key_matches(bind, schema, phase)
+    op.create_index('ix_matches_match_key', 'matches', ['match_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_matches_match_key', 'matches')
+    with op.batch_alter_table('matches') as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('match_key')
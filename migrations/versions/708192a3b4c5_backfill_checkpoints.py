@@ -0,0 +1,32 @@
+"""Add backfill checkpoints table
+
+Revision ID: 708192a3b4c5
+Revises: 6f708192a3b4
+Create Date: 2016-04-19 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '708192a3b4c5'
+down_revision = '6f708192a3b4'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'backfill_checkpoints',
+        sa.Column('job', sa.String(40), primary_key=True),
+        sa.Column('competition_id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('season_id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('rows', sa.Integer),
+        sa.Column('elapsed', sa.Float),
+        sa.Column('completed', sa.DateTime)
+    )
+
+
+def downgrade():
+    op.drop_table('backfill_checkpoints')
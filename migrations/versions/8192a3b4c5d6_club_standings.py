@@ -0,0 +1,55 @@
+"""Add club standings and matchday standings tables
+
+Revision ID: 8192a3b4c5d6
+Revises: 708192a3b4c5
+Create Date: 2016-04-26 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8192a3b4c5d6'
+down_revision = '708192a3b4c5'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# Standings tables exist in club databases only, which are identified by this match table.
+CLUB_MATCHES = 'club_league_matches'
+
+STAT_COLUMNS = ('played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against', 'deducted', 'points')
+
+
+def _columns(*extra):
+    return [
+        sa.Column('competition_id', sa.Integer, sa.ForeignKey('competitions.id'), nullable=False),
+        sa.Column('season_id', sa.Integer, sa.ForeignKey('seasons.id'), nullable=False),
+        sa.Column('team_id', sa.Integer, sa.ForeignKey('clubs.id'), nullable=False)
+    ] + list(extra) + [sa.Column(name, sa.Integer) for name in STAT_COLUMNS]
+
+
+def upgrade():
+    tables = set(Inspector.from_engine(op.get_bind()).get_table_names())
+    if CLUB_MATCHES not in tables:
+        return
+    if 'club_standings' not in tables:
+        op.create_table(
+            'club_standings',
+            *_columns() + [sa.PrimaryKeyConstraint('competition_id', 'season_id', 'team_id')]
+        )
+    if 'club_matchday_standings' not in tables:
+        op.create_table(
+            'club_matchday_standings',
+            *_columns(sa.Column('matchday', sa.Integer, nullable=False)) +
+            [sa.PrimaryKeyConstraint('competition_id', 'season_id', 'matchday', 'team_id')]
+        )
+
+
+def downgrade():
+    tables = set(Inspector.from_engine(op.get_bind()).get_table_names())
+    for name in ('club_matchday_standings', 'club_standings'):
+        if name in tables:
+            op.drop_table(name)
@@ -0,0 +1,81 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+
+import light.club as lc
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+
+np = pytest.importorskip('numpy')
+
+from light.arrays import MatchArray, PHASES
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+@pytest.fixture
+def history(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competitions = [lcm.DomesticCompetitions(name=name, level=level, country=england)
+                    for name, level in ((u"Premier League", 1), (u"FA Cup", 1))]
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    teams = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(4)]
+    session.add_all(competitions + [season] + teams)
+    session.flush()
+    keys = dict(season_id=season.id)
+    league = [dict(date=date(2014, 8, 16 + k), matchday=k + 1, home_goals=k % 3, away_goals=1,
+                   competition_id=competitions[0].id, home_team_id=teams[k % 4].id,
+                   away_team_id=teams[(k + 1) % 4].id, **keys) for k in range(8)]
+    cup = [dict(date=date(2015, 1, 4), matchday=1, home_goals=0, away_goals=2, competition_id=competitions[1].id,
+                home_team_id=teams[0].id, away_team_id=teams[2].id, **keys)]
+    connection = session.connection()
+    bulk_load_matches(connection, league, lc.ClubLeagueMatches)
+    bulk_load_matches(connection, cup, lc.ClubKnockoutMatches)
+    return {'competitions': competitions, 'teams': teams, 'league': league, 'cup': cup}
+
+
+@club_only
+def test_match_array_load(session, history):
+    """Match Array 001: Load match results into NumPy arrays."""
+    matches = MatchArray.load(session.connection(), 'club', batch_size=4)
+    assert len(matches) == 9
+    assert matches.dates.dtype == np.dtype('datetime64[D]')
+    assert matches.dates[0] == np.datetime64('2014-08-16')
+    assert list(matches.ids) == [row['id'] for row in history['league'] + history['cup']]
+    assert [PHASES[code] for code in matches.phases[-2:]] == ['league', 'knockout']
+    assert list(matches.results()[:3]) == [-1, 0, 1]
+
+
+@club_only
+def test_match_array_filters(session, history):
+    """Match Array 002: Verify vectorized filters by team, competition, season, phase and date."""
+    matches = MatchArray.load(session.connection(), 'club')
+    team = history['teams'][0].id
+    assert len(matches.filter(team_id=team)) == 5
+    assert len(matches.filter(team_id=team, phase='knockout')) == 1
+    assert len(matches.filter(competition_id=history['competitions'][0].id, start=date(2014, 8, 20))) == 4
+    assert len(matches.filter(team_id=[team, history['teams'][1].id], end='2014-08-31')) == 6
+    assert len(matches.filter(phase=['friendly', 'group'])) == 0
+    assert matches.mask(season_id=history['league'][0]['season_id']).all()
+
+
+@club_only
+def test_match_array_save_open(session, history, tmpdir):
+    """Match Array 003: Save match arrays to npz and memory-mapped files and load them again."""
+    matches = MatchArray.load(session.connection(), 'club')
+    compressed = str(tmpdir.join('matches.npz'))
+    matches.save(compressed)
+    loaded = MatchArray.open(compressed)
+    assert all((loaded[name] == matches[name]).all() for name in matches.columns)
+
+    directory = str(tmpdir.join('matches'))
+    matches.save(directory)
+    mapped = MatchArray.open(directory, mmap_mode='r')
+    assert isinstance(mapped.home_goals, np.memmap)
+    assert (mapped.filter(team_id=history['teams'][2].id).ids ==
+            matches.filter(team_id=history['teams'][2].id).ids).all()
@@ -0,0 +1,96 @@
+# coding=utf-8
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+import light.club as lc
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.config import Config
+from async_interface import AsyncMarcotti
+
+
+class SQLiteFileConfig(Config):
+    DIALECT = 'sqlite'
+
+    def __init__(self, path):
+        self.DBNAME = '/' + path
+        super(SQLiteFileConfig, self).__init__()
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@pytest.fixture
+def async_marcotti(request, tmpdir):
+    marcotti = AsyncMarcotti(SQLiteFileConfig(str(tmpdir.join('marcotti.db'))))
+    run(marcotti.create_db(BaseSchema))
+
+    def fin():
+        run(marcotti.dispose())
+    request.addfinalizer(fin)
+    return marcotti
+
+
+def test_async_session_commit_rollback(async_marcotti):
+    """Async 001: Verify that async sessions commit on success and roll back on error."""
+    async def scenario():
+        async with async_marcotti.create_session() as session:
+            session.add(lcm.Years(yr=2015))
+        with pytest.raises(ValueError):
+            async with async_marcotti.create_session() as session:
+                session.add(lcm.Years(yr=2016))
+                await session.flush()
+                raise ValueError()
+        async with async_marcotti.create_session() as session:
+            return await session.all(session.sync_session.query(lcm.Years.yr))
+
+    assert [x[0] for x in run(scenario())] == [2015]
+
+
+def test_async_concurrent_sessions(async_marcotti):
+    """Async 002: Verify that concurrent async sessions run on separate connections."""
+    async def worker(yr):
+        async with async_marcotti.create_session() as session:
+            session.add(lcm.Years(yr=yr))
+            await session.flush()
+            return await session.run_sync(lambda s: s.connection().connection.connection)
+
+    async def scenario():
+        return await asyncio.gather(worker(2001), worker(2002), worker(2003))
+
+    connections = run(scenario())
+    assert len(set(id(connection) for connection in connections)) == 3
+
+    async def years():
+        async with async_marcotti.create_session() as session:
+            return await session.execute(lcm.Years.__table__.select().order_by(lcm.Years.yr))
+    assert [row.yr for row in run(years())] == [2001, 2002, 2003]
+
+
+def test_async_stream_matches(async_marcotti):
+    """Async 003: Stream a large match query in chunks."""
+    async def scenario():
+        async with async_marcotti.create_session() as session:
+            england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+            competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+            season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+            home, away = lc.Clubs(name=u"Arsenal FC", country=england), lc.Clubs(name=u"Chelsea FC", country=england)
+            session.add_all([competition, season, home, away])
+            await session.flush()
+            keys = dict(competition_id=competition.id, season_id=season.id,
+                        home_team_id=home.id, away_team_id=away.id)
+
+        rows = [dict(date=date(2014, 8, 16) + timedelta(days=k), matchday=k % 38 + 1, **keys) for k in range(250)]
+        stats = await async_marcotti.bulk_load_matches(rows, lc.ClubLeagueMatches, block_size=100)
+
+        async with async_marcotti.create_session() as session:
+            query = session.sync_session.query(lc.ClubLeagueMatches.id).order_by(lc.ClubLeagueMatches.id)
+            streamed = [row.id async for row in session.stream(query, chunk_size=40)]
+        return stats, rows, streamed
+
+    stats, rows, streamed = run(scenario())
+    assert stats.rows == 250
+    assert streamed == [row['id'] for row in rows]
@@ -0,0 +1,117 @@
+# coding=utf-8
+import pytest
+from sqlalchemy import select, func
+
+import light.common.models as lcm
+from light.config import Config
+from light.backfill import backfill, match_partitions
+from benchmarks.synthetic import DatasetSpec, generate
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+class SQLiteFileConfig(Config):
+    DIALECT = 'sqlite'
+
+    def __init__(self, path):
+        self.DBNAME = '/' + path
+        super(SQLiteFileConfig, self).__init__()
+
+
+class MemoryConfig(Config):
+    DIALECT = 'sqlite'
+    DBNAME = ''
+
+
+FAILING_SEASONS = []
+
+
+def failing_task(connection, schema, competition_id, season_id):
+    from light.backfill import standings_task
+    if season_id in FAILING_SEASONS:
+        raise RuntimeError("Feed unavailable")
+    return standings_task(connection, schema, competition_id, season_id)
+
+
+@pytest.fixture
+def dataset_config(request, tmpdir):
+    from sqlalchemy.engine import create_engine
+    from light.club import ClubSchema
+    config = SQLiteFileConfig(str(tmpdir.join('backfill.db')))
+    engine = create_engine(config.DATABASE_URI)
+    ClubSchema.metadata.create_all(engine)
+    with engine.begin() as connection:
+        config.dataset = generate(connection, DatasetSpec(confederations=1, countries=2, clubs=6, seasons=2,
+                                                          friendly=2, league=30, group=0, knockout=4))
+
+    def fin():
+        engine.dispose()
+    request.addfinalizer(fin)
+    config.engine = engine
+    return config
+
+
+def standings(engine):
+    from light.club import ClubStandings
+    table = ClubStandings.__table__
+    return engine.execute(select([table]).order_by(table.c.competition_id, table.c.season_id,
+                                                   table.c.team_id)).fetchall()
+
+
+@club_only
+def test_backfill_standings(dataset_config):
+    """Backfill 001: Rebuild standings of every competition and season on worker processes and verify checkpoints."""
+    from light.standings import refresh_standings
+    engine = dataset_config.engine
+    with engine.connect() as connection:
+        partitions = match_partitions(connection)
+    assert len(partitions) == 4
+
+    report = backfill(dataset_config, 'standings', 'standings', workers=2)
+    assert (len(report.completed), len(report.failed), report.skipped) == (4, 0, 0)
+    assert report.rows == 4 * 6
+    assert all(result.elapsed > 0 for result in report.results)
+    backfilled = standings(engine)
+
+    with engine.begin() as connection:
+        refresh_standings(connection)
+    assert backfilled == standings(engine)
+    checkpoints = lcm.BackfillCheckpoints.__table__
+    assert engine.scalar(select([func.count()]).where(checkpoints.c.job == 'standings')) == 4
+
+
+@club_only
+def test_backfill_resume(dataset_config):
+    """Backfill 002: Verify that a job with failed partitions resumes with those partitions only."""
+    FAILING_SEASONS[:] = [dataset_config.dataset.season_ids[1]]
+    report = backfill(dataset_config, 'resume', failing_task, workers=1)
+    assert (len(report.completed), len(report.failed), report.skipped) == (2, 2, 0)
+    assert "Feed unavailable" in report.failed[0].error
+
+    del FAILING_SEASONS[:]
+    report = backfill(dataset_config, 'resume', failing_task, workers=1)
+    assert (len(report.completed), len(report.failed), report.skipped) == (2, 0, 2)
+    assert set(r.season_id for r in report.completed) == {dataset_config.dataset.season_ids[1]}
+
+    report = backfill(dataset_config, 'resume', failing_task, workers=1, restart=True)
+    assert (len(report.completed), report.skipped) == (4, 0)
+
+
+def test_backfill_errors():
+    """Backfill 003: Verify errors for unknown tasks and in-memory databases."""
+    with pytest.raises(ValueError):
+        backfill(MemoryConfig(), 'facts', 'match_facts', workers=1)
+    with pytest.raises(ValueError):
+        backfill(MemoryConfig(), 'summaries', 'summaries', workers=1)
+
+
+def test_standings_tasks_natl():
+    """Backfill 004: Verify that standings tasks refuse national team databases."""
+    from light.backfill import standings_task, matchday_standings_task
+    for task in (standings_task, matchday_standings_task):
+        with pytest.raises(ValueError):
+            task(None, 'natl', 1, 1)
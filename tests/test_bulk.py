@@ -0,0 +1,154 @@
+# coding=utf-8
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, select, func
+
+import light.club as lc
+import light.common.models as lcm
+from light.bulk import bulk_insert, bulk_load_matches, upsert_matches, rebuild_match_keys, inheritance_tables
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+@pytest.fixture
+def league_setup(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    setup = {
+        'competition': lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england),
+        'season': lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015)),
+        'home_team': lc.Clubs(name=u"Arsenal FC", country=england),
+        'away_team': lc.Clubs(name=u"Chelsea FC", country=england)
+    }
+    session.add_all(setup.values())
+    session.flush()
+    return setup
+
+
+def league_rows(setup, count):
+    for k in range(count):
+        yield {
+            'date': date(2014, 8, 16) + timedelta(days=k),
+            'competition_id': setup['competition'].id,
+            'season_id': setup['season'].id,
+            'home_team_id': setup['home_team'].id,
+            'away_team_id': setup['away_team'].id,
+            'home_goals': k % 3,
+            'matchday': k + 1
+        }
+
+
+@club_only
+def test_inheritance_tables_order():
+    """Bulk Load 001: Verify that inheritance tables are ordered from root to leaf."""
+    tables = [t.name for t in inheritance_tables(lc.ClubLeagueMatches)]
+    assert tables == ['matches', 'league_matches', 'club_league_matches']
+
+
+@club_only
+def test_bulk_load_league_matches(session, league_setup):
+    """Bulk Load 002: Bulk insert league matches in several blocks and verify data through the ORM."""
+    stats = bulk_load_matches(session.connection(), league_rows(league_setup, 25), lc.ClubLeagueMatches,
+                              block_size=10)
+    assert stats.rows == 25
+
+    matches = session.query(lc.ClubLeagueMatches).order_by(lc.ClubLeagueMatches.matchday).all()
+    assert len(matches) == 25
+    assert len(set(m.id for m in matches)) == 25
+    assert matches[0].phase == "league"
+    assert matches[0].away_goals == 0
+    assert matches[4].home_goals == 1
+    assert matches[24].matchday == 25
+    assert matches[24].home_team.name == u"Arsenal FC"
+    assert matches[24].season.name == "2014-2015"
+
+
+@club_only
+def test_bulk_load_assigns_ids(session, league_setup):
+    """Bulk Load 003: Verify that allocated primary keys are written back to the input rows."""
+    rows = list(league_rows(league_setup, 3))
+    bulk_load_matches(session.connection(), rows, lc.ClubLeagueMatches)
+
+    ids = sorted(x[0] for x in session.query(lcm.Matches.id).all())
+    assert sorted(row['id'] for row in rows) == ids
+
+
+@club_only
+def test_upsert_league_matches(session, league_setup):
+    """Bulk Load 004: Upsert league matches, then re-deliver them with one correction and verify writes."""
+    connection = session.connection()
+    stats = upsert_matches(connection, league_rows(league_setup, 10), lc.ClubLeagueMatches, block_size=4)
+    assert (stats.inserted, stats.updated, stats.unchanged) == (10, 0, 0)
+    ids = dict(session.query(lc.ClubLeagueMatches.matchday, lc.ClubLeagueMatches.id))
+
+    rows = list(league_rows(league_setup, 10))
+    rows[6]['home_goals'] = 5
+    rows[6]['matchday'] = 70
+    stats = upsert_matches(connection, rows, lc.ClubLeagueMatches, block_size=4)
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 1, 9)
+    assert stats.rows == 1
+
+    session.expire_all()
+    assert session.query(lcm.Matches).count() == 10
+    corrected = session.query(lc.ClubLeagueMatches).get(ids[7])
+    assert (corrected.home_goals, corrected.matchday) == (5, 70)
+    assert sorted(row['id'] for row in rows) == sorted(ids.values())
+
+
+@club_only
+def test_upsert_unchanged_statements(session, league_setup):
+    """Bulk Load 005: Verify that re-delivering unchanged matches writes nothing."""
+    connection = session.connection()
+    upsert_matches(connection, league_rows(league_setup, 10), lc.ClubLeagueMatches)
+
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(connection, 'before_cursor_execute', count)
+    try:
+        stats = upsert_matches(connection, league_rows(league_setup, 10), lc.ClubLeagueMatches, block_size=5)
+    finally:
+        event.remove(connection, 'before_cursor_execute', count)
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 0, 10)
+    assert len(executed) == 2
+    assert all(statement.startswith('SELECT') for statement in executed)
+
+
+@club_only
+def test_match_keys_all_loaders(session, league_setup):
+    """Bulk Load 006: Verify that bulk-loaded and rebuilt match keys let upserts find previously loaded matches."""
+    connection = session.connection()
+    bulk_load_matches(connection, league_rows(league_setup, 4), lc.ClubLeagueMatches)
+    orm_rows = list(league_rows(league_setup, 6))[4:]
+    session.add_all([lc.ClubLeagueMatches(**row) for row in orm_rows])
+    session.add(lc.ClubLeagueMatches(**orm_rows[1]))
+    session.flush()
+    matches = lcm.Matches.__table__
+    assert connection.scalar(select([func.count()]).where(matches.c.match_key.is_(None))) == 3
+
+    assert rebuild_match_keys(connection, 'club') == 2
+    assert connection.scalar(select([func.count()]).where(matches.c.match_key.is_(None))) == 1
+    assert rebuild_match_keys(connection, 'club') == 0
+
+    stats = upsert_matches(connection, league_rows(league_setup, 6), lc.ClubLeagueMatches)
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 0, 6)
+    assert session.query(lcm.Matches).count() == 7
+
+
+@club_only
+def test_bulk_insert_deductions(session, league_setup):
+    """Bulk Load 007: Bulk insert point deductions and verify them through the ORM."""
+    rows = [dict(competition_id=league_setup['competition'].id, season_id=league_setup['season'].id,
+                 team_id=league_setup['home_team'].id, points=k + 1) for k in range(3)]
+    stats = bulk_insert(session.connection(), rows, lc.ClubDeductions, block_size=2)
+    assert stats.rows == 3
+
+    deductions = session.query(lc.ClubDeductions).order_by(lc.ClubDeductions.points).all()
+    assert [d.id for d in deductions] == [row['id'] for row in rows]
+    assert deductions[2].points == 3 and deductions[2].team.name == u"Arsenal FC"
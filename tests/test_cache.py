@@ -0,0 +1,368 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import lazyload
+from sqlalchemy.orm.session import Session
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.cache import ReferenceCache, ResultCache, MemoryBackend, SQLiteBackend
+from light.queries import fixtures_select, head_to_head_select
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def statements(request, db_connection):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db_connection, 'before_cursor_execute', count)
+
+    def fin():
+        event.remove(db_connection, 'before_cursor_execute', count)
+    request.addfinalizer(fin)
+    return executed
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(request, clock):
+    reference_cache = ReferenceCache(maxsize=4, ttl=60, clock=clock)
+    reference_cache.listen()
+    request.addfinalizer(reference_cache.remove)
+    return reference_cache
+
+
+@pytest.fixture
+def other_session(request, db_connection):
+    session = Session(db_connection)
+    request.addfinalizer(session.close)
+    return session
+
+
+@pytest.fixture
+def scratch_session(request, db_connection):
+    """Session on a separate connection, for tests that roll back the session itself."""
+    engine = create_engine(db_connection.engine.url)
+    if engine.dialect.name == 'sqlite':
+        # Emit BEGIN ourselves, as pysqlite commits before a SAVEPOINT on Python 2.
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, 'begin')
+        def begin(connection):
+            connection.execute("BEGIN")
+    connection = engine.connect()
+    if engine.url.database in (None, '', ':memory:'):
+        BaseSchema.metadata.create_all(connection)
+    transaction = connection.begin()
+    session = Session(connection)
+
+    def fin():
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+    request.addfinalizer(fin)
+    return session
+
+
+def add_reference_data(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    session.add_all([competition, season])
+    session.flush()
+    return england, competition, season
+
+
+def test_cache_primary_key(session, other_session, cache, statements):
+    """Cache 001: Verify that reference records are loaded once by primary key and attached to other sessions."""
+    england, competition, season = add_reference_data(session)
+    session.commit()
+
+    assert cache.get(session, lcm.Countries, england.id) is england
+    assert cache.misses == 1
+
+    competition_id = competition.id
+    del statements[:]
+    country = cache.get(other_session, lcm.Countries, england.id)
+    result = cache.get(other_session, lcm.Competitions, competition_id)
+    assert len(statements) == 1
+    del statements[:]
+    assert cache.get(other_session, lcm.DomesticCompetitions, competition_id) is result
+    assert country is not england and country in other_session
+    assert repr(country) == "<Country(id={0}, name=England, confed=UEFA)>".format(england.id)
+    assert isinstance(result, lcm.DomesticCompetitions) and result.country is country
+    assert len(statements) == 0
+    assert cache.get(other_session, lcm.Countries, -1) is None
+
+
+def test_cache_natural_key(session, other_session, cache, statements):
+    """Cache 002: Verify lookups of reference records by natural key."""
+    england, competition, season = add_reference_data(session)
+    session.add(lcm.Competitions(name=u"FA Cup", level=1))
+    session.add(lcm.Competitions(name=u"FA Cup", level=2))
+    session.commit()
+
+    assert cache.get_by(session, lcm.Seasons, u"2014-2015") is season
+    del statements[:]
+    result = cache.get_by(other_session, lcm.Seasons, u"2014-2015")
+    assert result.id == season.id and result.start_year.yr == 2014
+    assert cache.get_by(other_session, lcm.Years, 2015).id == season.end_year_id
+    assert len(statements) == 0
+
+    assert cache.get_by(other_session, lcm.Seasons, u"1999-2000") is None
+    with pytest.raises(LookupError):
+        cache.get_by(other_session, lcm.Competitions, u"FA Cup")
+
+
+def test_cache_invalidation(session, other_session, cache):
+    """Cache 003: Verify that committed inserts and updates of reference records invalidate cached records."""
+    england, competition, season = add_reference_data(session)
+    session.commit()
+    cache.warm(session, lcm.Competitions)
+    assert cache.get_by(other_session, lcm.Competitions, u"Premier League").level == 1
+
+    competition.name = u"English Premier League"
+    session.flush()
+    assert cache.get_by(session, lcm.Competitions, u"English Premier League") is competition
+    assert cache.get_by(other_session, lcm.Competitions, u"Premier League").level == 1
+    session.commit()
+    assert cache.get_by(other_session, lcm.Competitions, u"Premier League") is None
+    assert cache.get_by(session, lcm.Competitions, u"English Premier League") is competition
+
+    session.add(lcm.Competitions(name=u"English Premier League", level=2))
+    session.flush()
+    with pytest.raises(LookupError):
+        cache.get_by(session, lcm.Competitions, u"English Premier League")
+    session.commit()
+    with pytest.raises(LookupError):
+        cache.get_by(other_session, lcm.Competitions, u"English Premier League")
+
+
+def test_cache_rollback(scratch_session, cache):
+    """Cache 006: Verify that records read between a flush and a rollback are not cached."""
+    session = scratch_session
+    england, competition, season = add_reference_data(session)
+    session.commit()
+
+    session.begin_nested()
+    session.add(lcm.Countries(name=u"Wales", confederation=england.confederation))
+    session.flush()
+    assert cache.get_by(session, lcm.Countries, u"Wales") is not None
+    session.rollback()
+    assert cache.get_by(session, lcm.Countries, u"Wales") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_cache_expiry_eviction(session, other_session, cache, clock, statements):
+    """Cache 004: Verify that cached records expire after their time-to-live and are evicted when the cache is full."""
+    years = [lcm.Years(yr=yr) for yr in range(2010, 2016)]
+    session.add_all(years)
+    session.commit()
+
+    for year in years[:4]:
+        cache.get(session, lcm.Years, year.id)
+    assert len(cache) == 4
+    cache.get(session, lcm.Years, years[0].id)
+    cache.get(session, lcm.Years, years[4].id)
+    assert len(cache) == 4
+
+    del statements[:]
+    cache.get(other_session, lcm.Years, years[0].id)
+    assert len(statements) == 0
+    cache.get(other_session, lcm.Years, years[1].id)
+    assert len(statements) == 1
+
+    clock.now = 61
+    del statements[:]
+    cache.get(other_session, lcm.Years, years[0].id)
+    assert len(statements) == 1
+
+
+def test_cache_attach_matches(session, other_session, statements):
+    """Cache 005: Verify that match listings resolve competitions and seasons from attached cached records."""
+    england, competition, season = add_reference_data(session)
+    for k in range(10):
+        session.add(lcm.Matches(date=date(2014, 8, 16), competition=competition, season=season))
+    session.flush()
+
+    cache = ReferenceCache()
+    cache.warm(session)
+    del statements[:]
+    cache.attach(other_session)
+    assert len(statements) == 0
+
+    matches = other_session.query(lcm.Matches).options(
+        lazyload(lcm.Matches.competition), lazyload(lcm.Matches.season)).all()
+    assert all(match.competition.name == u"Premier League" and match.season.name == u"2014-2015"
+               for match in matches)
+    assert len(statements) == 1
+
+
+@pytest.fixture
+def result_cache(request):
+    cache = ResultCache(MemoryBackend(maxsize=2))
+    cache.listen()
+    request.addfinalizer(cache.remove)
+    return cache
+
+
+def add_club_matches(session):
+    england, competition, season = add_reference_data(session)
+    arsenal, chelsea, everton = [lc.Clubs(name=name, country=england)
+                                 for name in (u"Arsenal FC", u"Chelsea FC", u"Everton FC")]
+    session.add_all([
+        lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                             home_team=arsenal, away_team=chelsea, competition=competition, season=season),
+        lc.ClubLeagueMatches(date=date(2014, 8, 23), matchday=2, home_goals=1, away_goals=1,
+                             home_team=everton, away_team=arsenal, competition=competition, season=season),
+        lc.ClubKnockoutMatches(date=date(2015, 1, 4), matchday=1, home_goals=0, away_goals=0,
+                               home_team=chelsea, away_team=arsenal, competition=competition, season=season)
+    ])
+    session.flush()
+    return competition, season, arsenal, chelsea
+
+
+@club_only
+def test_result_cache_hits(session, result_cache, statements):
+    """Result Cache 001: Verify that repeated fixture queries are served from the cache."""
+    competition, season, arsenal, chelsea = add_club_matches(session)
+    session.commit()
+    query = fixtures_select('club', competition.id, season.id)
+
+    del statements[:]
+    fixtures = result_cache.execute(session, query)
+    assert result_cache.execute(session, fixtures_select('club', competition.id, season.id)) == fixtures
+    assert len(statements) == 1
+    assert [row['phase'] for row in fixtures] == ['league', 'league', 'knockout']
+    assert fixtures[0]['home_team_id'] == arsenal.id and fixtures[0]['home_goals'] == 2
+
+    meetings = result_cache.execute(session, head_to_head_select('club', chelsea.id, arsenal.id))
+    assert [(row['home_team_id'], row['away_team_id']) for row in meetings] == [
+        (arsenal.id, chelsea.id), (chelsea.id, arsenal.id)]
+    assert result_cache.execute(session, head_to_head_select('club', arsenal.id, 0)) == []
+    stats = result_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+
+
+@club_only
+def test_result_cache_invalidation(session, result_cache):
+    """Result Cache 002: Verify that committed match and shootout writes invalidate cached results."""
+    competition, season, arsenal, chelsea = add_club_matches(session)
+    session.commit()
+    query = head_to_head_select('club', arsenal.id, chelsea.id)
+    assert len(result_cache.execute(session, query)) == 2
+
+    match = session.query(lc.ClubKnockoutMatches).one()
+    session.add(lc.ClubShootoutMatches(id=match.id, home_shootout_goals=4, away_shootout_goals=3,
+                                       home_team_id=chelsea.id, away_team_id=arsenal.id))
+    match.home_goals = 1
+    match.away_goals = 1
+    session.flush()
+    assert result_cache.invalidations == 1
+    assert result_cache.execute(session, query)[-1]['home_shootout_goals'] == 4
+    assert result_cache.execute(session, query)[-1]['home_goals'] == 1
+    session.commit()
+    assert result_cache.invalidations == 2
+    assert result_cache.execute(session, query)[-1]['home_shootout_goals'] == 4
+    assert result_cache.hits == 0
+
+
+@club_only
+def test_result_cache_rollback(scratch_session, result_cache):
+    """Result Cache 004: Verify that rows read between a flush and a rollback are not cached."""
+    session = scratch_session
+    competition, season, arsenal, chelsea = add_club_matches(session)
+    session.commit()
+    query = head_to_head_select('club', arsenal.id, chelsea.id)
+    assert len(result_cache.execute(session, query)) == 2
+
+    session.begin_nested()
+    session.add(lc.ClubLeagueMatches(date=date(2015, 1, 10), matchday=21, home_goals=0, away_goals=3,
+                                     home_team=chelsea, away_team=arsenal, competition=competition, season=season))
+    session.flush()
+    assert len(result_cache.execute(session, query)) == 3
+    session.rollback()
+    assert len(result_cache.execute(session, query)) == 2
+    assert len(result_cache.execute(session, query)) == 2
+    assert (result_cache.hits, result_cache.invalidations) == (2, 1)
+
+
+@natl_only
+def test_result_cache_file_backend(session, tmpdir):
+    """Result Cache 003: Verify that results cached in a file are shared and evicted in least-recently-used order."""
+    england, competition, season = add_reference_data(session)
+    france = lcm.Countries(name=u"France", confederation=england.confederation)
+    session.add(ln.NationalFriendlyMatches(date=date(2015, 11, 17), home_goals=2, away_goals=0,
+                                           home_team=england, away_team=france,
+                                           competition=competition, season=season))
+    session.flush()
+
+    path = str(tmpdir.join('results.db'))
+    first, second = ResultCache(SQLiteBackend(path, maxsize=2)), ResultCache(SQLiteBackend(path, maxsize=2))
+    meetings = first.execute(session, head_to_head_select('natl', france.id, england.id))
+    assert second.execute(session, head_to_head_select('natl', france.id, england.id)) == meetings
+    assert meetings[0]['date'] == date(2015, 11, 17) and meetings[0]['home_shootout_goals'] is None
+    assert second.hits == 1
+
+    for competition_id in (1, 2):
+        first.execute(session, fixtures_select('natl', competition_id, season.id))
+    assert len(first.backend) == 2 and first.evictions == 1
+    second.invalidate()
+    assert len(first.backend) == 0
+    first.backend.close()
+    second.backend.close()
+
+
+@club_only
+def test_result_cache_concurrent_invalidation(session, result_cache, db_connection):
+    """Result Cache 005: Verify that rows read while the cache is invalidated are not cached."""
+    competition, season, arsenal, chelsea = add_club_matches(session)
+    session.commit()
+    query = head_to_head_select('club', arsenal.id, chelsea.id)
+
+    def invalidate(conn, cursor, statement, parameters, context, executemany):
+        result_cache.invalidate()
+
+    event.listen(db_connection, 'before_cursor_execute', invalidate)
+    try:
+        assert len(result_cache.execute(session, query)) == 2
+    finally:
+        event.remove(db_connection, 'before_cursor_execute', invalidate)
+    assert len(result_cache.backend) == 0
+    assert len(result_cache.execute(session, query)) == 2
+    assert len(result_cache.backend) == 1
+    assert result_cache.stats() == {'hits': 0, 'misses': 2, 'evictions': 0, 'invalidations': 2}
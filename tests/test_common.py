@@ -207,6 +207,36 @@ def test_season_singleyr_reference_date(session):
     assert record.reference_date == date(1994, 12, 31)
 
 
+def test_season_persisted_name(session):
+    """Season 006: Verify that season name and years are stored with the season record."""
+    yr_1994 = lcm.Years(yr=1994)
+    yr_1995 = lcm.Years(yr=1995)
+    session.add_all([yr_1994, yr_1995])
+    session.flush()
+    season_9495 = lcm.Seasons(start_year_id=yr_1994.id, end_year_id=yr_1995.id)
+    session.add(season_9495)
+    session.flush()
+
+    record = session.query(lcm.Seasons.label, lcm.Seasons.start_yr, lcm.Seasons.end_yr).one()
+    assert tuple(record) == ('1994-1995', 1994, 1995)
+    assert 'seasons.label' in str(lcm.Seasons.name == '1994-1995')
+
+
+def test_season_update_name(session):
+    """Season 007: Verify that stored season name follows a change of season years."""
+    yr_1994 = lcm.Years(yr=1994)
+    season = lcm.Seasons(start_year=yr_1994, end_year=lcm.Years(yr=1995))
+    session.add(season)
+    session.flush()
+
+    season.end_year = yr_1994
+    session.flush()
+
+    record = session.query(lcm.Seasons).filter(lcm.Seasons.name == '1994').one()
+    assert record.end_yr == 1994
+    assert record.reference_date == date(1994, 12, 31)
+
+
 def test_group_round_insert(session):
     """Group Rounds 001: Insert a single record into Group Rounds table and verify data."""
     grp_stage_name = u"Group Stage"
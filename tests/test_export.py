@@ -0,0 +1,103 @@
+# coding=utf-8
+import os
+from datetime import date
+
+import pytest
+
+import light.club as lc
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+from light.standings import refresh_standings
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from light.export import (matches_select, record_batches, write_parquet, write_ipc, read_ipc,
+                          export_matches, export_standings)
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+@pytest.fixture
+def league(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competitions = [lcm.DomesticCompetitions(name=name, level=level, country=england)
+                    for name, level in ((u"Premier League", 1), (u"Championship", 2))]
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    teams = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(4)]
+    session.add_all(competitions + [season] + teams)
+    session.flush()
+    rows = []
+    for k in range(10):
+        rows.append(dict(date=date(2014, 8, 16 + k), matchday=k + 1, home_goals=k % 3, away_goals=1,
+                         competition_id=competitions[k % 2].id, season_id=season.id,
+                         home_team_id=teams[k % 4].id, away_team_id=teams[(k + 1) % 4].id))
+    connection = session.connection()
+    bulk_load_matches(connection, rows, lc.ClubLeagueMatches)
+    return {'competitions': competitions, 'season': season, 'rows': rows}
+
+
+@club_only
+def test_record_batches(session, league):
+    """Export 001: Stream match results into Arrow record batches."""
+    batches = list(record_batches(session.connection(), matches_select('club'), batch_size=4))
+    assert [batch.num_rows for batch in batches] == [4, 4, 2]
+    table = pa.Table.from_batches(batches)
+    assert table.schema.field('date').type == pa.date32()
+    assert table.schema.field('home_goals').type == pa.int64()
+    assert sorted(table.column('id').to_pylist()) == sorted(row['id'] for row in league['rows'])
+    assert table.column('home_shootout_goals').null_count == 10
+
+
+@club_only
+def test_export_matches_parquet(session, league, tmpdir):
+    """Export 002: Write match results to Parquet files partitioned by competition and season."""
+    root = str(tmpdir.join('matches'))
+    counts = export_matches(session.connection(), 'club', root, batch_size=3)
+    season_id = league['season'].id
+    assert counts == dict(((competition.id, season_id), 5) for competition in league['competitions'])
+
+    competition_id = league['competitions'][1].id
+    path = os.path.join(root, 'competition_id={0}'.format(competition_id), 'season_id={0}'.format(season_id),
+                        'part-0.parquet')
+    table = pq.ParquetFile(path).read()
+    assert table.num_rows == 5
+    assert 'competition_id' not in table.schema.names
+    assert table.column('date').to_pylist() == [date(2014, 8, 17 + 2 * k) for k in range(5)]
+
+
+@club_only
+def test_export_ipc(session, league, tmpdir):
+    """Export 003: Write match results to an Arrow IPC file and read it through a memory map."""
+    path = str(tmpdir.join('matches.arrow'))
+    assert write_ipc(session.connection(), matches_select('club'), path, batch_size=4) == 10
+    table = read_ipc(path)
+    assert table.num_rows == 10
+    assert table.column('phase').to_pylist() == ['league'] * 10
+
+
+@club_only
+def test_export_standings(session, league, tmpdir):
+    """Export 004: Write persisted standings to a partitioned Parquet dataset."""
+    connection = session.connection()
+    refresh_standings(connection)
+    counts = export_standings(connection, str(tmpdir.join('standings')))
+    assert sum(counts.values()) == 8
+
+
+@club_only
+def test_export_unordered_parquet(session, league, tmpdir):
+    """Export 005: Verify that results out of partition order are written to further files of the partition."""
+    root = str(tmpdir.join('matches'))
+    statement = matches_select('club').order_by(None).order_by('date')
+    counts = write_parquet(session.connection(), statement, root, batch_size=4)
+    assert sorted(counts.values()) == [5, 5]
+
+    competition_id, season_id = league['competitions'][0].id, league['season'].id
+    path = os.path.join(root, 'competition_id={0}'.format(competition_id), 'season_id={0}'.format(season_id))
+    assert sorted(os.listdir(path)) == ['part-{0}.parquet'.format(k) for k in range(5)]
+    assert sum(pq.ParquetFile(os.path.join(path, name)).read().num_rows for name in os.listdir(path)) == 5
@@ -0,0 +1,140 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+from light.facts import refresh_match_facts, rebuild_match_facts, refresh_partition_facts
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+@pytest.fixture
+def reference(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    session.add_all([competition, season])
+    session.flush()
+    return {'country': england, 'competition': competition, 'season': season}
+
+
+@club_only
+def test_club_match_facts(session, reference):
+    """Match Facts 001: Flatten club matches of all phases into match facts."""
+    arsenal, chelsea = [lc.Clubs(name=name, country=reference['country']) for name in (u"Arsenal FC", u"Chelsea FC")]
+    keys = dict(competition=reference['competition'], season=reference['season'])
+    league = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                  home_team=arsenal, away_team=chelsea, **keys)
+    final = lc.ClubKnockoutMatches(date=date(2015, 5, 30), matchday=1, extra_time=True, home_goals=1, away_goals=1,
+                                   ko_round=lcm.KnockoutRounds(name=u"Final"),
+                                   home_team=chelsea, away_team=arsenal, **keys)
+    session.add_all([league, final])
+    session.flush()
+    session.add(lc.ClubShootoutMatches(id=final.id, home_shootout_goals=5, away_shootout_goals=4,
+                                       home_team_id=chelsea.id, away_team_id=arsenal.id))
+    session.flush()
+
+    assert refresh_match_facts(session.connection(), 'club') == 2
+    facts = dict((fact.match_id, fact) for fact in session.query(lcm.MatchFacts))
+    fact = facts[league.id]
+    assert (fact.phase, fact.competition_name, fact.season_label, fact.matchday) == \
+        ('league', u"Premier League", '2014-2015', 1)
+    assert (fact.home_team_name, fact.away_team_name, fact.home_goals, fact.away_goals) == \
+        (u"Arsenal FC", u"Chelsea FC", 2, 0)
+    assert fact.ko_round is None and fact.home_shootout_goals is None
+    fact = facts[final.id]
+    assert (fact.ko_round, fact.extra_time, fact.home_shootout_goals, fact.away_shootout_goals) == \
+        (u"Final", True, 5, 4)
+    assert repr(fact) == "<MatchFact(match_id={0}, date=2015-05-30, Chelsea FC 1-1 Arsenal FC)>".format(final.id)
+
+
+@club_only
+def test_match_facts_incremental(session, reference):
+    """Match Facts 002: Verify incremental refresh of new and changed matches."""
+    arsenal, chelsea = [lc.Clubs(name=name, country=reference['country']) for name in (u"Arsenal FC", u"Chelsea FC")]
+    keys = dict(competition=reference['competition'], season=reference['season'])
+    first = lc.ClubFriendlyMatches(date=date(2014, 7, 26), home_team=arsenal, away_team=chelsea, **keys)
+    session.add(first)
+    session.flush()
+    connection = session.connection()
+    assert refresh_match_facts(connection, 'club') == 1
+
+    second = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                  home_team=arsenal, away_team=chelsea, **keys)
+    session.add(second)
+    first.home_goals = 3
+    session.flush()
+    assert refresh_match_facts(connection, 'club') == 1
+    assert refresh_match_facts(connection, 'club', match_ids=[first.id, second.id]) == 2
+    session.expire_all()
+    assert [(fact.match_id, fact.home_goals) for fact in session.query(lcm.MatchFacts).order_by('match_id')] == \
+        [(first.id, 3), (second.id, 2)]
+
+    assert rebuild_match_facts(connection, 'club') == 2
+
+
+@club_only
+def test_match_facts_first_refresh_by_id(session, reference):
+    """Match Facts 005: Verify that the first refresh with match IDs writes every match once."""
+    arsenal, chelsea = [lc.Clubs(name=name, country=reference['country']) for name in (u"Arsenal FC", u"Chelsea FC")]
+    keys = dict(competition=reference['competition'], season=reference['season'])
+    matches = [lc.ClubFriendlyMatches(date=date(2014, 7, 26), home_team=arsenal, away_team=chelsea, **keys),
+               lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_team=chelsea, away_team=arsenal, **keys)]
+    session.add_all(matches)
+    session.flush()
+    connection = session.connection()
+    assert refresh_match_facts(connection, 'club', match_ids=[match.id for match in matches]) == 2
+    assert session.query(lcm.MatchFacts).count() == 2
+
+
+@club_only
+def test_match_facts_partition(session, reference):
+    """Match Facts 004: Rewrite the facts of one competition and season."""
+    arsenal, chelsea = [lc.Clubs(name=name, country=reference['country']) for name in (u"Arsenal FC", u"Chelsea FC")]
+    cup = lcm.DomesticCompetitions(name=u"FA Cup", level=1, country=reference['country'])
+    league = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0, home_team=arsenal,
+                                  away_team=chelsea, competition=reference['competition'], season=reference['season'])
+    final = lc.ClubKnockoutMatches(date=date(2015, 5, 30), home_goals=1, away_goals=0, home_team=chelsea,
+                                   away_team=arsenal, competition=cup, season=reference['season'])
+    session.add_all([league, final])
+    session.flush()
+    connection = session.connection()
+    assert refresh_match_facts(connection, 'club') == 2
+
+    league.home_goals = 4
+    final.home_goals = 2
+    session.flush()
+    assert refresh_partition_facts(connection, 'club', reference['competition'].id, reference['season'].id) == 1
+    session.expire_all()
+    assert [(fact.match_id, fact.home_goals) for fact in session.query(lcm.MatchFacts).order_by('match_id')] == \
+        [(league.id, 4), (final.id, 1)]
+
+
+@natl_only
+def test_natl_match_facts(session, reference):
+    """Match Facts 003: Flatten national team group matches into match facts."""
+    france = lcm.Countries(name=u"France", confederation=reference['country'].confederation)
+    match = ln.NationalGroupMatches(date=date(2016, 6, 10), matchday=1, group='A', home_goals=2, away_goals=1,
+                                    group_round=lcm.GroupRounds(name=u"Group Stage"),
+                                    home_team=france, away_team=reference['country'],
+                                    competition=reference['competition'], season=reference['season'])
+    session.add(match)
+    session.flush()
+
+    assert refresh_match_facts(session.connection(), 'natl') == 1
+    fact = session.query(lcm.MatchFacts).one()
+    assert (fact.phase, fact.group, fact.group_round, fact.home_team_name, fact.away_team_name) == \
+        ('group', 'A', u"Group Stage", u"France", u"England")
+    assert fact.extra_time is None
@@ -0,0 +1,120 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+from light.head_to_head import refresh_head_to_head, head_to_head, oriented, track_head_to_head
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+@pytest.fixture
+def reference(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    session.add_all([competition, season])
+    session.flush()
+    return {'country': england, 'competition': competition, 'season': season}
+
+
+def club_rows(reference, teams):
+    arsenal, chelsea, everton = teams
+    fixtures = [
+        (date(2014, 8, 16), arsenal, chelsea, 2, 0),
+        (date(2014, 9, 20), chelsea, arsenal, 1, 1),
+        (date(2015, 2, 7), everton, arsenal, 0, 3),
+        (date(2015, 3, 14), chelsea, arsenal, 2, 1),
+    ]
+    return [dict(date=match_date, matchday=k + 1, home_team_id=home.id, away_team_id=away.id,
+                 home_goals=home_goals, away_goals=away_goals,
+                 competition_id=reference['competition'].id, season_id=reference['season'].id)
+            for k, (match_date, home, away, home_goals, away_goals) in enumerate(fixtures)]
+
+
+@club_only
+def test_head_to_head_refresh(session, reference):
+    """Head-to-Head 001: Compute head-to-head records of clubs across phases, including shootouts."""
+    teams = [lc.Clubs(name=name, country=reference['country'])
+             for name in (u"Arsenal FC", u"Chelsea FC", u"Everton FC")]
+    session.add_all(teams)
+    session.flush()
+    arsenal, chelsea, everton = teams
+    connection = session.connection()
+    bulk_load_matches(connection, club_rows(reference, teams), lc.ClubLeagueMatches)
+    cup = [dict(date=date(2015, 4, 18), matchday=1, extra_time=True, home_team_id=arsenal.id,
+                away_team_id=chelsea.id, home_goals=1, away_goals=1,
+                competition_id=reference['competition'].id, season_id=reference['season'].id)]
+    bulk_load_matches(connection, cup, lc.ClubKnockoutMatches)
+    session.add(lc.ClubShootoutMatches(id=cup[0]['id'], home_shootout_goals=3, away_shootout_goals=4,
+                                       home_team_id=arsenal.id, away_team_id=chelsea.id))
+    session.flush()
+
+    refresh_head_to_head(connection, 'club')
+    record = head_to_head(session, 'club', chelsea.id, arsenal.id)
+    assert (record.team_id, record.opponent_id) == (min(arsenal.id, chelsea.id), max(arsenal.id, chelsea.id))
+    assert oriented(record, arsenal.id) == {
+        'played': 4, 'wins': 1, 'draws': 2, 'losses': 1, 'goals_for': 5, 'goals_against': 4,
+        'shootouts': 1, 'shootout_wins': 0, 'shootout_losses': 1, 'last_date': date(2015, 4, 18)
+    }
+    assert oriented(record, chelsea.id)['shootout_wins'] == 1
+    with pytest.raises(ValueError):
+        oriented(record, everton.id)
+
+    assert oriented(head_to_head(session, 'club', arsenal.id, everton.id), everton.id)['losses'] == 1
+    assert head_to_head(session, 'club', chelsea.id, everton.id) is None
+    assert session.query(lc.ClubHeadToHead).count() == 2
+
+
+@club_only
+def test_head_to_head_tracked_flush(session, reference):
+    """Head-to-Head 002: Verify that head-to-head records follow matches written through the ORM."""
+    track_head_to_head('club')
+    arsenal, chelsea, everton = [lc.Clubs(name=name, country=reference['country'])
+                                 for name in (u"Arsenal FC", u"Chelsea FC", u"Everton FC")]
+    match = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                 home_team=arsenal, away_team=chelsea,
+                                 competition=reference['competition'], season=reference['season'])
+    session.add(match)
+    session.flush()
+    assert oriented(head_to_head(session, 'club', arsenal.id, chelsea.id), arsenal.id)['wins'] == 1
+
+    match.away_team = everton
+    session.flush()
+    session.expire_all()
+    assert head_to_head(session, 'club', arsenal.id, chelsea.id) is None
+    assert oriented(head_to_head(session, 'club', arsenal.id, everton.id), everton.id)['losses'] == 1
+
+
+@natl_only
+def test_natl_head_to_head(session, reference):
+    """Head-to-Head 003: Compute head-to-head records of national teams."""
+    france = lcm.Countries(name=u"France", confederation=reference['country'].confederation)
+    session.add(france)
+    session.flush()
+    england = reference['country']
+    for match_date, home, away, home_goals, away_goals in [
+            (date(2012, 6, 11), france, england, 1, 1), (date(2015, 11, 17), england, france, 2, 0)]:
+        session.add(ln.NationalFriendlyMatches(date=match_date, home_team=home, away_team=away,
+                                               home_goals=home_goals, away_goals=away_goals,
+                                               competition=reference['competition'], season=reference['season']))
+    session.flush()
+
+    refresh_head_to_head(session.connection(), 'natl', team_ids=[france.id])
+    record = head_to_head(session, 'natl', france.id, england.id)
+    assert repr(record) == "<NationalHeadToHead(team_id={0}, opponent_id={1}, played=2, record={2})>".format(
+        record.team_id, record.opponent_id, '1-1-0' if record.team_id == england.id else '0-1-1')
+    assert oriented(record, england.id)['goals_for'] == 3
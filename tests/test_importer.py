@@ -0,0 +1,155 @@
+# coding=utf-8
+import io
+import json
+
+import pytest
+
+import light.club as lc
+import light.common.models as lcm
+from light.importer import MatchImporter, read_rows, parse_season
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+CSV_DATA = u"""phase,date,competition,season,home_team,away_team,home_goals,away_goals,matchday,ko_round,\
+home_shootout_goals,away_shootout_goals
+league,2014-08-16,Premier League,2014-2015,Arsenal FC,Crystal Palace FC,2,1,1,,,
+league,2014-08-23,Premier League,2014-2015,Crystal Palace FC,Arsenal FC,0,0,2,,,
+knockout,2015-03-01,League Cup,2014-2015,Arsenal FC,Crystal Palace FC,1,1,1,Final,4,3
+"""
+
+
+@pytest.fixture
+def club_reference(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    session.add_all([
+        lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england),
+        lcm.DomesticCompetitions(name=u"League Cup", level=1, country=england),
+        lc.Clubs(name=u"Arsenal FC", country=england),
+        lc.Clubs(name=u"Crystal Palace FC", country=england)
+    ])
+    session.flush()
+
+
+def test_parse_season():
+    """Importer 001: Parse single-year and multi-year season names."""
+    assert parse_season("2014") == (2014, 2014)
+    assert parse_season("2014-2015") == (2014, 2015)
+    with pytest.raises(ValueError):
+        parse_season("2014-2015-2016")
+
+
+def test_read_rows(tmpdir):
+    """Importer 002: Read identical rows from CSV and JSON Lines files."""
+    csv_file = tmpdir.join("matches.csv")
+    with io.open(str(csv_file), 'w', encoding='utf-8') as f:
+        f.write(CSV_DATA)
+    csv_rows = list(read_rows(str(csv_file)))
+
+    jsonl_file = tmpdir.join("matches.jsonl")
+    with io.open(str(jsonl_file), 'w', encoding='utf-8') as f:
+        for row in csv_rows:
+            f.write(u"{0}\n".format(json.dumps(row)))
+    jsonl_rows = list(read_rows(str(jsonl_file)))
+
+    assert len(csv_rows) == 3
+    assert csv_rows == jsonl_rows
+    assert csv_rows[0]['home_team'] == u"Arsenal FC"
+
+
+@club_only
+def test_club_import(session, club_reference, tmpdir):
+    """Importer 003: Import league and knockout matches with a shootout and verify data."""
+    csv_file = tmpdir.join("matches.csv")
+    with io.open(str(csv_file), 'w', encoding='utf-8') as f:
+        f.write(CSV_DATA)
+
+    chunks = list(MatchImporter(session, 'club', chunk_size=2).run(read_rows(str(csv_file))))
+    assert [stats.rows for stats in chunks] == [2, 1]
+
+    league_matches = session.query(lc.ClubLeagueMatches).order_by(lc.ClubLeagueMatches.matchday).all()
+    assert len(league_matches) == 2
+    assert league_matches[0].home_team.name == u"Arsenal FC"
+    assert league_matches[0].home_goals == 2
+    assert league_matches[1].season.name == "2014-2015"
+    assert league_matches[0].season_id == league_matches[1].season_id
+
+    final = session.query(lc.ClubKnockoutMatches).one()
+    assert final.ko_round.name == u"Final"
+    shootout = session.query(lc.ClubShootoutMatches).one()
+    assert shootout.id == final.id
+    assert (shootout.home_shootout_goals, shootout.away_shootout_goals) == (4, 3)
+    assert session.query(lcm.Seasons).count() == 1
+
+
+@club_only
+def test_club_import_unknown_team(session, club_reference):
+    """Importer 004: Verify error if a team name cannot be resolved."""
+    row = {'date': '2014-08-16', 'competition': u"Premier League", 'season': '2014-2015',
+           'home_team': u"Arsenal FC", 'away_team': u"Tottenham Hotspur FC"}
+    with pytest.raises(LookupError):
+        list(MatchImporter(session, 'club').run([row]))
+
+
+@natl_only
+def test_natl_import_league_error(session):
+    """Importer 005: Verify error if a league match is imported into a national team database."""
+    brazil = lcm.Countries(name=u"Brazil", confederation=lcm.Confederations(name=u"CONMEBOL"))
+    germany = lcm.Countries(name=u"Germany", confederation=lcm.Confederations(name=u"UEFA"))
+    session.add_all([brazil, germany, lcm.Competitions(name=u"FIFA World Cup", level=1)])
+    session.flush()
+
+    row = {'phase': 'league', 'date': '2014-07-08', 'competition': u"FIFA World Cup", 'season': '2014',
+           'home_team': u"Brazil", 'away_team': u"Germany"}
+    with pytest.raises(ValueError):
+        list(MatchImporter(session, 'natl').run([row]))
+
+
+@club_only
+def test_club_import_upsert(session, club_reference):
+    """Importer 006: Re-import matches in upsert mode and verify that only corrections are written."""
+    rows = [{'phase': 'league', 'date': '2014-08-16', 'competition': u"Premier League", 'season': '2014-2015',
+             'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': '2', 'away_goals': '1',
+             'matchday': '1'},
+            {'phase': 'knockout', 'date': '2015-03-01', 'competition': u"League Cup", 'season': '2014-2015',
+             'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': '1', 'away_goals': '1',
+             'ko_round': u"Final", 'home_shootout_goals': '4', 'away_shootout_goals': '3'}]
+    chunks = list(MatchImporter(session, 'club', upsert=True).run(rows))
+    assert [stats.rows for stats in chunks] == [2]
+    final_id = session.query(lc.ClubKnockoutMatches.id).scalar()
+
+    assert [stats.rows for stats in MatchImporter(session, 'club', upsert=True).run(rows)] == [0]
+
+    rows[1]['away_shootout_goals'] = '2'
+    assert [stats.rows for stats in MatchImporter(session, 'club', upsert=True).run(rows)] == [1]
+    session.expire_all()
+    assert session.query(lcm.Matches).count() == 2
+    shootout = session.query(lc.ClubShootoutMatches).one()
+    assert shootout.id == final_id
+    assert (shootout.home_shootout_goals, shootout.away_shootout_goals) == (4, 2)
+
+
+@club_only
+def test_club_import_then_upsert(session, club_reference):
+    """Importer 007: Verify that an upsert finds the matches of an earlier plain import."""
+    rows = [{'phase': 'league', 'date': '2014-08-16', 'competition': u"Premier League", 'season': '2014-2015',
+             'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': '2', 'away_goals': '1',
+             'matchday': '1'},
+            {'phase': 'knockout', 'date': '2015-03-01', 'competition': u"League Cup", 'season': '2014-2015',
+             'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': '1', 'away_goals': '1',
+             'ko_round': u"Final", 'home_shootout_goals': '4', 'away_shootout_goals': '3'}]
+    assert [stats.rows for stats in MatchImporter(session, 'club').run(rows)] == [2]
+    assert [stats.rows for stats in MatchImporter(session, 'club', upsert=True).run(rows)] == [0]
+
+    rows[0]['home_goals'] = '3'
+    assert [stats.rows for stats in MatchImporter(session, 'club', upsert=True).run(rows)] == [1]
+    assert session.query(lcm.Matches).count() == 2
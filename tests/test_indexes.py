@@ -0,0 +1,76 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+def query_plan(connection, statement):
+    """Return the query plan of a statement as text.  Sequential scans are disabled on PostgreSQL."""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = [compiled.params[name] for name in compiled.positiontup]
+    if connection.dialect.name == 'sqlite':
+        rows = connection.execute("EXPLAIN QUERY PLAN " + str(compiled), params)
+        return "\n".join(str(tuple(row)[-1]) for row in rows)
+    connection.execute("SET LOCAL enable_seqscan = off")
+    rows = connection.execute("EXPLAIN " + str(compiled), params)
+    return "\n".join(row[0] for row in rows)
+
+
+def test_competition_season_index(session):
+    """Index 001: Verify index usage for matches of a competition and season."""
+    matches = lcm.Matches.__table__
+    plan = query_plan(session.connection(), select([matches.c.id]).where(
+        (matches.c.competition_id == 1000) & (matches.c.season_id == 100)))
+    assert 'ix_matches_competition_season_date' in plan
+
+
+def test_date_range_index(session):
+    """Index 002: Verify index usage for matches in a date range."""
+    matches = lcm.Matches.__table__
+    plan = query_plan(session.connection(), select([matches.c.id]).where(
+        matches.c.date.between(date(2014, 8, 1), date(2014, 8, 31))))
+    assert 'ix_matches_date' in plan
+
+
+def test_deduction_index(session):
+    """Index 003: Verify index usage for deductions of a competition and season."""
+    deductions = lcm.Deductions.__table__
+    plan = query_plan(session.connection(), select([deductions.c.id]).where(
+        (deductions.c.competition_id == 1000) & (deductions.c.season_id == 100)))
+    assert 'ix_deductions_competition_season' in plan
+
+
+@club_only
+def test_club_team_index(session):
+    """Index 004: Verify index usage for club league matches of a team."""
+    club_matches = lc.ClubLeagueMatches.__table__
+    plan = query_plan(session.connection(), select([club_matches.c.id]).where(
+        club_matches.c.home_team_id == 10000))
+    assert 'ix_club_league_matches_home_team_id' in plan
+
+
+@natl_only
+def test_natl_team_index(session):
+    """Index 005: Verify index usage for national team group matches of a team."""
+    natl_matches = ln.NationalGroupMatches.__table__
+    plan = query_plan(session.connection(), select([natl_matches.c.id]).where(
+        natl_matches.c.away_team_id == 100))
+    assert 'ix_natl_group_matches_away_team_id' in plan
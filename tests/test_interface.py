@@ -0,0 +1,130 @@
+# coding=utf-8
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.config import Config
+from light.engine import engine_options
+from interface import Marcotti
+
+
+class SQLiteFileConfig(Config):
+    DIALECT = 'sqlite'
+
+    def __init__(self, path):
+        self.DBNAME = '/' + path
+        super(SQLiteFileConfig, self).__init__()
+
+
+class ServerConfig(Config):
+    DIALECT = 'postgresql'
+    DBNAME = 'test-marcotti-light'
+    DBUSER = 'user'
+    DBPASSWD = 'passwd'
+    HOSTNAME = 'localhost'
+    PORT = 5432
+    POOL_SIZE = 20
+    MAX_OVERFLOW = 0
+
+
+@pytest.fixture
+def marcotti_factory(request, tmpdir):
+    instances = []
+
+    def build(scoped=False):
+        marcotti = Marcotti(SQLiteFileConfig(str(tmpdir.join('marcotti.db'))), scoped=scoped)
+        marcotti.create_db(BaseSchema)
+        instances.append(marcotti)
+        return marcotti
+
+    def fin():
+        for marcotti in instances:
+            marcotti.dispose()
+    request.addfinalizer(fin)
+    return build
+
+
+def test_engine_options():
+    """Interface 001: Verify connection pool options for server and SQLite databases."""
+    options = engine_options(ServerConfig())
+    assert options['pool_size'] == 20
+    assert options['max_overflow'] == 0
+    assert options['pool_recycle'] == Config.POOL_RECYCLE
+    assert engine_options(SQLiteFileConfig('/tmp/marcotti.db')) == {}
+
+
+def test_session_connections(marcotti_factory):
+    """Interface 002: Verify that concurrent sessions use separate connections."""
+    marcotti = marcotti_factory()
+    with marcotti.create_session() as first:
+        with marcotti.create_session() as second:
+            assert first is not second
+            assert first.connection().connection is not second.connection().connection
+
+
+def test_session_commit_rollback(marcotti_factory):
+    """Interface 003: Verify that sessions commit on success and roll back on error."""
+    marcotti = marcotti_factory()
+    with marcotti.create_session() as session:
+        session.add(lcm.Years(yr=2015))
+    with pytest.raises(ValueError):
+        with marcotti.create_session() as session:
+            session.add(lcm.Years(yr=2016))
+            session.flush()
+            raise ValueError()
+
+    with marcotti.create_session() as session:
+        assert [x[0] for x in session.query(lcm.Years.yr)] == [2015]
+
+
+def test_scoped_sessions(marcotti_factory):
+    """Interface 004: Verify that scoped sessions are shared within a thread and separate across threads."""
+    marcotti = marcotti_factory(scoped=True)
+    sessions = {}
+
+    def worker(name):
+        with marcotti.create_session() as session:
+            sessions[name] = (session, marcotti.Session())
+            session.add(lcm.Years(yr=2000 + len(name)))
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in ('a', 'bb')]
+    for thread in threads:
+        thread.start()
+        thread.join()
+
+    assert all(session is current for session, current in sessions.values())
+    assert sessions['a'][0] is not sessions['bb'][0]
+    with marcotti.create_session() as session:
+        assert sorted(x[0] for x in session.query(lcm.Years.yr)) == [2001, 2002]
+
+
+def test_warm_up(request, tmpdir):
+    """Interface 005: Verify that mappers of the configured schemas are configured when the interface is created."""
+    from sqlalchemy.orm import class_mapper
+    import light.common as lc
+    import light.club as lcl
+
+    config = SQLiteFileConfig(str(tmpdir.join('marcotti.db')))
+    config.WARM_UP_SCHEMAS = ('club',)
+    marcotti = Marcotti(config)
+    request.addfinalizer(marcotti.dispose)
+
+    assert class_mapper(lcl.ClubLeagueMatches).configured
+    assert marcotti.warm_up('club') >= 0.0
+    assert 'Clubs' in lcl.ClubSchema._decl_class_registry
+    assert 'Clubs' not in lc.BaseSchema._decl_class_registry
+    assert lc.BaseSchema._decl_class_registry['Countries'] is lcl.ClubSchema._decl_class_registry['Countries']
+
+
+def test_lazy_imports():
+    """Interface 006: Verify that importing the interface does not import loaders, importers or caches."""
+    code = ("import sys, interface; "
+            "print(' '.join(sorted(m for m, mod in sys.modules.items() if m.startswith('light') and mod)))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root).decode('ascii')
+    assert output.split() == ['light', 'light.engine']
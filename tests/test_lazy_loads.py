@@ -0,0 +1,91 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+from sqlalchemy.orm.strategies import LazyLoader
+
+import light.club as lc
+import light.common.models as lcm
+from light.loaders import match_query
+from light.testing import LazyLoadTracker, LazyLoadBudgetExceeded, _emit_lazyload
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+def add_seasons(session, count):
+    years = [lcm.Years(yr=2000 + k) for k in range(count + 1)]
+    session.add_all([lcm.Seasons(start_year=years[k], end_year=years[k + 1]) for k in range(count)])
+    session.flush()
+    session.expunge_all()
+
+
+def test_lazy_load_tracker(session):
+    """Lazy Loads 001: Count lazy loads per attribute and raise when the budget is exceeded."""
+    add_seasons(session, 3)
+    seasons = session.query(lcm.Seasons).order_by(lcm.Seasons.start_yr).all()
+    with LazyLoadTracker(budget=3, session=session) as tracker:
+        for season in seasons:
+            season.start_year
+        seasons[0].end_year
+        assert tracker.loads == {'Seasons.start_year': 3}
+        with pytest.raises(LazyLoadBudgetExceeded) as excinfo:
+            seasons[2].end_year
+    assert str(excinfo.value).startswith("4 lazy loads, budget 3")
+    assert tracker.report() == "Seasons.start_year: 3\nSeasons.end_year: 1"
+
+    session.expunge_all()
+    season = session.query(lcm.Seasons).first()
+    with LazyLoadTracker(attributes={'Seasons.end_year': 0}, session=session) as tracker:
+        season.start_year
+        with pytest.raises(LazyLoadBudgetExceeded):
+            season.end_year
+    assert tracker.loads == {'Seasons.start_year': 1, 'Seasons.end_year': 1}
+
+
+@pytest.mark.lazy_load_budget(Seasons__start_year=2, Seasons__end_year=0)
+def test_lazy_load_budget_marker(session, lazy_loads):
+    """Lazy Loads 002: Verify lazy load budgets set with the test marker."""
+    add_seasons(session, 2)
+    assert lazy_loads.attributes == {'Seasons.start_year': 2, 'Seasons.end_year': 0}
+    for season in session.query(lcm.Seasons):
+        season.start_year
+    assert lazy_loads.loads == {'Seasons.start_year': 2}
+
+
+@club_only
+@pytest.mark.lazy_load_budget(0)
+def test_match_listing_lazy_loads(session, lazy_loads):
+    """Lazy Loads 003: Verify that match listings with loader options make no lazy loads of teams."""
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    clubs = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(4)]
+    session.add_all([lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, competition=competition, season=season,
+                                          home_team=clubs[k], away_team=clubs[(k + 1) % 4]) for k in range(4)])
+    session.flush()
+    session.expunge_all()
+
+    matches = match_query(session, 'club').all()
+    assert sorted(match.home_team.name for match in matches) == [u"Club {0}".format(k) for k in range(4)]
+    assert lazy_loads.total == 0
+
+    session.expunge_all()
+    lazy_loads.budget = None
+    for match in session.query(lc.ClubLeagueMatches):
+        match.home_team.name
+    assert lazy_loads.loads == {'ClubLeagueMatches.home_team': 4}
+
+
+def test_unmarked_test_unpatched():
+    """Lazy Loads 004: Verify that unmarked tests run against unpatched SQLAlchemy."""
+    assert LazyLoader.__dict__['_emit_lazyload'] is not _emit_lazyload
+
+
+@pytest.mark.lazy_load_budget(0)
+def test_marked_test_patched():
+    """Lazy Loads 005: Verify that marked tests are tracked without requesting the fixture."""
+    assert LazyLoader.__dict__['_emit_lazyload'] is _emit_lazyload
@@ -0,0 +1,185 @@
+# coding=utf-8
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+from light.loaders import match_listing_options, match_query, stream_matches
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+@pytest.fixture
+def statements(request, db_connection):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db_connection, 'before_cursor_execute', count)
+
+    def fin():
+        event.remove(db_connection, 'before_cursor_execute', count)
+    request.addfinalizer(fin)
+    return executed
+
+
+def add_matches(session, model, count, **kwargs):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    for k in range(count):
+        session.add(model(date=date(2014, 8, 16), competition=competition, season=season,
+                          **dict((key, value(k, england)) for key, value in kwargs.items())))
+    session.flush()
+    session.expunge_all()
+
+
+def listing_statements(session, statements, query):
+    del statements[:]
+    for match in query.all():
+        repr(match.competition)
+        repr(match.season)
+        match.season.reference_date
+    return len(statements)
+
+
+@pytest.mark.parametrize('count', [2, 20])
+def test_match_listing_statements(session, statements, count):
+    """Loading 001: Verify that a match listing with competitions and seasons is loaded in one statement."""
+    add_matches(session, lcm.Matches, count)
+    assert listing_statements(session, statements, session.query(lcm.Matches)) == 1
+
+
+@club_only
+@pytest.mark.parametrize('count', [2, 20])
+def test_club_match_listing_statements(session, statements, count):
+    """Loading 002: Verify that a club match listing with teams is loaded in one statement."""
+    add_matches(session, lc.ClubLeagueMatches, count,
+                home_team=lambda k, country: lc.Clubs(name=u"Home {0}".format(k), country=country),
+                away_team=lambda k, country: lc.Clubs(name=u"Away {0}".format(k), country=country))
+    query = session.query(lc.ClubLeagueMatches).options(*match_listing_options(lc.ClubLeagueMatches))
+    assert listing_statements(session, statements, query) == 1
+
+    del statements[:]
+    for match in query.all():
+        repr(match.home_team)
+        repr(match.away_team)
+    assert len(statements) == 1
+
+
+def add_mixed_club_matches(session, count):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    clubs = [lc.Clubs(name=u"Club {0}".format(k), country=england) for k in range(6)]
+    phases = [
+        lambda: lc.ClubFriendlyMatches(),
+        lambda: lc.ClubLeagueMatches(matchday=1),
+        lambda: lc.ClubGroupMatches(matchday=1, group='A'),
+        lambda: lc.ClubKnockoutMatches(matchday=1, extra_time=True)
+    ]
+    for k in range(count):
+        match = phases[k % 4]()
+        match.date = date(2014, 8, 16)
+        match.competition, match.season = competition, season
+        match.home_team, match.away_team = clubs[k % 6], clubs[(k + 1) % 6]
+        session.add(match)
+    session.flush()
+    team_id = clubs[0].id
+    session.expunge_all()
+    return team_id
+
+
+@club_only
+@pytest.mark.parametrize('count', [4, 24])
+def test_polymorphic_match_statements(session, statements, count):
+    """Loading 003: Verify that mixed-phase match listing with teams is loaded in a fixed number of statements."""
+    add_mixed_club_matches(session, count)
+
+    del statements[:]
+    matches = match_query(session, 'club').all()
+    for match in matches:
+        getattr(match, 'matchday', None)
+        getattr(match, 'extra_time', None)
+        match.home_team.name
+        match.away_team.name
+    assert len(matches) == count
+    assert set(match.phase for match in matches) == {'friendly', 'league', 'group', 'knockout'}
+    assert set(type(match) for match in matches) == {lc.ClubFriendlyMatches, lc.ClubLeagueMatches,
+                                                     lc.ClubGroupMatches, lc.ClubKnockoutMatches}
+    assert len(statements) == 9
+
+
+@club_only
+def test_polymorphic_team_matches(session):
+    """Loading 004: Retrieve all matches of a club across phases."""
+    team_id = add_mixed_club_matches(session, 12)
+
+    matches = match_query(session, 'club', team_id=team_id, eager='joined').all()
+    assert len(matches) == 4
+    assert all(team_id in (match.home_team_id, match.away_team_id) for match in matches)
+
+
+@club_only
+def test_stream_matches_keyset(session, statements):
+    """Loading 005: Stream mixed-phase matches with teams in keyset chunks."""
+    team_id = add_mixed_club_matches(session, 25)
+
+    del statements[:]
+    streamed = []
+    for match in stream_matches(session, 'club', chunk_size=10, server_side=False):
+        streamed.append((match.id, match.phase, getattr(match, 'matchday', None), match.home_team.name))
+        assert len(session.identity_map) < 40
+    assert len(streamed) == 25
+    assert [row[0] for row in streamed] == sorted(row[0] for row in streamed)
+    assert set(row[1] for row in streamed) == {'friendly', 'league', 'group', 'knockout'}
+    assert len(statements) == 3 * 9
+
+    assert len(list(stream_matches(session, 'club', chunk_size=5, team_id=team_id, server_side=False))) == 9
+
+
+@club_only
+def test_stream_matches_server_side(session, statements):
+    """Loading 006: Stream matches with joined teams from a single cursor on databases with server-side cursors."""
+    add_mixed_club_matches(session, 12)
+
+    del statements[:]
+    names = [(match.home_team.name, match.away_team.name) for match in stream_matches(session, 'club', chunk_size=5, server_side=True)]
+    assert len(names) == 12
+    assert len(statements) == 1
+
+
+@natl_only
+def test_polymorphic_natl_matches(session):
+    """Loading 007: Verify that national team listings load national team models while club models are mapped."""
+    uefa = lcm.Confederations(name=u"UEFA")
+    england, france = [lcm.Countries(name=name, confederation=uefa) for name in (u"England", u"France")]
+    competition = lcm.InternationalCompetitions(name=u"UEFA Euro", level=1, confederation=uefa)
+    year = lcm.Years(yr=2016)
+    keys = dict(competition=competition, season=lcm.Seasons(start_year=year, end_year=year))
+    session.add_all([
+        ln.NationalFriendlyMatches(date=date(2015, 11, 17), home_team=england, away_team=france, **keys),
+        ln.NationalGroupMatches(date=date(2016, 6, 11), matchday=1, group='B', home_team=france, away_team=england,
+                                **keys),
+        ln.NationalKnockoutMatches(date=date(2016, 6, 27), matchday=1, home_team=england, away_team=france, **keys)
+    ])
+    session.flush()
+    session.expunge_all()
+
+    matches = match_query(session, 'natl').order_by(lcm.Matches.date).all()
+    assert [type(match) for match in matches] == [ln.NationalFriendlyMatches, ln.NationalGroupMatches,
+                                                  ln.NationalKnockoutMatches]
+    assert [match.home_team.name for match in matches] == [u"England", u"France", u"England"]
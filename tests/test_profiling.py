@@ -0,0 +1,122 @@
+# coding=utf-8
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.config import Config
+from light.profiling import QueryStats, normalize
+from interface import Marcotti
+
+
+class SQLiteFileConfig(Config):
+    DIALECT = 'sqlite'
+
+    def __init__(self, path, **settings):
+        self.DBNAME = '/' + path
+        for name, value in settings.items():
+            setattr(self, name, value)
+        super(SQLiteFileConfig, self).__init__()
+
+
+@pytest.fixture
+def marcotti_factory(request, tmpdir):
+    instances = []
+
+    def build(**settings):
+        marcotti = Marcotti(SQLiteFileConfig(str(tmpdir.join('marcotti.db')), **settings))
+        marcotti.create_db(BaseSchema)
+        instances.append(marcotti)
+        return marcotti
+
+    def fin():
+        for marcotti in instances:
+            marcotti.dispose()
+    request.addfinalizer(fin)
+    return build
+
+
+def add_seasons(marcotti, count):
+    with marcotti.create_session() as session:
+        years = [lcm.Years(yr=2000 + k) for k in range(count + 1)]
+        session.add_all([lcm.Seasons(start_year=years[k], end_year=years[k + 1]) for k in range(count)])
+
+
+def test_normalize_statement():
+    """Profiling 001: Normalize literals, bound parameters and parameter lists of statements."""
+    assert normalize("SELECT *\n  FROM years WHERE yr = 2014 AND id IN (?, ?, ?)") == \
+        "SELECT * FROM years WHERE yr = ? AND id IN (?)"
+    assert normalize("SELECT name FROM clubs WHERE name = 'Arsenal' AND id = %(id_1)s") == \
+        "SELECT name FROM clubs WHERE name = ? AND id = ?"
+    assert normalize("SELECT club_2.name FROM clubs AS club_2") == "SELECT club_2.name FROM clubs AS club_2"
+
+
+def test_session_profile_lazy_loads(marcotti_factory):
+    """Profiling 002: Verify that session profiles expose repeated lazy loads among the slowest statements."""
+    marcotti = marcotti_factory(QUERY_PROFILING=True, QUERY_PROFILE_TOP=3)
+    add_seasons(marcotti, 5)
+    with marcotti.create_session() as session:
+        seasons = session.query(lcm.Seasons).all()
+        for season in seasons:
+            season.start_year.yr
+        stats = session.info['query_stats']
+    assert stats.sampled
+    assert stats.statements == 6
+    assert stats.total_time > 0 and stats.percentile(50) <= stats.percentile(99)
+    loads = [s for s in stats.slowest() if s.statement.startswith('SELECT years.')]
+    assert len(loads) == 1 and loads[0].count == 5
+    assert 'years.id = ?' in loads[0].statement
+    assert len(stats.slowest()) <= 3
+    assert marcotti.instrumentation.stats.statements >= stats.statements + 1
+    assert sorted(stats.as_dict()) == ['p50', 'p95', 'p99', 'rows', 'slowest', 'statements', 'total_time']
+
+
+def test_profile_sampling(marcotti_factory):
+    """Profiling 003: Verify that unsampled profiles and statements outside profiles are not recorded."""
+    marcotti = marcotti_factory()
+    reported = []
+    instrumentation = marcotti.instrument(sample_rate=0.0, callback=reported.append)
+    add_seasons(marcotti, 2)
+    with marcotti.create_session() as session:
+        session.query(lcm.Seasons).all()
+        assert not session.info['query_stats'].sampled
+    assert instrumentation.stats.statements == 0 and reported == []
+
+    with marcotti.profile(sample_rate=1.0) as outer:
+        with marcotti.create_session() as session:
+            session.query(lcm.Years).filter(lcm.Years.yr > 2000).update({'yr': lcm.Years.yr + 10},
+                                                                        synchronize_session=False)
+        with marcotti.profile(sample_rate=1.0) as inner:
+            with marcotti.engine.connect() as connection:
+                connection.execute(lcm.Years.__table__.select())
+    assert outer.statements == inner.statements + 1 and inner.statements == 1
+    assert outer.rows == 2
+    assert reported == [inner, outer]
+    instrumentation.reset()
+    assert instrumentation.stats.statements == 0
+
+
+def test_query_stats_samples():
+    """Profiling 004: Verify percentiles and the bounded sample of latencies."""
+    stats = QueryStats(top=2, max_samples=10)
+    for k in range(100):
+        stats.record("SELECT * FROM t{0}".format(k % 3), 0.001 * (k + 1), -1)
+    assert stats.statements == 100 and len(stats.latencies) == 10
+    assert round(stats.total_time, 3) == 5.05
+    assert stats.percentile(0) == min(stats.latencies) and stats.percentile(100) == max(stats.latencies)
+    assert [(s.statement, s.count) for s in stats.slowest()] == [("SELECT * FROM t0", 34), ("SELECT * FROM t2", 33)]
+    assert QueryStats().percentile(95) is None
+
+
+def test_profile_failed_statement(marcotti_factory):
+    """Profiling 005: Verify that failed statements leave no start time behind on the connection."""
+    marcotti = marcotti_factory()
+    instrumentation = marcotti.instrument()
+    with marcotti.profile() as stats:
+        with marcotti.engine.connect() as connection:
+            with pytest.raises(DBAPIError):
+                connection.execute("SELECT * FROM missing_table")
+            assert connection.info.get('profile_start') == []
+            connection.execute(lcm.Years.__table__.select())
+    assert stats.statements == 1
+    assert instrumentation.stats.statements == 1
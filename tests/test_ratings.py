@@ -0,0 +1,127 @@
+# coding=utf-8
+from datetime import date, timedelta
+
+import pytest
+
+import light.club as lc
+import light.natl as ln
+import light.common.models as lcm
+from light.bulk import bulk_load_matches
+from light.ratings import Elo, TeamRatings, rate_matches, rebuild_ratings, current_ratings
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+@pytest.fixture
+def reference(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    competition = lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    session.add_all([competition, season])
+    session.flush()
+    return {'country': england, 'competition': competition, 'season': season}
+
+
+def test_elo_rate():
+    """Ratings 001: Verify home advantage, goal difference multiplier and shootout scores."""
+    elo = Elo(k=20.0, home_advantage=100.0)
+    ratings = TeamRatings(1500.0)
+    expected = elo.expected(1500.0, 1500.0)
+    assert round(expected, 4) == 0.6401
+
+    results = [(1, date(2014, 8, 16), 10, 20, 2, 0, None, None),
+               (2, date(2014, 8, 23), 20, 10, 1, 1, 5, 4),
+               (3, date(2014, 8, 30), 30, 10, 0, 4, None, None)]
+    rated = list(elo.rate(results, ratings))
+    first = rated[0]
+    assert first[:6] == (1, date(2014, 8, 16), 10, 20, 1500.0, 1500.0)
+    assert round(first[6] - 1500.0, 3) == round(20.0 * 1.5 * (1.0 - expected), 3)
+    assert first[6] + first[7] == 3000.0
+
+    second = rated[1]
+    change = 20.0 * (0.75 - elo.expected(second[4], second[5]))
+    assert round(second[6], 6) == round(second[4] + change, 6)
+
+    third = rated[2]
+    assert third[4] == 1500.0 and third[5] == second[7]
+    assert round(third[7] - third[5], 6) == round(20.0 * 15.0 / 8.0 * elo.expected(1500.0, third[5]), 6)
+    assert len(ratings) == 3 and ratings[30] == third[6] and ratings[40] == 1500.0
+
+
+@club_only
+def test_club_match_ratings(session, reference):
+    """Ratings 002: Rate club matches of all phases, including shootouts."""
+    arsenal, chelsea = [lc.Clubs(name=name, country=reference['country']) for name in (u"Arsenal FC", u"Chelsea FC")]
+    keys = dict(competition=reference['competition'], season=reference['season'])
+    league = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                  home_team=arsenal, away_team=chelsea, **keys)
+    final = lc.ClubKnockoutMatches(date=date(2015, 5, 30), matchday=1, extra_time=True, home_goals=1, away_goals=1,
+                                   home_team=chelsea, away_team=arsenal, **keys)
+    undated = lc.ClubFriendlyMatches(home_team=arsenal, away_team=chelsea, **keys)
+    session.add_all([league, final, undated])
+    session.flush()
+    session.add(lc.ClubShootoutMatches(id=final.id, home_shootout_goals=5, away_shootout_goals=4,
+                                       home_team_id=chelsea.id, away_team_id=arsenal.id))
+    session.flush()
+
+    assert rate_matches(session.connection(), 'club') == 2
+    rows = session.query(lcm.MatchRatings).order_by(lcm.MatchRatings.sequence).all()
+    assert [row.match_id for row in rows] == [league.id, final.id]
+    assert rows[0].home_rating_post > 1500.0 > rows[0].away_rating_post
+    assert rows[1].home_rating_pre == rows[0].away_rating_post
+    assert rows[1].home_rating_post > rows[1].home_rating_pre
+    assert current_ratings(session.connection()) == {
+        arsenal.id: rows[1].away_rating_post, chelsea.id: rows[1].home_rating_post}
+    assert repr(rows[0]).startswith("<MatchRating(match_id={0}, home={1}: 1500.0->".format(league.id, arsenal.id))
+
+
+@club_only
+def test_match_ratings_resume(session, reference):
+    """Ratings 003: Verify that resumed ratings equal ratings of the full history."""
+    clubs = [lc.Clubs(name=u"Club {0}".format(k), country=reference['country']) for k in range(6)]
+    session.add_all(clubs)
+    session.flush()
+    keys = dict(competition_id=reference['competition'].id, season_id=reference['season'].id)
+    rows = [dict(date=date(2014, 8, 1) + timedelta(days=k // 3), matchday=k // 3 + 1,
+                 home_goals=(k * 7) % 4, away_goals=(k * 5) % 3,
+                 home_team_id=clubs[k % 6].id, away_team_id=clubs[(k + 1 + k // 6) % 6].id, **keys)
+            for k in range(60)]
+    rows = [row for row in rows if row['home_team_id'] != row['away_team_id']]
+    connection = session.connection()
+    bulk_load_matches(connection, rows[:30], lc.ClubLeagueMatches)
+    assert rate_matches(connection, 'club', batch_size=7) == 30
+    bulk_load_matches(connection, rows[30:], lc.ClubLeagueMatches)
+    assert rate_matches(connection, 'club', batch_size=7) == len(rows) - 30
+    assert rate_matches(connection, 'club') == 0
+
+    table = lcm.MatchRatings.__table__
+    query = table.select().order_by(table.c.sequence)
+    resumed = [tuple(row) for row in connection.execute(query)]
+    resumed_ratings = current_ratings(connection)
+    assert rebuild_ratings(connection, 'club') == len(rows)
+    assert [tuple(row) for row in connection.execute(query)] == resumed
+    assert current_ratings(connection) == resumed_ratings
+
+
+@natl_only
+def test_natl_match_ratings(session):
+    """Ratings 004: Rate national team matches with custom parameters."""
+    uefa = lcm.Confederations(name=u"UEFA")
+    england, france = [lcm.Countries(name=name, confederation=uefa) for name in (u"England", u"France")]
+    competition = lcm.InternationalCompetitions(name=u"Friendly", level=1, confederation=uefa)
+    season = lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015))
+    session.add(ln.NationalFriendlyMatches(date=date(2015, 3, 31), home_goals=0, away_goals=0, competition=competition,
+                                           season=season, home_team=england, away_team=france))
+    session.flush()
+
+    assert rate_matches(session.connection(), 'natl', Elo(k=40.0, home_advantage=0.0, initial=1000.0)) == 1
+    assert current_ratings(session.connection()) == {england.id: 1000.0, france.id: 1000.0}
@@ -0,0 +1,134 @@
+# coding=utf-8
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+import light.club as lc
+import light.common.models as lcm
+from light.staging import stage_matches, supports_copy
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+ROWS = [
+    {'phase': 'league', 'date': '2014-08-16', 'competition': u"Premier League", 'season': '2014-2015',
+     'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': '2', 'away_goals': '1',
+     'matchday': '1'},
+    {'date': '2014-08-23', 'competition': u"Premier League", 'season': '2014-2015',
+     'home_team': u"Crystal Palace FC", 'away_team': u"Arsenal FC", 'home_goals': '0', 'away_goals': '0',
+     'matchday': '2'},
+    {'phase': 'knockout', 'date': '2015-03-01', 'competition': u"League Cup", 'season': '2014-2015',
+     'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC", 'home_goals': 1, 'away_goals': 1,
+     'matchday': 1, 'ko_round': u"Final", 'extra_time': 'true', 'home_shootout_goals': 4, 'away_shootout_goals': 3}
+]
+
+
+@pytest.fixture
+def statements(request, db_connection):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db_connection, 'before_cursor_execute', count)
+
+    def fin():
+        event.remove(db_connection, 'before_cursor_execute', count)
+    request.addfinalizer(fin)
+    return executed
+
+
+@pytest.fixture
+def club_reference(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    session.add_all([
+        lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england),
+        lcm.DomesticCompetitions(name=u"League Cup", level=1, country=england),
+        lc.Clubs(name=u"Arsenal FC", country=england),
+        lc.Clubs(name=u"Crystal Palace FC", country=england)
+    ])
+    session.flush()
+
+
+def league_rows(count, start=0):
+    for k in range(start, start + count):
+        yield {'phase': 'league', 'date': date(2015, 8, 8) + timedelta(days=k), 'competition': u"Premier League",
+               'season': '2015-2016', 'home_team': u"Arsenal FC", 'away_team': u"Crystal Palace FC",
+               'home_goals': k % 3, 'away_goals': 0, 'matchday': k + 1}
+
+
+@club_only
+def test_stage_matches(session, club_reference):
+    """Staging 001: Stage league and knockout matches with a shootout and verify data in all match tables."""
+    stats = stage_matches(session, iter(ROWS), 'club', block_size=2)
+    assert stats.rows == 3
+
+    league_matches = session.query(lc.ClubLeagueMatches).order_by(lc.ClubLeagueMatches.matchday).all()
+    assert len(league_matches) == 2
+    assert league_matches[0].home_team.name == u"Arsenal FC"
+    assert (league_matches[0].home_goals, league_matches[0].away_goals) == (2, 1)
+    assert league_matches[1].season.name == "2014-2015"
+    assert league_matches[0].season_id == league_matches[1].season_id
+
+    final = session.query(lc.ClubKnockoutMatches).one()
+    assert final.ko_round.name == u"Final"
+    assert final.extra_time is True
+    shootout = session.query(lc.ClubShootoutMatches).one()
+    assert shootout.id == final.id
+    assert (shootout.home_shootout_goals, shootout.away_shootout_goals) == (4, 3)
+    assert shootout.away_team.name == u"Crystal Palace FC"
+    assert session.query(lcm.Seasons).count() == 1
+
+
+@club_only
+def test_stage_matches_unknown_team(session, club_reference):
+    """Staging 002: Verify error if a team name cannot be resolved."""
+    row = dict(ROWS[0], away_team=u"Tottenham Hotspur FC")
+    with pytest.raises(LookupError):
+        stage_matches(session, [row], 'club')
+
+
+@club_only
+def test_stage_matches_set_based(session, club_reference, statements):
+    """Staging 003: Verify that COPY staging merges rows with a number of statements independent of row count."""
+    if not supports_copy(session.connection()):
+        pytest.skip("COPY staging requires PostgreSQL, e.g. with --uri")
+    stage_matches(session, league_rows(3), 'club')
+    few = len(statements)
+    del statements[:]
+    stage_matches(session, league_rows(300, start=3), 'club')
+    assert len(statements) == few
+    assert session.query(lc.ClubLeagueMatches).count() == 303
+
+
+@club_only
+def test_stage_matches_missing_names(session, club_reference):
+    """Staging 004: Verify that rows without a competition, season or team name are rejected before writes."""
+    for field in ('competition', 'season', 'home_team', 'away_team'):
+        rows = [ROWS[0], dict(ROWS[1], **{field: None if field != 'season' else ''})]
+        with pytest.raises(ValueError):
+            stage_matches(session, rows, 'club', block_size=2)
+        assert session.query(lcm.Matches).count() == 0
+
+
+@club_only
+def test_stage_matches_failed_load(session, club_reference):
+    """Staging 005: Verify that failed COPY loads drop the staging table and write no rows."""
+    if not supports_copy(session.connection()):
+        pytest.skip("COPY staging requires PostgreSQL, e.g. with --uri")
+    with pytest.raises(LookupError):
+        stage_matches(session, [dict(ROWS[0], away_team=u"Tottenham Hotspur FC")], 'club')
+    with pytest.raises(ValueError):
+        stage_matches(session, [ROWS[0], dict(ROWS[1], season='')], 'club')
+    stage_matches(session, league_rows(2), 'club')
+    with pytest.raises(IntegrityError):
+        stage_matches(session, league_rows(3), 'club')
+    assert session.query(lcm.Matches).count() == 2
+    assert session.execute("SELECT to_regclass('match_staging')").scalar() is None
+    assert stage_matches(session, iter(ROWS), 'club').rows == 3
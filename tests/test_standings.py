@@ -0,0 +1,187 @@
+# coding=utf-8
+import threading
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+
+import light.club as lc
+import light.common.models as lcm
+from light.common import BaseSchema
+from light.bulk import bulk_load_matches
+from light.standings import (StandingsRules, refresh_standings, league_table, track_standings,
+                             refresh_matchday_standings, matchday_standings_select, matchday_table,
+                             backfill_matchday_standings, _matchday_standings_rows)
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+
+@pytest.fixture
+def league(session):
+    return add_league(session)
+
+
+def add_league(session):
+    england = lcm.Countries(name=u"England", confederation=lcm.Confederations(name=u"UEFA"))
+    league = {
+        'competition': lcm.DomesticCompetitions(name=u"Premier League", level=1, country=england),
+        'season': lcm.Seasons(start_year=lcm.Years(yr=2014), end_year=lcm.Years(yr=2015)),
+        'teams': [lc.Clubs(name=name, country=england) for name in
+                  (u"Arsenal FC", u"Chelsea FC", u"Everton FC", u"Hull City AFC")]
+    }
+    session.add_all([league['competition'], league['season']] + league['teams'])
+    session.flush()
+    return league
+
+
+def results(league):
+    arsenal, chelsea, everton, hull = [team.id for team in league['teams']]
+    return [
+        (1, arsenal, chelsea, 2, 0),
+        (1, everton, hull, 1, 1),
+        (2, chelsea, everton, 3, 1),
+        (2, hull, arsenal, 0, 1),
+    ]
+
+
+def league_rows(league):
+    for matchday, home, away, home_goals, away_goals in results(league):
+        yield {
+            'date': date(2014, 8, 16) + timedelta(days=7 * (matchday - 1)), 'matchday': matchday,
+            'competition_id': league['competition'].id, 'season_id': league['season'].id,
+            'home_team_id': home, 'away_team_id': away,
+            'home_goals': home_goals, 'away_goals': away_goals
+        }
+
+
+@club_only
+def test_standings_refresh(session, league):
+    """Standings 001: Compute standings after bulk load and verify table order and totals."""
+    bulk_load_matches(session.connection(), league_rows(league), lc.ClubLeagueMatches)
+    refresh_standings(session.connection(), league['competition'].id, league['season'].id)
+
+    table = league_table(session, league['competition'].id, league['season'].id)
+    assert [row.team.name for row in table] == [u"Arsenal FC", u"Chelsea FC", u"Hull City AFC", u"Everton FC"]
+    assert [row.points for row in table] == [6, 3, 1, 1]
+    arsenal = table[0]
+    assert (arsenal.played, arsenal.wins, arsenal.draws, arsenal.losses) == (2, 2, 0, 0)
+    assert (arsenal.goals_for, arsenal.goals_against, arsenal.goal_difference) == (3, 0, 3)
+
+
+@club_only
+def test_standings_rules(session, league):
+    """Standings 002: Verify points-per-win and tie-breaker configuration."""
+    rules = StandingsRules(win=2, tiebreakers=('points', 'goals_against'))
+    bulk_load_matches(session.connection(), league_rows(league), lc.ClubLeagueMatches)
+    refresh_standings(session.connection(), rules=rules)
+
+    table = league_table(session, league['competition'].id, league['season'].id, rules)
+    assert [row.points for row in table] == [4, 2, 1, 1]
+    assert [row.team.name for row in table][2:] == [u"Hull City AFC", u"Everton FC"]
+
+
+@club_only
+def test_standings_tracked_flush(session, league):
+    """Standings 003: Verify that standings follow league matches and deductions written through the ORM."""
+    track_standings()
+    arsenal, chelsea = league['teams'][:2]
+    session.add(lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                     competition=league['competition'], season=league['season'],
+                                     home_team=arsenal, away_team=chelsea))
+    session.flush()
+
+    table = league_table(session, league['competition'].id, league['season'].id)
+    assert [(row.team_id, row.points) for row in table] == [(arsenal.id, 3), (chelsea.id, 0)]
+
+    session.add(lc.ClubDeductions(date=date(2014, 9, 1), points=10, team=arsenal,
+                                  competition=league['competition'], season=league['season']))
+    session.flush()
+    session.expire_all()
+
+    table = league_table(session, league['competition'].id, league['season'].id)
+    assert [(row.team_id, row.points, row.deducted) for row in table] == [(chelsea.id, 0, 0), (arsenal.id, -7, 10)]
+
+
+@club_only
+def test_standings_tracked_move(session, league):
+    """Standings 006: Verify that moving a match to another season and team updates the rows of both keys."""
+    track_standings()
+    arsenal, chelsea, everton = league['teams'][:3]
+    match = lc.ClubLeagueMatches(date=date(2014, 8, 16), matchday=1, home_goals=2, away_goals=0,
+                                 competition=league['competition'], season=league['season'],
+                                 home_team=arsenal, away_team=chelsea)
+    session.add(match)
+    session.flush()
+
+    season = lcm.Seasons(start_year=league['season'].end_year, end_year=lcm.Years(yr=2016))
+    match.season = season
+    match.away_team = everton
+    session.flush()
+    session.expire_all()
+    assert league_table(session, league['competition'].id, league['season'].id) == []
+    table = league_table(session, league['competition'].id, season.id)
+    assert [(row.team_id, row.points) for row in table] == [(arsenal.id, 3), (everton.id, 0)]
+
+
+@club_only
+def test_matchday_standings(session, league):
+    """Standings 004: Compute cumulative standings per matchday and verify tables after each matchday."""
+    arsenal, chelsea, everton, hull = [team.id for team in league['teams']]
+    bulk_load_matches(session.connection(), league_rows(league), lc.ClubLeagueMatches)
+    session.add(lc.ClubDeductions(date=date(2014, 8, 20), points=1, team_id=everton,
+                                  competition=league['competition'], season=league['season']))
+    session.flush()
+    refresh_matchday_standings(session.connection(), league['competition'].id, league['season'].id)
+
+    first = matchday_table(session, league['competition'].id, league['season'].id, 1)
+    assert [(row.team_id, row.played, row.points) for row in first] == [
+        (arsenal, 1, 3), (everton, 1, 1), (hull, 1, 1), (chelsea, 1, 0)]
+
+    second = matchday_table(session, league['competition'].id, league['season'].id, 2)
+    assert [(row.team_id, row.played, row.points) for row in second] == [
+        (arsenal, 2, 6), (chelsea, 2, 3), (hull, 2, 1), (everton, 2, 0)]
+    assert second[3].deducted == 1
+
+
+@club_only
+def test_matchday_standings_window_select(session, league):
+    """Standings 005: Verify that the window function statement matches the standings summed in Python."""
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite' and connection.dialect.dbapi.sqlite_version_info < (3, 25):
+        pytest.skip("SQLite version does not support window functions")
+    bulk_load_matches(connection, league_rows(league), lc.ClubLeagueMatches)
+    session.add(lc.ClubDeductions(date=date(2014, 8, 20), points=1, team=league['teams'][2],
+                                  competition=league['competition'], season=league['season']))
+    session.flush()
+
+    names = [c.name for c in lc.ClubMatchdayStandings.__table__.columns]
+    summed = set(tuple(row[name] for name in names)
+                 for row in _matchday_standings_rows(connection, None, None, StandingsRules()))
+    computed = set(tuple(row[name] for name in names) for row in connection.execute(matchday_standings_select()))
+    assert len(summed) == 8
+    assert computed == summed
+
+
+@club_only
+def test_backfill_matchday_standings_sqlite(request, tmpdir):
+    """Standings 006: Verify that matchday standings of SQLite databases are backfilled in the calling thread."""
+    engine = create_engine('sqlite:///' + str(tmpdir.join('standings.db')))
+    request.addfinalizer(engine.dispose)
+    BaseSchema.metadata.create_all(engine)
+    session = Session(engine)
+    league = add_league(session)
+    bulk_load_matches(session.connection(), league_rows(league), lc.ClubLeagueMatches)
+    session.commit()
+    partition = (league['competition'].id, league['season'].id)
+    session.close()
+
+    threads = set()
+    event.listen(engine, 'begin', lambda connection: threads.add(threading.current_thread()))
+    assert backfill_matchday_standings(engine, workers=4) == [partition]
+    assert threads == set([threading.current_thread()])
+    assert len(engine.execute(select([lc.ClubMatchdayStandings.__table__.c.team_id])).fetchall()) == 8
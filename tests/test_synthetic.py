@@ -0,0 +1,61 @@
+# coding=utf-8
+import pytest
+from sqlalchemy import select, func
+
+import light.common.models as lcm
+from light.schemas import get_schema
+from benchmarks.synthetic import DatasetSpec, generate
+
+
+club_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "club",
+    reason="Test only valid for club databases"
+)
+
+natl_only = pytest.mark.skipif(
+    pytest.config.getoption("--schema") != "natl",
+    reason="Test only valid for national team databases"
+)
+
+
+def count(connection, model):
+    return connection.scalar(select([func.count()]).select_from(model.__table__))
+
+
+@club_only
+def test_synthetic_club_dataset(session):
+    """Synthetic 001: Generate a club dataset with matches of all phases, shootouts and deductions."""
+    spec = DatasetSpec(confederations=1, countries=2, clubs=6, seasons=2, friendly=4, league=30, group=6,
+                       knockout=8, shootout_rate=1.0, deductions=2)
+    connection = session.connection()
+    dataset = generate(connection, spec)
+    schema = get_schema('club')
+
+    assert len(dataset.team_ids) == 12 and len(dataset.competition_ids) == 2
+    assert dataset.season_labels == ['2010-2011', '2011-2012']
+    for phase, per_season in [('friendly', 4), ('league', 30), ('group', 6), ('knockout', 8)]:
+        assert dataset.counts[phase] == per_season * 4 == count(connection, schema.match_model(phase))
+    assert dataset.counts['deductions'] == 8 == count(connection, schema.deduction)
+    assert dataset.counts['shootouts'] == count(connection, schema.shootout) == \
+        session.query(schema.match_model('knockout')).filter_by(extra_time=True).count()
+
+    league = schema.match_model('league')
+    fixtures = session.query(league.home_team_id, league.away_team_id)\
+        .filter(league.competition_id == dataset.competition_ids[0], league.season_id == dataset.season_ids[0]).all()
+    assert len(set(fixtures)) == 30
+    assert session.query(func.max(league.matchday)).scalar() == 10
+
+
+@natl_only
+def test_synthetic_dataset_reproducible(session):
+    """Synthetic 002: Verify that the same seed produces the same results."""
+    connection = session.connection()
+    results = []
+    for start_year in (1990, 2000):
+        dataset = generate(connection, DatasetSpec(schema='natl', countries=4, seasons=1, start_year=start_year))
+        matches = lcm.Matches.__table__
+        results.append(connection.execute(
+            select([matches.c.phase, matches.c.home_goals, matches.c.away_goals])
+            .where(matches.c.season_id.in_(dataset.season_ids)).order_by(matches.c.id)).fetchall())
+    assert len(results[0]) == 2 * (20 + 12 + 15)
+    assert results[0] == results[1]